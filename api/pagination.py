@@ -1,5 +1,13 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class LinkHeaderPagination(pagination.PageNumberPagination):
@@ -28,3 +36,273 @@ class LinkHeaderPagination(pagination.PageNumberPagination):
             }
 
         return Response(data, headers=headers)
+
+
+class CreatedAtCursorPagination(pagination.BasePagination):
+    """
+    Keyset pagination on (`created_at`, `id`), newest first.
+
+    The position of the last item of a page is encoded into an opaque
+    `cursor` token; the next page seeks past it with
+    `created_at < c OR (created_at = c AND id < i)`, which the
+    (created_at, id) index of `Feed` answers as a range scan. No COUNT
+    query is made, so every page costs the same as the first one.
+
+    Rows without `created_at` (older feeds) sort last, so the seek also
+    keeps `OR created_at IS NULL`. That is a second range of the index,
+    which MySQL may merge with a sort instead of reading the index in
+    order; backfilling `created_at` and dropping the branch makes it a
+    single range.
+    """
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+
+        return self.page_size
+
+    def get_position(self, obj):
+        """
+        :return dict: JSON-serializable position of `obj`
+        """
+        return {
+            'c': self.dump_datetime(obj.created_at),
+            'i': obj.id,
+        }
+
+    def parse_position(self, position):
+        """
+        :return tuple: arguments of `seek()`
+        """
+        return self.load_datetime(position['c']), int(position['i'])
+
+    def dump_datetime(self, value):
+        return value.isoformat() if value else None
+
+    def load_datetime(self, value):
+        if value is None:
+            return None
+
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(value)
+        return parsed
+
+    def encode_cursor(self, obj):
+        return base64.urlsafe_b64encode(
+            json.dumps(self.get_position(obj)).encode('ascii')
+        ).decode('ascii')
+
+    def decode_cursor(self, request):
+        """
+        :return tuple or None: position of the last item of the previous
+            page, None on the first page
+        """
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+
+        try:
+            return self.parse_position(json.loads(
+                base64.urlsafe_b64decode(token.encode('ascii')).decode('ascii')
+            ))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def seek(self, queryset, created_at, last_id):
+        # Rows without `created_at` sort last in descending order.
+        if created_at is None:
+            return queryset.filter(created_at__isnull=True, id__lt=last_id)
+
+        return queryset.filter(
+            Q(created_at__lt=created_at)
+            | Q(created_at=created_at, id__lt=last_id)
+            | Q(created_at__isnull=True)
+        )
+
+    def seek_newer(self, queryset, created_at, last_id):
+        """
+        The rows before the position, the reverse of `seek()`.
+        """
+        if created_at is None:
+            return queryset.filter(
+                Q(created_at__isnull=False)
+                | Q(created_at__isnull=True, id__gt=last_id)
+            )
+
+        return queryset.filter(
+            Q(created_at__gt=created_at)
+            | Q(created_at=created_at, id__gt=last_id)
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = self.seek(queryset, *position)
+
+        # One extra row tells whether there is a next page.
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        next_url = self.get_next_link()
+
+        headers = {}
+        if next_url is not None:
+            headers = {
+                'Next-Page-Link': next_url
+            }
+
+        return Response(data, headers=headers)
+
+
+class PinnedFeedCursorPagination(CreatedAtCursorPagination):
+    """
+    Keyset pagination of the feeds of a pinned tag: unread first, then by
+    publish date and id, ascending.
+
+    `FeedFilterBackend.filter_by_pinned_tag()` annotates the `is_read` and
+    `sort_publish_date` keys. Null publish dates sort first, as in MySQL.
+    """
+    ordering = ('is_read', 'sort_publish_date', 'id')
+
+    def get_position(self, obj):
+        return {
+            'r': bool(obj.is_read),
+            'p': self.dump_datetime(obj.sort_publish_date),
+            'i': obj.id,
+        }
+
+    def parse_position(self, position):
+        if not isinstance(position['r'], bool):
+            raise ValueError(position['r'])
+
+        return (
+            position['r'],
+            self.load_datetime(position['p']),
+            int(position['i']),
+        )
+
+    def seek(self, queryset, is_read, publish_date, last_id):
+        if publish_date is None:
+            after = (
+                Q(sort_publish_date__isnull=True, id__gt=last_id)
+                | Q(sort_publish_date__isnull=False)
+            )
+        else:
+            after = (
+                Q(sort_publish_date__gt=publish_date)
+                | Q(sort_publish_date=publish_date, id__gt=last_id)
+            )
+
+        seek = Q(is_read=is_read) & after
+        if not is_read:
+            seek |= Q(is_read=True)
+
+        return queryset.filter(seek)
+
+
+class FeedTimelineCursorPagination(CreatedAtCursorPagination):
+    """
+    Keyset pagination reading the IDs of a page from the feed timeline of
+    the view (`view.get_feed_timeline()`), newest first, then loading them
+    in bulk from the filtered queryset.
+
+    The timeline holds a superset of the feeds of the queryset, in the
+    same order. IDs the queryset filters out are skipped: batches are read
+    until the page is full or the timeline ends. After `max_batches`, the
+    rest of the page is loaded from SQL, see `FeedTimeline.filter_queryset()`.
+    Cursors are the same as `CreatedAtCursorPagination`'s.
+    """
+    max_batch_size = 1000
+    max_batches = 4
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        timeline = view.get_feed_timeline()
+
+        after = None
+        position = self.decode_cursor(request)
+        if position is not None:
+            after = (timeline.get_score(position[0]), position[1])
+
+        # One extra row tells whether there is a next page.
+        results = []
+        batch_size = page_size + 1
+        for _ in range(self.max_batches):
+            entries = timeline.read(after, batch_size)
+            if not entries:
+                break
+
+            feeds = queryset.in_bulk([feed_id for _, feed_id in entries])
+            results.extend(
+                feeds[feed_id] for _, feed_id in entries if feed_id in feeds
+            )
+            after = entries[-1]
+            if len(results) > page_size:
+                break
+            batch_size = min(batch_size * 2, self.max_batch_size)
+        else:
+            # The queryset filters out most of the timeline.
+            fallback = self.seek(
+                timeline.filter_queryset(queryset).order_by(*self.ordering),
+                timeline.get_created_at(after[0]),
+                after[1]
+            )
+            results.extend(fallback[:page_size + 1 - len(results)])
+
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+
+        return self.page
+
+
+class WithCursorPagination(object):
+    """
+    View mixin switching to `cursor_pagination_class` when the request
+    sends the cursor parameter (empty on the first page), keeping the view's
+    default pagination for older clients.
+    """
+    cursor_pagination_class = CreatedAtCursorPagination
+
+    def get_cursor_pagination_class(self):
+        return self.cursor_pagination_class
+
+    def use_cursor_pagination(self):
+        return (self.get_cursor_pagination_class().cursor_query_param
+                in self.request.query_params)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and self.use_cursor_pagination():
+            self._paginator = self.get_cursor_pagination_class()()
+        return super(WithCursorPagination, self).paginator
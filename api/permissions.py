@@ -1,8 +1,7 @@
-import itertools
-
 from django.conf import settings
 from django.utils.functional import SimpleLazyObject
 
+from rest_framework.exceptions import MethodNotAllowed
 from rest_framework.permissions import (
     BasePermission,
     DjangoModelPermissions,
@@ -11,6 +10,7 @@ from rest_framework.permissions import (
     IsAuthenticated,
 )
 
+from PoleLuxe.helpers.permission_cache import permission_cache_helper
 from PoleLuxe.models.company import CompanyOwner
 
 from api.v1.helpers.company_manager import default_company_manager_helper
@@ -27,6 +27,72 @@ def is_swagger_docs(request):  # pragma: no cover
     return False
 
 
+def has_django_user(request):
+    """
+    Whether the request is made by an app user. With the permission cache
+    enabled, their Django user and its permissions are preloaded from it.
+    """
+    user = request.user
+    if permission_cache_helper.is_enabled() and hasattr(user, 'django_user_id'):
+        permission_cache_helper.preload(user)
+
+    return hasattr(user, 'django_user')
+
+
+def is_company_owner(request):
+    if permission_cache_helper.is_enabled():
+        return permission_cache_helper.is_company_owner(request.user)
+
+    return CompanyOwner.objects.filter(owner=request.user).exists()
+
+
+class PermissionTable(object):
+    """
+    Permissions required by each method, for staff and other users.
+
+    The permission templates are compiled once, when the permission class
+    is defined; the permission names of a model are resolved the first time
+    they are needed and shared by every later check. Lookups return tuples
+    and nothing is mutated per request.
+    """
+
+    def __init__(self, perms_map, staff_perms_map=None):
+        """
+        :param dict perms_map: method -> permission templates
+        :param dict staff_perms_map: method -> templates staff users need
+            on top of `perms_map`
+        """
+        staff_perms_map = staff_perms_map or {}
+        self._templates = {}
+        for method, templates in perms_map.items():
+            self._templates[method, False] = tuple(templates)
+            self._templates[method, True] = tuple(templates) + tuple(
+                staff_perms_map.get(method, ())
+            )
+        self._permissions = {}
+
+    def get(self, method, model_cls, is_staff=False):
+        """
+        :return tuple: permission names
+        :raise KeyError: the method is not in the table
+        """
+        key = (method, model_cls, is_staff)
+        try:
+            return self._permissions[key]
+        except KeyError:
+            pass
+
+        kwargs = {
+            'app_label': model_cls._meta.app_label,
+            'model_name': model_cls._meta.model_name
+        }
+        permissions = tuple(
+            template % kwargs for template in self._templates[method, is_staff]
+        )
+        self._permissions[key] = permissions
+        return permissions
+
+
 class CustomPermissions(BasePermission):  # pragma: no cover
     def has_permission(self, request, view):
         """
@@ -35,7 +101,7 @@ class CustomPermissions(BasePermission):  # pragma: no cover
         """
         user = request.user
 
-        if not hasattr(request.user, 'django_user'):
+        if not has_django_user(request):
             return is_swagger_docs(request)
 
         request.user = user.django_user
@@ -60,7 +126,7 @@ class IsCustomAuthenticated(IsAuthenticated):
     """
 
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):
+        if not has_django_user(request):
             return is_swagger_docs(request)
 
         return (request.user
@@ -69,39 +135,67 @@ class IsCustomAuthenticated(IsAuthenticated):
 
 
 class CustomDjangoModelPermissions(CustomPermissions, DjangoModelPermissions):
-    def __init__(self):
-        self.perms_map = {
-            'GET': [],
-            'OPTIONS': [],
-            'HEAD': [],
-            'POST': ['%(app_label)s.add_%(model_name)s'],
-            'PUT': ['%(app_label)s.change_%(model_name)s'],
-            'PATCH': ['%(app_label)s.change_%(model_name)s'],
-            'DELETE': ['%(app_label)s.delete_%(model_name)s'],
-        }
-
-    def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):
-            return is_swagger_docs(request)
+    perms_map = {
+        'GET': (),
+        'OPTIONS': (),
+        'HEAD': (),
+        'POST': ('%(app_label)s.add_%(model_name)s',),
+        'PUT': ('%(app_label)s.change_%(model_name)s',),
+        'PATCH': ('%(app_label)s.change_%(model_name)s',),
+        'DELETE': ('%(app_label)s.delete_%(model_name)s',),
+    }
+    # Staff users can only read what they can add and change.
+    staff_perms_map = {
+        'GET': (
+            '%(app_label)s.add_%(model_name)s',
+            '%(app_label)s.change_%(model_name)s',
+        ),
+    }
+    permission_table = PermissionTable(perms_map, staff_perms_map)
+
+    def get_permission_table(self, request, view):
+        return self.permission_table
+
+    def has_model_permissions(self, request, view, is_staff):
+        """
+        `DjangoModelPermissions.has_permission` for the Django user of the
+        request, against the permission table.
+        """
+        if getattr(view, '_ignore_model_permissions', False):
+            return True
 
         django_user = request.user.django_user
+        if not django_user or (
+            not django_user.is_authenticated and self.authenticated_users_only
+        ):
+            return False
 
-        if django_user.is_staff:
-            self.perms_map['GET'] = itertools.chain(
-                self.perms_map['GET'],
-                [
-                    '%(app_label)s.add_%(model_name)s',
-                    '%(app_label)s.change_%(model_name)s'
-                ]
+        model_cls = self._queryset(view).model
+        try:
+            perms = self.get_permission_table(request, view).get(
+                request.method,
+                model_cls,
+                is_staff
             )
+        except KeyError:
+            raise MethodNotAllowed(request.method)
 
-        return super(CustomDjangoModelPermissions, self).has_permission(
-            request, view)
+        return django_user.has_perms(perms)
+
+    def has_permission(self, request, view):
+        if not has_django_user(request):
+            return is_swagger_docs(request)
+
+        return self.has_model_permissions(
+            request,
+            view,
+            request.user.django_user.is_staff
+        )
 
 
 class ZonePermissions(WithHasPermissionByUserType, CustomDjangoModelPermissions):
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):  # pragma: no cover
+        if not has_django_user(request):  # pragma: no cover
             return is_swagger_docs(request)
 
         can_view_analytics = request.user.django_user.has_perm(
@@ -158,33 +252,37 @@ class CompanyOwnerPermissions(CustomDjangoModelPermissions):
 
     # bypass logic for is_staff in company owners
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):  # pragma: no cover
+        if not has_django_user(request):  # pragma: no cover
             return is_swagger_docs(request)
 
-        return super(CustomDjangoModelPermissions, self).has_permission(
-            request, view)
+        return self.has_model_permissions(request, view, is_staff=False)
 
 
 class EvaluationPermissions(WithHasPermissionByUserType, CustomDjangoModelPermissions):
-    def __init__(self):
-        self.perms_map['GET'] = [
-            '%(app_label)s.add_evaluation'
-        ]
+    perms_map = dict(
+        CustomDjangoModelPermissions.perms_map,
+        GET=('%(app_label)s.add_evaluation',)
+    )
+    permission_table = PermissionTable(
+        perms_map,
+        CustomDjangoModelPermissions.staff_perms_map
+    )
 
 
 class EvaluateeOrEvaluatePermissions(EvaluationPermissions):
-    def has_permission(self, request, view):
+    def get_permission_table(self, request, view):
+        # Evaluatees read their evaluations without `add_evaluation`.
         if view.action == 'list':
-            self.perms_map['GET'] = []
+            return CustomDjangoModelPermissions.permission_table
         elif view.action == 'retrieve':
             try:  # pragma: no cover
                 evaluation = view.get_object()
                 if evaluation.user == request.user:
-                    self.perms_map['GET'] = []
+                    return CustomDjangoModelPermissions.permission_table
             except AssertionError:
                 pass  # TODO bad idea to silently ignore errors
 
-        return super(EvaluateeOrEvaluatePermissions, self).has_permission(
+        return super(EvaluateeOrEvaluatePermissions, self).get_permission_table(
             request, view)
 
 
@@ -199,19 +297,8 @@ class CustomIsAdminOrEvaluationPermissions(CustomIsAdminUser):
 
 
 class MediaPermissions(CustomDjangoModelPermissions):
-    def __init__(self):
-        self.perms_map = {
-            'GET': [],
-            'OPTIONS': [],
-            'HEAD': [],
-            'POST': ['%(app_label)s.add_%(model_name)s'],
-            'PUT': ['%(app_label)s.change_%(model_name)s'],
-            'PATCH': ['%(app_label)s.change_%(model_name)s'],
-            'DELETE': ['%(app_label)s.delete_%(model_name)s'],
-        }
-
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):
+        if not has_django_user(request):
             return is_swagger_docs(request)
 
         # This is mainly for backward compatibilty.
@@ -226,7 +313,6 @@ class MediaPermissions(CustomDjangoModelPermissions):
                     request.user.django_user.is_staff):
                 return True
         elif request.method in ['PUT', 'PATCH']:
-            self.perms_map[request.method] = []
             return True
 
         return super(MediaPermissions, self).has_permission(request, view)
@@ -249,7 +335,7 @@ class MediaPermissions(CustomDjangoModelPermissions):
 
 class MediaResourcePermissions(MediaPermissions):
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):
+        if not has_django_user(request):
             return is_swagger_docs(request)
 
         # This is mainly for backward compatibilty.
@@ -279,7 +365,7 @@ class MediaResourceWriterPermissions(MediaResourcePermissions):
                 django_user.has_perm('PoleLuxe.add_mediaresource'))
 
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):
+        if not has_django_user(request):
             return is_swagger_docs(request)
 
         if request.method in ['POST']:
@@ -318,7 +404,7 @@ class RatingPermissions(BasePermission):
 
 class ProductGroupPermissions(WithHasPermissionByUserType, CustomDjangoModelPermissions):
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):
+        if not has_django_user(request):
             return is_swagger_docs(request)
 
         if request.method in SAFE_METHODS:
@@ -362,7 +448,7 @@ class ProductGroupPermissions(WithHasPermissionByUserType, CustomDjangoModelPerm
 
 class UserKnowledgeResultPermissions(BasePermission):
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):  # pragma: no cover
+        if not has_django_user(request):  # pragma: no cover
             return is_swagger_docs(request)
 
         if request.method in ['GET', 'POST']:
@@ -385,7 +471,7 @@ class UserKnowledgeResultPermissions(BasePermission):
 
 class UserLuxuryCultureResultPermissions(BasePermission):
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):  # pragma: no cover
+        if not has_django_user(request):  # pragma: no cover
             return is_swagger_docs(request)
 
         if request.method in ['GET', 'POST']:
@@ -410,19 +496,15 @@ class UserLuxuryCultureResultPermissions(BasePermission):
 class CompanyManagerPermissions(CustomDjangoModelPermissions):
 
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):  # pragma: no cover
+        if not has_django_user(request):  # pragma: no cover
             return is_swagger_docs(request)
 
         if request.method in ['GET']:
-            if CompanyOwner.objects.filter(
-                owner=request.user
-            ).exists():
+            if is_company_owner(request):
                 return True
 
         elif request.method in ['POST', 'PATCH', 'PUT', 'DELETE']:
-            return CompanyOwner.objects.filter(
-                owner=request.user
-            ).exists()
+            return is_company_owner(request)
 
         return super(CompanyManagerPermissions, self).has_permission(request, view)
 
@@ -446,7 +528,7 @@ class CompanyManagerDjangoModelPermissions(WithHasPermissionByUserType, CustomDj
         ).values_list('id', flat=True)
 
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):
+        if not has_django_user(request):
             return is_swagger_docs(request)
 
         if request.method in ['GET']:
@@ -468,7 +550,7 @@ class ContentWithProductGroupPermissions(CompanyManagerDjangoModelPermissions):
         return content.product_group
 
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):
+        if not has_django_user(request):
             return is_swagger_docs(request)
 
         return super(ContentWithProductGroupPermissions, self).has_permission(request, view)
@@ -477,7 +559,14 @@ class ContentWithProductGroupPermissions(CompanyManagerDjangoModelPermissions):
         return self.allow_content(request, obj)
 
     def allow_content(self, request, obj):
-        if request.user.is_company_manager():
+        if permission_cache_helper.is_enabled():
+            is_company_manager = permission_cache_helper.is_company_manager(
+                request.user
+            )
+        else:
+            is_company_manager = request.user.is_company_manager()
+
+        if is_company_manager:
             content_product_groups = default_company_manager_helper.get_productgroups(
                 request.user
             )
@@ -491,7 +580,7 @@ class MediaContentWithProductGroupPermissions(WithHasPermissionByUserType, Media
     DailyChallenge, Knowledge, LuxuryCulture, TipsOfTheDay is using product_group.
     """
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):
+        if not has_django_user(request):
             return is_swagger_docs(request)
 
         return super(MediaContentWithProductGroupPermissions,
@@ -516,7 +605,7 @@ class MediaWriterPermissions(MediaContentWithProductGroupPermissions):
                 django_user.has_perm('PoleLuxe.add_mediaresource'))
 
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):
+        if not has_django_user(request):
             return is_swagger_docs(request)
 
         if request.method in ['POST'] and not self.is_like_unlike(view):
@@ -542,7 +631,7 @@ class CompanyAnalyticsPermissions(CustomPermissions):
     """
 
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):  # pragma: no cover
+        if not has_django_user(request):  # pragma: no cover
             return is_swagger_docs(request)
 
         return (request.user
@@ -554,7 +643,7 @@ class CompanyAnalyticsPermissions(CustomPermissions):
 
 class AnalyticsPermissions(CustomPermissions):
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):  # pragma: no cover
+        if not has_django_user(request):  # pragma: no cover
             return is_swagger_docs(request)
 
         can_view_analytics = request.user.django_user.has_perm(
@@ -572,7 +661,7 @@ class AnalyticsPermissions(CustomPermissions):
 
 class AnalyticsOrEvaluationPermissions(CustomIsAdminOrEvaluationPermissions):
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):
+        if not has_django_user(request):
             return is_swagger_docs(request)
 
         can_view_analytics = request.user.django_user.has_perm(
@@ -590,7 +679,7 @@ class AnalyticsOrEvaluationPermissions(CustomIsAdminOrEvaluationPermissions):
 
 class OwnerUserPermissions(WithHasPermissionByUserType, AnalyticsOrEvaluationPermissions):
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):
+        if not has_django_user(request):
             return is_swagger_docs(request)
 
         is_self_request = (
@@ -606,7 +695,7 @@ class OwnerUserPermissions(WithHasPermissionByUserType, AnalyticsOrEvaluationPer
 
 class UsersMetadataPermissions(OwnerUserPermissions):
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):  # pragma: no cover
+        if not has_django_user(request):  # pragma: no cover
             return is_swagger_docs(request)
 
         if request.method == 'GET' and view.action == 'metadata':
@@ -617,7 +706,7 @@ class UsersMetadataPermissions(OwnerUserPermissions):
 
 class QuizAnswerPermissions(BasePermission):
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'django_user'):  # pragma: no cover
+        if not has_django_user(request):  # pragma: no cover
             return is_swagger_docs(request)
 
         # anyone can get and submit answer(s)
@@ -1,101 +1,120 @@
+import random
+
 from django.conf import settings
 
 from PoleLuxe.mixins.routers import WithAnalytics
 
 
-class APIRouter(WithAnalytics):
+class AnalyticsRouter(object):
     """
-    A router for analytics_db from django-albert.
+    A router sending a fixed set of models to an analytics database.
+
+    Reads go to the read replicas configured for the alias in
+    `ANALYTICS_DB_READ_REPLICAS` (alias -> list of aliases), so dashboards
+    do not compete with ingest; without replicas they go to the alias.
+
+    In write-buffering mode (`ANALYTICS_DB_INGEST_ALIASES`, alias -> ingest
+    alias), inserts of the high-volume `INGEST_MODELS` go to the ingest
+    alias, a connection of its own to the same database, and every other
+    write to the alias.
     """
-    ANALYTICS_DB_ALIAS = settings.ANALYTICS_DB_ALIAS
+    ANALYTICS_DB_ALIAS = None
+    # Lowercased model names, as in `Model._meta.model_name`.
+    ANALYTICS_MODELS = frozenset()
+    INGEST_MODELS = frozenset()
+
+    def __init__(self):
+        read_replicas = getattr(settings, 'ANALYTICS_DB_READ_REPLICAS', {})
+        self.read_aliases = tuple(
+            read_replicas.get(self.ANALYTICS_DB_ALIAS, ())
+        ) or (self.ANALYTICS_DB_ALIAS,)
+        self.ingest_alias = getattr(
+            settings,
+            'ANALYTICS_DB_INGEST_ALIASES',
+            {}
+        ).get(self.ANALYTICS_DB_ALIAS)
+
+        # Aliases of the same database, besides the analytics alias itself.
+        self.mirror_aliases = frozenset(
+            self.read_aliases + (self.ingest_alias,)
+        ) - {None, self.ANALYTICS_DB_ALIAS}
 
     def db_for_read(self, model, **hints):
         """
-        Attempts to read from a `analytics` model go to the
-        analytics database.
+        Attempts to read from an analytics model go to a read replica of
+        the analytics database.
         """
-        return self.use_analytics_db_or_default(model.__name__)
+        if model._meta.model_name not in self.ANALYTICS_MODELS:
+            return None
+
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in self.mirror_aliases:
+            # Related objects of an instance come from the same connection.
+            return instance._state.db
+
+        return random.choice(self.read_aliases)
 
     def db_for_write(self, model, **hints):
         """
-        Attempts to write analytics data go to analytics_db.
+        Attempts to write analytics data go to the analytics database.
         """
-        return self.use_analytics_db_or_default(model.__name__)
+        model_name = model._meta.model_name
+        if model_name not in self.ANALYTICS_MODELS:
+            return None
+
+        if self.ingest_alias is not None and model_name in self.INGEST_MODELS:
+            return self.ingest_alias
+
+        return self.ANALYTICS_DB_ALIAS
 
     def allow_relation(self, obj1, obj2, **hints):
         """
-        Allow relations if the objects belong to the same
-        database alias.
+        Allow relations if the objects belong to the same database.
         """
-        return obj1._state.db == obj2._state.db or None
+        dbs = {obj1._state.db, obj2._state.db}
+        if dbs <= self.mirror_aliases | {self.ANALYTICS_DB_ALIAS}:
+            return True
+        return len(dbs) == 1 or None
 
     def allow_migrate(self, db, app_label, model_name=None, **hints):
         """
-        Make sure an analytics model appears only in the 'analytics_db'
+        Make sure an analytics model appears only in the analytics
+        database; replicas and ingest aliases get no migration.
         """
-        if db == APIRouter.ANALYTICS_DB_ALIAS:
+        if db in self.mirror_aliases:
+            return False
+        if db == self.ANALYTICS_DB_ALIAS:
             return self.is_analytics_model(model_name)
         elif self.is_analytics_model(model_name):
             # If we are working on a analytics model, and the db is not
-            # analytics_db, return false
+            # the analytics database, return false
             return False
         return None
 
     def use_analytics_db_or_default(self, model_name):
         if self.is_analytics_model(model_name):
-            return APIRouter.ANALYTICS_DB_ALIAS
+            return self.ANALYTICS_DB_ALIAS
         return None
 
     def is_analytics_model(self, model_name):
-        if model_name is not None:
-            return str(model_name).lower() in ['session', 'activity', 'analytics']
-        return False
+        return model_name is not None and (
+            model_name in self.ANALYTICS_MODELS or
+            model_name.lower() in self.ANALYTICS_MODELS
+        )
 
 
-class AnalyticsQuizRouter(object):
+class APIRouter(AnalyticsRouter, WithAnalytics):
     """
-    A router for analytics_quiz_db from django-albert.
+    A router for analytics_db from django-albert.
     """
-    ANALYTICS_DB_ALIAS = settings.ANALYTICS_QUIZ_DB_ALIAS
-
-    def db_for_read(self, model, **hints):
-        """
-        Attempts to read from a `analytics_quiz_db` model go to the
-        analytics database.
-        """
-        return self.use_analytics_db_or_default(model.__name__)
-
-    def db_for_write(self, model, **hints):
-        """
-        Attempts to write analytics data go to analytics_quiz_db.
-        """
-        return self.use_analytics_db_or_default(model.__name__)
-
-    def allow_relation(self, obj1, obj2, **hints):
-        """
-        Allow relations if the objects belong to the same
-        database alias.
-        """
-        return obj1._state.db == obj2._state.db or None
-
-    def allow_migrate(self, db, app_label, model_name=None, **hints):
-        """
-        Make sure an analytics model appears only in the 'analytics_quiz_db'
-        """
-        if db == self.ANALYTICS_DB_ALIAS:
-            return self.is_analytics_model(model_name)
-        elif self.is_analytics_model(model_name):
-            # If we are working on a analytics model, and the db is not
-            # analytics_quiz_db, return false
-            return False
-        return None
+    ANALYTICS_DB_ALIAS = settings.ANALYTICS_DB_ALIAS
+    ANALYTICS_MODELS = frozenset(['session', 'activity', 'analytics'])
+    INGEST_MODELS = frozenset(['session', 'activity'])
 
-    def use_analytics_db_or_default(self, model_name):
-        if self.is_analytics_model(model_name):
-            return self.ANALYTICS_DB_ALIAS
-        return None
 
-    def is_analytics_model(self, model_name):
-        return model_name is not None and model_name.lower() in [
-            'quizresult'
-        ]
+class AnalyticsQuizRouter(AnalyticsRouter):
+    """
+    A router for analytics_quiz_db from django-albert.
+    """
+    ANALYTICS_DB_ALIAS = settings.ANALYTICS_QUIZ_DB_ALIAS
+    ANALYTICS_MODELS = frozenset(['quizresult'])
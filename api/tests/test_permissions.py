@@ -0,0 +1,209 @@
+import mock
+import requests_mock
+import timeit
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.models import Group, Permission
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from rest_framework.permissions import BasePermission
+from rest_framework.request import Request
+
+from PoleLuxe.factories.base import CompanyOwnerFactory
+from PoleLuxe.helpers.permission_cache import permission_cache_helper
+from PoleLuxe.models import Feed, User
+
+from api.tests.base import BaseAPITestCase
+from api import permissions
+from api.permissions import (
+    CompanyManagerPermissions,
+    CustomDjangoModelPermissions,
+    EvaluateeOrEvaluatePermissions,
+    EvaluationPermissions,
+    has_django_user,
+)
+
+
+@override_settings(ENABLE_PERMISSION_CACHE=True)
+class PermissionCacheTestCase(BaseAPITestCase):
+    @requests_mock.mock()
+    def setUp(self, m):
+        m.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+        super(PermissionCacheTestCase, self).setUp()
+
+        cache.clear()
+        self.group = Group.objects.create(name='analysts')
+        self.user.django_user.groups.add(self.group)
+
+    def get_request(self, method='get'):
+        request = getattr(RequestFactory(), method)('/')
+        request.user = User.objects.get(pk=self.user.id)
+        return request
+
+    def has_perm(self, request, perm):
+        self.assertTrue(has_django_user(request))
+        return request.user.django_user.has_perm(perm)
+
+    def test_has_perm_cached(self):
+        self.group.permissions.add(
+            Permission.objects.get(codename='view_analytics')
+        )
+        self.assertTrue(
+            self.has_perm(self.get_request(), 'PoleLuxe.view_analytics')
+        )
+
+        request = self.get_request()
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                self.has_perm(request, 'PoleLuxe.view_analytics')
+            )
+            self.assertFalse(self.has_perm(request, 'PoleLuxe.add_media'))
+            self.assertEqual(
+                self.user.django_user.is_staff,
+                request.user.django_user.is_staff
+            )
+
+    def test_invalidated_on_group_permission_change(self):
+        self.assertFalse(
+            self.has_perm(self.get_request(), 'PoleLuxe.view_analytics')
+        )
+
+        self.group.permissions.add(
+            Permission.objects.get(codename='view_analytics')
+        )
+        self.assertTrue(
+            self.has_perm(self.get_request(), 'PoleLuxe.view_analytics')
+        )
+
+        self.user.django_user.groups.remove(self.group)
+        self.assertFalse(
+            self.has_perm(self.get_request(), 'PoleLuxe.view_analytics')
+        )
+
+    def test_company_owner_cached(self):
+        view = mock.Mock(action='list')
+        permission = CompanyManagerPermissions()
+        request = self.get_request('post')
+        self.assertFalse(permission.has_permission(request, view))
+
+        CompanyOwnerFactory(owner=self.user)
+        request = self.get_request('post')
+        self.assertTrue(permission.has_permission(request, view))
+
+        request = self.get_request('post')
+        has_django_user(request)
+        with self.assertNumQueries(0):
+            self.assertTrue(permission.has_permission(request, view))
+            self.assertTrue(
+                permission_cache_helper.is_company_owner(request.user)
+            )
+
+
+@override_settings(ENABLE_PERMISSION_CACHE=True)
+class PermissionTableTestCase(BaseAPITestCase):
+    @requests_mock.mock()
+    def setUp(self, m):
+        m.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+        super(PermissionTableTestCase, self).setUp()
+
+        cache.clear()
+
+    def get_request(self, method='get'):
+        request = Request(getattr(RequestFactory(), method)('/'))
+        request.user = User.objects.get(pk=self.user.id)
+        return request
+
+    def get_view(self, action='list'):
+        view = mock.Mock(action=action, kwargs={})
+        view._ignore_model_permissions = False
+        view.get_queryset.return_value = Feed.objects.all()
+        return view
+
+    def get_permission_classes(self):
+        return sorted(
+            (
+                value for value in vars(permissions).values()
+                if isinstance(value, type)
+                and issubclass(value, BasePermission)
+                and value.__module__ == permissions.__name__
+            ),
+            key=lambda cls: cls.__name__
+        )
+
+    def test_required_permissions(self):
+        table = CustomDjangoModelPermissions.permission_table
+        self.assertEqual((), table.get('GET', Feed))
+        self.assertEqual(
+            ('PoleLuxe.add_feed', 'PoleLuxe.change_feed'),
+            table.get('GET', Feed, is_staff=True)
+        )
+        self.assertEqual(('PoleLuxe.delete_feed',), table.get('DELETE', Feed))
+        self.assertIs(table.get('POST', Feed), table.get('POST', Feed))
+        self.assertEqual(
+            ('PoleLuxe.add_evaluation',),
+            EvaluationPermissions.permission_table.get('GET', Feed)
+        )
+
+    def test_checks_do_not_mutate_tables(self):
+        django_user = self.user.django_user
+        django_user.is_staff = True
+        django_user.save()
+        perms_map = dict(CustomDjangoModelPermissions.perms_map)
+
+        for _ in range(3):
+            EvaluateeOrEvaluatePermissions().has_permission(
+                self.get_request(),
+                self.get_view()
+            )
+            CustomDjangoModelPermissions().has_permission(
+                self.get_request(),
+                self.get_view()
+            )
+
+        self.assertEqual(perms_map, CustomDjangoModelPermissions.perms_map)
+        self.assertEqual(
+            ('PoleLuxe.add_evaluation', 'PoleLuxe.add_feed', 'PoleLuxe.change_feed'),
+            EvaluationPermissions.permission_table.get('GET', Feed, True)
+        )
+        self.assertFalse(EvaluationPermissions().has_permission(
+            self.get_request(),
+            self.get_view()
+        ))
+
+    @skipUnless(
+        getattr(settings, 'RUN_BENCHMARKS', False),
+        'Microbenchmark, set RUN_BENCHMARKS to run it'
+    )
+    def test_permission_check_cost(self):
+        """
+        Microbenchmark of one `has_permission` call of every permission
+        class, once the table and the permissions of the user are warm.
+        Warm checks give the same answer and resolve no new permission.
+        """
+        number = 1000
+        view = self.get_view()
+
+        for method in ('get', 'post'):
+            request = self.get_request(method)
+            for permission_class in self.get_permission_classes():
+                results = set()
+                check = lambda: results.add(
+                    permission_class().has_permission(request, view)
+                )
+                check()
+                table = getattr(permission_class, 'permission_table', None)
+                resolved = dict(table._permissions) if table else None
+
+                duration = timeit.timeit(check, number=number)
+                print('{:<45} {:<5} {:>8.2f} us/check'.format(
+                    permission_class.__name__,
+                    method.upper(),
+                    duration * 1e6 / number
+                ))
+
+                self.assertEqual(1, len(results))
+                if table is not None:
+                    self.assertEqual(resolved, table._permissions)
@@ -0,0 +1,139 @@
+import mock
+import time
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from PoleLuxe.factories import ReadFeedFactory
+from PoleLuxe.helpers.replica_selector import replica_selector
+
+from api.tests.base import BaseAPITestCase
+
+
+@override_settings(
+    ENABLE_REPLICA_SELECTOR=True,
+    REPLICA_MAX_LAG=5,
+    REPLICA_STATS_SAMPLE_RATE=1
+)
+class ReplicaSelectorTestCase(BaseAPITestCase):
+    def setUp(self):
+        super(ReplicaSelectorTestCase, self).setUp()
+
+        cache.clear()
+        replica_selector.states = {}
+        replica_selector.probed_at = None
+
+    def set_states(self, states):
+        replica_selector.states = states
+        replica_selector.probed_at = time.time()
+
+    @override_settings(READ_REPLICA_DB_ALIASES=['replica_a', 'replica_b'])
+    def test_lagging_replica_excluded(self):
+        self.set_states({
+            'replica_a': {'latency': 0.01, 'lag': 0.5},
+            'replica_b': {'latency': 0.001, 'lag': 60},
+        })
+
+        for _ in range(20):
+            self.assertEqual('replica_a', replica_selector.select())
+
+        stats = replica_selector.get_stats()
+        self.assertEqual(20, stats['routed:replica_a'])
+        self.assertEqual(20, stats['excluded:replica_b'])
+        self.assertEqual(0, stats['routed:replica_b'])
+
+    @override_settings(READ_REPLICA_DB_ALIASES=['replica_a', 'replica_b'])
+    def test_faster_replica_preferred(self):
+        self.set_states({
+            'replica_a': {'latency': 0.1, 'lag': 0.5},
+            'replica_b': {'latency': 0.001, 'lag': 0.5},
+        })
+
+        aliases = [replica_selector.select() for _ in range(200)]
+        self.assertGreater(aliases.count('replica_b'), aliases.count('replica_a'))
+
+    @override_settings(READ_REPLICA_DB_ALIASES=['replica_a'])
+    def test_fallback_to_primary(self):
+        self.set_states({'replica_a': {'latency': 0.01, 'lag': None}})
+
+        self.assertEqual('default', replica_selector.select())
+        self.assertEqual(1, replica_selector.get_stats()['fallback'])
+
+    @override_settings(READ_REPLICA_DB_ALIASES=['replica_a'])
+    def test_writer_pinned_to_primary(self):
+        self.set_states({'replica_a': {'latency': 0.01, 'lag': 0.5}})
+        self.assertEqual('replica_a', replica_selector.select(self.user.id))
+
+        ReadFeedFactory(user=self.user)
+
+        self.assertEqual('default', replica_selector.select(self.user.id))
+        self.assertEqual('replica_a', replica_selector.select())
+        self.assertEqual(1, replica_selector.get_stats()['pinned'])
+
+    @override_settings(READ_REPLICA_DB_ALIASES=['replica_a'])
+    def test_no_pin_when_disabled(self):
+        with self.settings(ENABLE_REPLICA_SELECTOR=False):
+            ReadFeedFactory(user=self.user)
+
+        self.assertFalse(replica_selector.is_pinned(self.user.id))
+
+    @override_settings(READ_REPLICA_DB_ALIASES=['replica_a'])
+    def test_select_does_not_probe(self):
+        cache.set(replica_selector.STATES_KEY, {
+            'replica_a': {'latency': 0.01, 'lag': 0.5},
+        })
+
+        with mock.patch.object(replica_selector, 'probe') as probe:
+            self.assertEqual('replica_a', replica_selector.select())
+            self.assertFalse(probe.called)
+
+        # Without states, e.g. the heartbeat command stopped.
+        cache.delete(replica_selector.STATES_KEY)
+        replica_selector.probed_at = None
+        self.assertEqual('default', replica_selector.select())
+
+    @override_settings(REPLICA_STATS_SAMPLE_RATE=0)
+    def test_stats_disabled(self):
+        replica_selector.select()
+        self.assertEqual(0, replica_selector.get_stats()['fallback'])
+
+
+@override_settings(
+    READ_REPLICA_DB_ALIASES=['default'],
+    REPLICA_STATS_SAMPLE_RATE=1
+)
+class ReplicationHeartbeatTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        replica_selector.states = {}
+        replica_selector.probed_at = None
+
+    def test_probe_heartbeat(self):
+        # No beat yet.
+        self.assertIsNone(replica_selector.probe_all()['default']['lag'])
+
+        beat_at = replica_selector.beat()
+
+        state = replica_selector.probe_all()['default']
+        self.assertEqual(0, state['lag'])
+        self.assertGreater(state['latency'], 0)
+        # Still at that beat while the primary wrote one 2 s later.
+        self.assertEqual(
+            2,
+            replica_selector.probe('default', beat_at + 2)['lag']
+        )
+
+        replica_selector.states = {}
+        replica_selector.probed_at = None
+        self.assertEqual('default', replica_selector.select())
+        self.assertEqual(1, replica_selector.get_stats()['routed:default'])
+
+    @override_settings(REPLICA_MAX_LAG=5, REPLICA_PROBE_INTERVAL=2)
+    def test_interval_checked(self):
+        with mock.patch.object(replica_selector, 'beat') as beat:
+            call_command('replicationheartbeat', interval=5)
+            call_command('replicationheartbeat', interval=3)
+
+        self.assertFalse(beat.called)
@@ -0,0 +1,68 @@
+import mock
+
+from django.conf import settings
+from django.test.utils import override_settings
+
+from api.tests.base import BaseAPITestCase
+from api.routers import APIRouter
+
+
+@override_settings(
+    ANALYTICS_DB_READ_REPLICAS={
+        settings.ANALYTICS_DB_ALIAS: ['analytics_replica_1', 'analytics_replica_2'],
+    },
+    ANALYTICS_DB_INGEST_ALIASES={
+        settings.ANALYTICS_DB_ALIAS: 'analytics_ingest',
+    }
+)
+class AnalyticsRouterTestCase(BaseAPITestCase):
+    def get_model(self, model_name):
+        return mock.Mock(_meta=mock.Mock(model_name=model_name))
+
+    def get_instance(self, db):
+        return mock.Mock(_state=mock.Mock(db=db))
+
+    def test_read_write_split(self):
+        router = APIRouter()
+
+        self.assertIn(
+            router.db_for_read(self.get_model('analytics')),
+            ['analytics_replica_1', 'analytics_replica_2']
+        )
+        self.assertEqual(
+            'analytics_replica_2',
+            router.db_for_read(
+                self.get_model('session'),
+                instance=self.get_instance('analytics_replica_2')
+            )
+        )
+        self.assertEqual(
+            'analytics_ingest',
+            router.db_for_write(self.get_model('activity'))
+        )
+        self.assertEqual(
+            settings.ANALYTICS_DB_ALIAS,
+            router.db_for_write(self.get_model('analytics'))
+        )
+        self.assertIsNone(router.db_for_read(self.get_model('feed')))
+        self.assertIsNone(router.db_for_write(self.get_model('feed')))
+
+    def test_relations_and_migrations(self):
+        router = APIRouter()
+
+        self.assertTrue(router.allow_relation(
+            self.get_instance('analytics_replica_1'),
+            self.get_instance(settings.ANALYTICS_DB_ALIAS)
+        ))
+        self.assertIsNone(router.allow_relation(
+            self.get_instance('analytics_replica_1'),
+            self.get_instance('default')
+        ))
+        self.assertFalse(
+            router.allow_migrate('analytics_replica_1', 'PoleLuxe', 'session')
+        )
+        self.assertTrue(
+            router.allow_migrate(settings.ANALYTICS_DB_ALIAS, 'PoleLuxe', 'session')
+        )
+        self.assertFalse(router.allow_migrate('default', 'PoleLuxe', 'session'))
+        self.assertIsNone(router.allow_migrate('default', 'PoleLuxe', 'feed'))
@@ -2,6 +2,7 @@ from django.conf import settings
 from oauth2_provider.contrib.rest_framework import OAuth2Authentication
 from rest_framework import authentication
 
+from PoleLuxe.helpers.user_token_cache import user_token_cache_helper
 from PoleLuxe.models import User
 from api.v1.helpers import push_notification
 from api.v1.serializers import LogoutSerializer
@@ -20,16 +21,35 @@ class LegacyTokenAuthentication(authentication.BaseAuthentication):  # pragma: n
         :return User: The first user found having the header token.
         """
         token_param = request.META.get('HTTP_X_AUTH_TOKEN')
-        users = User.objects.filter(token=token_param).exclude(
-            token__isnull=True)
-
-        user = users.first()
+        user = self.get_user_by_token(token_param)
 
         if user is not None:
             request.authenticated_user = user
 
         return user
 
+    def get_user_by_token(self, token):
+        """
+        With `ENABLE_AUTH_CACHE`, users are read from the authentication
+        cache first.
+
+        :return User: The first user found having the token.
+        """
+        if not user_token_cache_helper.is_enabled():
+            return User.objects.filter(token=token).exclude(
+                token__isnull=True).first()
+
+        if token is None:
+            return None
+
+        user = user_token_cache_helper.get_by_token(token)
+        if user is None:
+            user = User.objects.filter(token=token).first()
+            if user is not None:
+                user_token_cache_helper.set_by_token(token, user)
+
+        return user
+
     def authenticate_by_id(self, request):
         """
         Authenticate by User ID instead by token.
@@ -54,10 +74,12 @@ class LegacyTokenAuthentication(authentication.BaseAuthentication):  # pragma: n
 
         :param User user: User model instance.
         """
+        token = user.token
         user.uuid = None
         user.token = None
         user.is_login = False
         user.save()
+        user_token_cache_helper.invalidate(user, token=token)
         push_notification.delete_devices(user.id)
 
     def logout(self, request):
@@ -87,17 +109,39 @@ class WithMultipleLogoutAuthentication(LegacyTokenAuthentication):
             On error returns bool(False) and None
         """
         status = {token: False for token in tokens}
-        for token in tokens:
-            try:
-                user = User.objects.get(token=token.strip())
-                self.clear_credentials(user)
 
+        stripped_tokens = {token.strip() for token in tokens}
+        users = list(User.objects.filter(token__in=stripped_tokens))
+        if not users:
+            return status
+
+        self.clear_credentials_bulk(users)
+
+        # Like logging out one token after the other, only the first
+        # occurrence of a token succeeds.
+        logged_out_tokens = {user.token for user in users}
+        for token in tokens:
+            if token.strip() in logged_out_tokens:
+                logged_out_tokens.remove(token.strip())
                 status[token] = True
-            except User.DoesNotExist:
-                pass
 
         return status
 
+    def clear_credentials_bulk(self, users):
+        """
+        `clear_credentials()` for several users with a single UPDATE.
+
+        :param list users: User model instances, still holding their token.
+        """
+        User.objects.filter(
+            id__in=[user.id for user in users]
+        ).update(uuid=None, token=None, is_login=False)
+
+        for user in users:
+            # UPDATE sends no post_save, forget the cached users here.
+            user_token_cache_helper.invalidate(user)
+            push_notification.delete_devices(user.id)
+
     def logout(self, request):
         """
         Logout a user of list of users(from list of tokens).
@@ -156,13 +200,32 @@ class CustomOAuth2Authentication(OAuth2Authentication):
             return None
 
         # user is tuple when successful
-        app_user = User.objects.filter(
-            django_user=user[0]
-        ).first()
+        app_user = self.get_app_user(user[0])
 
         request.authenticated_user = app_user
         return app_user, user[1]
 
+    def get_app_user(self, django_user):
+        """
+        With `ENABLE_AUTH_CACHE`, users are read from the authentication
+        cache first.
+
+        :return User: The first user of the Django user.
+        """
+        if not user_token_cache_helper.is_enabled():
+            return User.objects.filter(django_user=django_user).first()
+
+        app_user = user_token_cache_helper.get_by_django_user(django_user.pk)
+        if app_user is None:
+            app_user = User.objects.filter(django_user=django_user).first()
+            if app_user is not None:
+                user_token_cache_helper.set_by_django_user(
+                    django_user.pk,
+                    app_user
+                )
+
+        return app_user
+
     def authenticate_header(self, request):
         return "Bearer"
 
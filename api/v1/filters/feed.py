@@ -1,15 +1,13 @@
 import coreapi
 import coreschema
 
-from django.db.models import Q
-
 from rest_framework import filters
 from rest_framework import exceptions
 
 from PoleLuxe.constants import CategoryType
+from PoleLuxe.helpers.user_group_cache import user_group_cache_helper
 from PoleLuxe.models import (
     Feed,
-    Media,
     UserGroup,
 )
 from api.v1.views.base import (
@@ -97,6 +95,16 @@ SCHEMA_FIELDS = [
         schema=coreschema.Integer(),
         description='''Only show pinned feed with tag
         '''
+    ),
+    coreapi.Field(
+        name='cursor',
+        location='query',
+        required=False,
+        schema=coreschema.String(),
+        description='''Cursor pagination, used instead of `oldest_feed_id`.
+        Send it empty for the first page, then follow the `Next-Page-Link`
+        response header.
+        '''
     )
 ]
 
@@ -109,11 +117,12 @@ class FeedFilterBackend(filters.BaseFilterBackend):
 
         category = request.query_params.get('category')
 
-        try:
-            user_group = UserGroup.objects.get(
-                pk=user_group_id
-            )
-        except UserGroup.DoesNotExist:
+        if user_group_cache_helper.is_enabled():
+            user_group = user_group_cache_helper.get(user_group_id)
+        else:
+            user_group = UserGroup.objects.filter(pk=user_group_id).first()
+
+        if user_group is None:
             raise exceptions.NotFound(
                 detail='Usergroup {}'.format(user_group_id)
             )
@@ -136,10 +145,7 @@ class FeedFilterBackend(filters.BaseFilterBackend):
             excluded_types=[Feed.COLLEAGUE_COMPLETED_QUIZ_TYPE],
         ).filter_evaluation_reminders(
             request.authenticated_user
-        ).exclude(
-            Q(type=Feed.NEW_POSTED_MEDIA_TYPE) &
-            Q(model_id__in=Media.objects.filter(type=Media.TEXT_TYPE))
-        ).exclude(
+        ).exclude_text_media().exclude(
             # exclude pinned in normal feed
             is_pinned=True
         )
@@ -0,0 +1,137 @@
+from django.conf import settings
+from django.db.models import Count
+
+from PoleLuxe.helpers.feed_counter import feed_counter_helper
+from PoleLuxe.models.feed import FeedCounter
+from PoleLuxe.models import (
+    FeedComment,
+    FeedLikeLog,
+    KnowledgeComment,
+    KnowledgeLikeLog,
+    LuxuryCultureComment,
+    LuxuryCultureLikeLog,
+)
+
+
+class FeedCounterLoader(object):
+    """
+    Like and comment counters for a page of feeds.
+
+    Counters are keyed by the liked object: the feed itself (`feed_id`) or
+    the content it links to (`knowledge_id`, `luxury_culture_id`). The
+    first time a key is read, the counters of every object of the page for
+    that key are loaded with grouped aggregate queries, so the number of
+    queries does not depend on the page size.
+
+    With `ENABLE_FEED_COUNTER_STORE` the counts are read from the
+    denormalized `FeedCounter` store instead of counting like and comment
+    rows; only the current user's liked/commented flags are queried.
+    """
+    FEED = 'feed_id'
+    KNOWLEDGE = 'knowledge_id'
+    LUXURY_CULTURE = 'luxury_culture_id'
+
+    MODELS = {
+        FEED: (FeedLikeLog, FeedComment),
+        KNOWLEDGE: (KnowledgeLikeLog, KnowledgeComment),
+        LUXURY_CULTURE: (LuxuryCultureLikeLog, LuxuryCultureComment),
+    }
+
+    COUNTER_CONTENT_TYPES = {
+        FEED: FeedCounter.FEED,
+        KNOWLEDGE: FeedCounter.KNOWLEDGE,
+        LUXURY_CULTURE: FeedCounter.LUXURY_CULTURE,
+    }
+
+    def __init__(self, feeds, user_id, user_group_id):
+        """
+        :param list feeds: Feed instances of the page
+        :param int user_id: Current user ID
+        :param int user_group_id: Current user group ID
+        """
+        self.feeds = feeds
+        self.user_id = user_id
+        self.user_group_id = user_group_id
+        self._counters = {}
+
+    def get_object_ids(self, key):
+        if key == self.FEED:
+            return [feed.id for feed in self.feeds]
+
+        # `<key>_id` is the raw column value of the foreign key.
+        return list({
+            getattr(feed, key + '_id')
+            for feed in self.feeds
+            if getattr(feed, key + '_id')
+        })
+
+    def load_counts(self, key, object_ids):
+        """
+        :return tuple(dict, dict): like counts and comment counts by object ID
+        """
+        if getattr(settings, 'ENABLE_FEED_COUNTER_STORE', False):
+            counters = feed_counter_helper.get_counters(
+                self.COUNTER_CONTENT_TYPES[key],
+                object_ids,
+                self.user_group_id
+            )
+            return (
+                {i: like_count for i, (like_count, _) in counters.items()},
+                {i: comment_count for i, (_, comment_count) in counters.items()},
+            )
+
+        like_model, comment_model = self.MODELS[key]
+        in_page = {'%s__in' % key: object_ids}
+
+        like_counts = like_model.objects.filter(
+            user_id__user_group_id=self.user_group_id,
+            **in_page
+        ).order_by().values_list(key).annotate(count=Count('id'))
+
+        comment_counts = comment_model.objects.filter(
+            user_group_id=self.user_group_id,
+            **in_page
+        ).order_by().values_list(key).annotate(count=Count('id'))
+
+        return dict(like_counts), dict(comment_counts)
+
+    def load(self, key):
+        like_model, comment_model = self.MODELS[key]
+        object_ids = self.get_object_ids(key)
+        in_page = {'%s__in' % key: object_ids}
+
+        like_counts, comment_counts = self.load_counts(key, object_ids)
+
+        liked_ids = like_model.objects.filter(
+            user_id=self.user_id,
+            **in_page
+        ).values_list(key, flat=True).distinct()
+
+        commented_ids = comment_model.objects.filter(
+            user_id=self.user_id,
+            **in_page
+        ).values_list(key, flat=True).distinct()
+
+        return {
+            'like_count': like_counts,
+            'comment_count': comment_counts,
+            'liked': set(liked_ids),
+            'commented': set(commented_ids),
+        }
+
+    def get_counters(self, key):
+        if key not in self._counters:
+            self._counters[key] = self.load(key)
+        return self._counters[key]
+
+    def like_count(self, key, object_id):
+        return self.get_counters(key)['like_count'].get(object_id, 0)
+
+    def comment_count(self, key, object_id):
+        return self.get_counters(key)['comment_count'].get(object_id, 0)
+
+    def liked(self, key, object_id):
+        return object_id in self.get_counters(key)['liked']
+
+    def commented(self, key, object_id):
+        return object_id in self.get_counters(key)['commented']
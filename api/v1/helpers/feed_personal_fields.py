@@ -0,0 +1,180 @@
+from PoleLuxe.helpers.read_set import read_set_helper
+from PoleLuxe.models import (
+    Feed,
+    Media,
+    ReadFeed,
+    UserKnowledgeQuizResult,
+)
+
+from api.v1.helpers.feed_counters import FeedCounterLoader
+
+
+class FeedPersonalFields(object):
+    """
+    Fields of a rendered feed page that depend on the current user.
+
+    They are loaded in bulk for the whole page and written over the
+    rendered items, so a page rendered for another user of the same user
+    group can be served as is.
+    """
+
+    def __init__(self, user_id, include_keys, using=None):
+        """
+        :param int user_id: Current user ID
+        :param list include_keys: `include` parameter of the request
+        :param string using: database alias to read from
+        """
+        self.user_id = user_id
+        self.include_keys = include_keys
+        self.using = using
+
+    def get_ids(self, items, key, feed_type=None):
+        return {
+            item[key]
+            for item in items
+            if item.get(key) and (feed_type is None or item['type'] == feed_type)
+        }
+
+    def get_content_key(self, item):
+        if item.get('knowledge_id'):
+            return FeedCounterLoader.KNOWLEDGE
+        if item.get('luxury_culture_id'):
+            return FeedCounterLoader.LUXURY_CULTURE
+        return None
+
+    def load_content_flags(self, items):
+        """
+        :return dict: (content key, object id) -> (liked, commented)
+        """
+        flags = {}
+        for key in (FeedCounterLoader.KNOWLEDGE, FeedCounterLoader.LUXURY_CULTURE):
+            object_ids = self.get_ids(
+                items,
+                key,
+                Feed.NEW_CONTENT_AVAILABLE_TYPE
+            )
+            if not object_ids:
+                continue
+
+            like_model, comment_model = FeedCounterLoader.MODELS[key]
+            in_page = {'%s__in' % key: object_ids}
+            liked_ids = set(like_model.objects.using(self.using).filter(
+                user_id=self.user_id,
+                **in_page
+            ).values_list(key, flat=True))
+            commented_ids = set(comment_model.objects.using(self.using).filter(
+                user_id=self.user_id,
+                **in_page
+            ).values_list(key, flat=True))
+
+            for object_id in object_ids:
+                flags[key, object_id] = (
+                    object_id in liked_ids,
+                    object_id in commented_ids,
+                )
+
+        return flags
+
+    def load_media_flags(self, items):
+        """
+        :return dict: media id -> (liked, commented)
+        """
+        media_ids = self.get_ids(items, 'model_id', Feed.NEW_POSTED_MEDIA_TYPE)
+        if not media_ids:
+            return {}
+
+        media = Media.objects.using(self.using).filter(id__in=media_ids)
+        liked_ids = set(media.filter(
+            likes__id=self.user_id
+        ).values_list('id', flat=True))
+        commented_ids = set(media.filter(
+            comments__id=self.user_id
+        ).values_list('id', flat=True))
+
+        return {
+            media_id: (media_id in liked_ids, media_id in commented_ids)
+            for media_id in media_ids
+        }
+
+    def load_quiz_results(self, items):
+        """
+        :return dict: knowledge id -> latest quiz result of the user
+        """
+        knowledge_ids = self.get_ids(items, 'knowledge_id')
+        if not knowledge_ids:
+            return {}
+
+        quiz_results = {}
+        for knowledge_id, points, result in UserKnowledgeQuizResult.objects.using(
+            self.using
+        ).filter(
+            user_id=self.user_id,
+            knowledge_id__in=knowledge_ids
+        ).order_by('-created_at').values_list('knowledge_id', 'points', 'result'):
+            quiz_results.setdefault(knowledge_id, {
+                'points': points,
+                'result': round(result, 2)
+            })
+
+        return quiz_results
+
+    def apply(self, items):
+        """
+        Overwrite the personal fields of rendered feeds in place.
+
+        :param list items: rendered feeds
+        :return list: `items`
+        """
+        if not items:
+            return items
+
+        feed_ids = [item['id'] for item in items]
+        read_feeds = ReadFeed.objects.using(self.using).filter(
+            feed_id__in=feed_ids
+        )
+
+        if any('read' in item for item in items):
+            # Same as the `read` field: read by anyone.
+            read_ids = set(
+                read_feeds.values_list('feed_id', flat=True).distinct()
+            )
+            for item in items:
+                if 'read' in item:
+                    item['read'] = item['id'] in read_ids
+
+        if 'is_read' in self.include_keys:
+            user_read_ids = read_set_helper.get_read_ids(
+                self.user_id,
+                feed_ids,
+                using=self.using
+            )
+            for item in items:
+                item['is_read'] = item['id'] in user_read_ids
+
+        if 'quiz_result' in self.include_keys:
+            quiz_results = self.load_quiz_results(items)
+            for item in items:
+                item.pop('quiz_result', None)
+                if item.get('knowledge_id') in quiz_results:
+                    item['quiz_result'] = quiz_results[item['knowledge_id']]
+
+        if 'more_details' in self.include_keys:
+            content_flags = self.load_content_flags(items)
+            media_flags = self.load_media_flags(items)
+
+            for item in items:
+                details = item.get('more_details')
+                if not isinstance(details, dict) or 'liked' not in details:
+                    continue
+
+                flags = None
+                if item['type'] == Feed.NEW_CONTENT_AVAILABLE_TYPE:
+                    key = self.get_content_key(item)
+                    flags = content_flags.get((key, item.get(key)))
+                elif item['type'] == Feed.NEW_POSTED_MEDIA_TYPE:
+                    flags = media_flags.get(item.get('model_id'))
+
+                if flags is not None:
+                    details['liked'], details['commented'] = flags
+
+        return items
@@ -1,5 +1,9 @@
+from collections import defaultdict
+
 from django.conf import settings
 from django.core.cache import cache
+from django.db import models
+from django.db.models import prefetch_related_objects
 
 from rest_framework import serializers
 from rest_framework.settings import api_settings
@@ -9,8 +13,6 @@ from PoleLuxe.models import (
     Feed,
     FeedComment,
     FeedLikeLog,
-    KnowledgeTranslation,
-    LuxuryCultureTranslation,
     Media,
     ReadFeed,
     UserKnowledgeQuizResult,
@@ -21,6 +23,11 @@ from PoleLuxe.translations import (
 )
 from PoleLuxe.constants import FeedReferenceModelType
 
+from PoleLuxe.helpers.content_translation import ContentTitles
+from PoleLuxe.helpers.feed_page_cache import feed_page_cache_helper
+from PoleLuxe.helpers.read_set import read_set_helper
+
+from api.v1.helpers.feed_counters import FeedCounterLoader
 from api.v1.mixins import serializers as serializer_mixins
 from .media import MediaForFeedSerializer
 from .daily_challenge import DailyChallengeResultForFeedSerializer
@@ -44,6 +51,70 @@ class ForFeedSerializer(serializers.Serializer):
         raise NotImplementedError()
 
 
+class WithFeedCounters(object):
+    """
+    Like and comment counters of a feed.
+
+    Read from the page-level `feed_counters` loader when the feed is
+    rendered as part of a list, otherwise counted for this feed only.
+    """
+
+    def get_like_count(self, obj):
+        counters = self.context.get('feed_counters')
+        if counters is not None:
+            return counters.like_count(FeedCounterLoader.FEED, obj.id)
+
+        return FeedLikeLog.objects.filter(
+            feed_id=obj.id,
+            user_id__user_group_id=self.context.get('user_group_id')
+        ).count()
+
+    def get_comment_count(self, obj):
+        counters = self.context.get('feed_counters')
+        if counters is not None:
+            return counters.comment_count(FeedCounterLoader.FEED, obj.id)
+
+        return FeedComment.objects.filter(
+            feed_id=obj.id,
+            user_group_id=self.context.get('user_group_id')
+        ).count()
+
+    def get_liked(self, obj):
+        counters = self.context.get('feed_counters')
+        if counters is not None:
+            return counters.liked(FeedCounterLoader.FEED, obj.id)
+
+        return FeedLikeLog.objects.filter(
+            feed_id=obj.id,
+            user_id=self.context.get('user_id')
+        ).count() > 0
+
+    def get_commented(self, obj):
+        counters = self.context.get('feed_counters')
+        if counters is not None:
+            return counters.commented(FeedCounterLoader.FEED, obj.id)
+
+        return FeedComment.objects.filter(
+            feed_id=obj.id,
+            user_id=self.context.get('user_id')
+        ).count() > 0
+
+
+class WithContentTitles(object):
+    """
+    Translated titles of knowledges and luxury cultures.
+
+    Read from the page-level `content_titles` when the feed is rendered as
+    part of a list, otherwise resolved for this content only.
+    """
+
+    def get_content_title(self, content):
+        titles = self.context.get('content_titles')
+        if titles is None:
+            titles = ContentTitles(self.context.get('language_code'))
+        return titles.get_title(content)
+
+
 class EvaluationReminderForFeedSerializer(ForFeedSerializer):
     def get_title(self, obj):
         return 'Evaluation Reminder'
@@ -57,9 +128,125 @@ class EvaluationReminderForFeedSerializer(ForFeedSerializer):
         return -1
 
 
+class FeedListSerializer(serializers.ListSerializer):
+    """
+    List serializer used by `FeedSerializer` when `many=True`.
+
+    Resolves `include=more_details` for the whole page at once: the page is
+    grouped by feed type and the related objects of each type are loaded in
+    bulk before any row is rendered.
+
+    When the child serializer supports it, rendered feeds are cached per
+    user group, language and include set, and only the fields depending on
+    the current user are loaded for every request.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        feeds = list(iterable)
+
+        if self.child.use_fragment_cache():
+            return self.to_cached_representation(feeds)
+
+        return self.render(feeds)
+
+    def render(self, feeds):
+        self.child.preload_content_titles(feeds)
+        self.child.preload_read_flags(feeds)
+
+        include = self.context.get('include')
+        if include and 'more_details' in include.split(','):
+            self.child.preload_more_details(feeds)
+
+        return [self.child.to_representation(item) for item in feeds]
+
+    def to_cached_representation(self, feeds):
+        """
+        Serve the shared part of each feed from the fragment cache, render
+        and cache the missing ones, then merge the fields of the current
+        user on top.
+        """
+        include = self.context.get('include') or ''
+        child_class = type(self.child)
+        # Daily challenge feeds are their owner's own, never shared.
+        keys = feed_page_cache_helper.get_fragment_keys(
+            [
+                feed.id for feed in feeds
+                if feed.type != Feed.COMPLETE_DAILY_CHALLENGE_TYPE
+            ],
+            {
+                'serializer': child_class.__module__ + '.' + child_class.__name__,
+                'language_code': self.context.get('language_code'),
+                'include': sorted(set(include.split(','))),
+            },
+            self.context.get('user_group_id')
+        )
+        fragments = feed_page_cache_helper.get_fragments(list(keys.values()))
+
+        rendered = {}
+        missing_feeds = [
+            feed for feed in feeds if keys.get(feed.id) not in fragments
+        ]
+        if missing_feeds:
+            rendered = dict(zip(
+                [feed.id for feed in missing_feeds],
+                self.render(missing_feeds)
+            ))
+            feed_page_cache_helper.set_fragments({
+                keys[feed_id]: data
+                for feed_id, data in rendered.items()
+                if feed_id in keys
+            })
+
+        items = [
+            rendered[feed.id] if feed.id in rendered
+            else fragments[keys[feed.id]]
+            for feed in feeds
+        ]
+        return self.child.personal_fields_class(
+            self.context.get('user_id'),
+            include.split(','),
+            using=feeds[0]._state.db if feeds else None
+        ).apply(items)
+
+
 class FeedSerializer(serializers.ModelSerializer):
+    # Related objects rendered in `more_details`, per feed type.
+    MORE_DETAILS_RELATED = {
+        Feed.COMPLETE_DAILY_CHALLENGE_TYPE: [
+            'daily_challenge_result_id__daily_challenge_id',
+        ],
+        Feed.TIPS_OF_THE_DAY_TYPE: [
+            'tips_of_the_day_id__knowledge_id',
+            'tips_of_the_day_id__luxury_culture_id',
+        ],
+        Feed.COLLEAGUE_LEVEL_UP_TYPE: [
+            'user_id__user_position_id',
+            'user_level_up_log_id',
+        ],
+        Feed.COLLEAGUE_COMPLETED_QUIZ_TYPE: [
+            'user_id__user_position_id',
+            'knowledge_id',
+        ],
+        Feed.NEW_CONTENT_AVAILABLE_TYPE: [
+            'knowledge_id',
+            'luxury_culture_id',
+            'user_id__company_id__app',
+            'user_group_id__company_id__app',
+        ],
+        Feed.UPDATED_RANKING_AVAILABLE_TYPE: [
+            'user_id__company_id__app',
+            'user_group_id__company_id__app',
+        ],
+    }
+
+    # Merges the user dependent fields over cached feed fragments; None
+    # when the rendered feeds can not be shared between users.
+    personal_fields_class = None
+
     class Meta:
         model = Feed
+        list_serializer_class = FeedListSerializer
         fields = [
             'id',
             'type',
@@ -78,74 +265,180 @@ class FeedSerializer(serializers.ModelSerializer):
             'video_title'
         ]
 
+    # Context key of the language titles are translated to.
+    language_context_key = 'language_code'
+
+    def preload_content_titles(self, feeds):
+        """
+        Translate the titles of the contents of a page of feeds together,
+        the first time one of them is read.
+
+        :param list feeds: Feed instances of the current page
+        """
+        # `<field>_id` is the raw column value of the foreign key.
+        self._content_titles = ContentTitles(
+            self.context.get(self.language_context_key),
+            knowledge_ids=[
+                feed.knowledge_id_id for feed in feeds if feed.knowledge_id_id
+            ],
+            luxury_culture_ids=[
+                feed.luxury_culture_id_id
+                for feed in feeds
+                if feed.luxury_culture_id_id
+            ],
+        )
+
+    def get_content_titles(self):
+        titles = getattr(self, '_content_titles', None)
+        if titles is None:
+            titles = ContentTitles(self.context.get(self.language_context_key))
+        return titles
+
+    def preload_read_flags(self, feeds):
+        """
+        Load whether the current user read each feed of a page in one call,
+        for `include=is_read`.
+
+        :param list feeds: Feed instances of the current page
+        """
+        include = self.context.get('include')
+        if not feeds or not include or 'is_read' not in include.split(','):
+            return
+
+        self._read_feed_ids = read_set_helper.get_read_ids(
+            self.context['request'].authenticated_user.id,
+            [feed.id for feed in feeds],
+            using=feeds[0]._state.db
+        )
+
+    def use_fragment_cache(self):
+        return (self.personal_fields_class is not None and
+                getattr(settings, 'ENABLE_FEED_FRAGMENT_CACHE', False) and
+                self.context.get('user_group_id') is not None)
+
+    def preload_more_details(self, feeds):
+        """
+        Load the related objects of a page of feeds with one query per
+        relation instead of one query per feed.
+
+        :param list feeds: Feed instances of the current page
+        """
+        feeds_by_type = defaultdict(list)
+        for feed in feeds:
+            feeds_by_type[feed.type].append(feed)
+
+        for feed_type, lookups in self.MORE_DETAILS_RELATED.items():
+            if feeds_by_type[feed_type]:
+                prefetch_related_objects(feeds_by_type[feed_type], *lookups)
+
+        self._feed_counters = FeedCounterLoader(
+            feeds,
+            user_id=self.context.get('user_id'),
+            user_group_id=self.context.get('user_group_id'),
+        )
+
+        media_ids = [
+            feed.model_id
+            for feed in feeds_by_type[Feed.NEW_POSTED_MEDIA_TYPE]
+        ]
+        self._preloaded_media = {}
+        if media_ids:
+            self._preloaded_media = Media.objects.using(
+                feeds[0]._state.db
+            ).select_related(
+                'user'
+            ).prefetch_related(
+                'resources'
+            ).in_bulk(media_ids)
+
+    def get_media(self, obj):
+        """
+        :raise Media.DoesNotExist
+        """
+        if getattr(self, '_preloaded_media', None) is not None:
+            try:
+                return self._preloaded_media[obj.model_id]
+            except KeyError:
+                raise Media.DoesNotExist()
+
+        return Media.objects.get(pk=obj.model_id)
+
+    def get_details_data(self, serializer_class, obj, *context_keys):
+        """
+        Render `obj` with a per-type serializer. One serializer instance is
+        kept per class so a page of feeds does not rebuild its fields for
+        every row.
+        """
+        details_serializers = self.__dict__.setdefault(
+            '_details_serializers', {}
+        )
+        serializer = details_serializers.get(serializer_class)
+        if serializer is None:
+            context = {key: self.context.get(key) for key in context_keys}
+            context['feed_counters'] = getattr(self, '_feed_counters', None)
+            context['content_titles'] = getattr(self, '_content_titles', None)
+            serializer = serializer_class(context=context)
+            details_serializers[serializer_class] = serializer
+
+        return serializer.to_representation(obj)
+
     def get_more_details(self, obj):
         """
         Source code logic from DetailFeedSerializer.get_others()
         """
         if (obj.type == Feed.COMPLETE_DAILY_CHALLENGE_TYPE and
                 obj.daily_challenge_result_id):
-            return DailyChallengeResultForFeedSerializer(
-                DailyChallengeResult.objects.get(
-                    pk=obj.daily_challenge_result_id.id
-                ),
-                context={
-                    'language_code': self.context.get('language_code')
-                }
-            ).data
+            return self.get_details_data(
+                DailyChallengeResultForFeedSerializer,
+                obj.daily_challenge_result_id,
+                'language_code'
+            )
 
         if obj.type == Feed.TIPS_OF_THE_DAY_TYPE:
-            return TipsOfTheDayForFeedSerializer(
+            return self.get_details_data(
+                TipsOfTheDayForFeedSerializer,
                 obj,
-                context={
-                    'language_code': self.context.get('language_code')
-                }
-            ).data
+                'language_code'
+            )
 
         if obj.type == Feed.COLLEAGUE_LEVEL_UP_TYPE:
-            return LevelUpForFeedSerializer(
+            return self.get_details_data(
+                LevelUpForFeedSerializer,
                 obj,
-                context={
-                    'user_id': self.context.get('user_id'),
-                    'user_group_id': self.context.get('user_group_id')
-                }
-            ).data
+                'user_id', 'user_group_id'
+            )
 
         if obj.type == Feed.COLLEAGUE_COMPLETED_QUIZ_TYPE:
-            return CompletedQuizForFeedSerializer(
+            return self.get_details_data(
+                CompletedQuizForFeedSerializer,
                 obj,
-                context={
-                    'user_id': self.context.get('user_id'),
-                    'user_group_id': self.context.get('user_group_id'),
-                    'language_code': self.context.get('language_code')
-                }
-            ).data
+                'user_id', 'user_group_id', 'language_code'
+            )
 
         if obj.type == Feed.NEW_CONTENT_AVAILABLE_TYPE:
-            return NewContentForFeedSerializer(
+            return self.get_details_data(
+                NewContentForFeedSerializer,
                 obj,
-                context={
-                    'user_id': self.context.get('user_id'),
-                    'user_group_id': self.context.get('user_group_id'),
-                    'language_code': self.context.get('language_code')
-                }
-            ).data
+                'user_id', 'user_group_id', 'language_code'
+            )
 
         if obj.type == Feed.UPDATED_RANKING_AVAILABLE_TYPE:
-            return NewRankingForFeedSerializer(
+            return self.get_details_data(
+                NewRankingForFeedSerializer,
                 obj,
-                context={
-                    'user_id': self.context.get('user_id'),
-                    'user_group_id': self.context.get('user_group_id')
-                }
-            ).data
+                'user_id', 'user_group_id'
+            )
 
         if obj.type == Feed.EVALUATION_REMINDER_TYPE:
-            return EvaluationReminderForFeedSerializer(obj).data
+            return self.get_details_data(
+                EvaluationReminderForFeedSerializer,
+                obj
+            )
 
         try:
             if obj.type == Feed.NEW_POSTED_MEDIA_TYPE:
                 return MediaForFeedSerializer(
-                    Media.objects.get(pk=obj.model_id),
+                    self.get_media(obj),
                     context={
                         'user_id': self.context.get('user_id'),
                         'user_group_id': self.context.get('user_group_id'),
@@ -165,10 +458,14 @@ class FeedSerializer(serializers.ModelSerializer):
             if 'model_type' in include_keys:
                 data['model_type'] = obj.get_reference_type()
             if 'is_read' in include_keys:
-                data['is_read'] = ReadFeed.objects.filter(
-                    user=self.context['request'].authenticated_user,
-                    feed=obj
-                ).exists()
+                read_feed_ids = getattr(self, '_read_feed_ids', None)
+                if read_feed_ids is not None:
+                    data['is_read'] = obj.id in read_feed_ids
+                else:
+                    data['is_read'] = ReadFeed.objects.filter(
+                        user=self.context['request'].authenticated_user,
+                        feed=obj
+                    ).exists()
             if 'tags' in include_keys:
                 tags_info = {}
                 if obj.knowledge_id and obj.knowledge_id.tags.count():
@@ -205,6 +502,8 @@ class FeedSerializer(serializers.ModelSerializer):
 
 
 class LegacyFeedSerializer(FeedSerializer):
+    language_context_key = 'language_id'
+
     feed_id = serializers.SerializerMethodField()
     title = serializers.SerializerMethodField()
     feed_type = serializers.SerializerMethodField()
@@ -222,21 +521,10 @@ class LegacyFeedSerializer(FeedSerializer):
             )
 
         knowledge = obj.knowledge_id
-        knowledge_title = knowledge.title
-        knowledge_order = knowledge.order
-
-        if language_code != 'EN':
-            knowledge_translation = KnowledgeTranslation.objects.filter(
-                language_id=language_code,
-                knowledge_id=knowledge.id
-            ).first()
-
-            if knowledge_translation:
-                knowledge_title = knowledge_translation.title
 
         return translations.TRANS_KNOWLEDGE_QUIZ[language_code] % (
-            knowledge_order,
-            knowledge_title
+            knowledge.order,
+            self.get_content_titles().get_title(knowledge)
         )
 
     def get_feed_type(self, obj):
@@ -247,6 +535,7 @@ class LegacyFeedSerializer(FeedSerializer):
 
     class Meta:
         model = Feed
+        list_serializer_class = FeedListSerializer
         fields = ['feed_id', 'title', 'feed_type', 'time_stamp']
 
 
@@ -295,7 +584,7 @@ class TipsOfTheDayForFeedSerializer(
         ]
 
 
-class LevelUpForFeedSerializer(serializers.ModelSerializer):
+class LevelUpForFeedSerializer(WithFeedCounters, serializers.ModelSerializer):
     user_id = serializers.IntegerField(source='user_id.id')
     name = serializers.CharField(source='user_id.name')
     avatar_url = serializers.SerializerMethodField()
@@ -327,30 +616,6 @@ class LevelUpForFeedSerializer(serializers.ModelSerializer):
     def get_avatar_url(self, obj):
         return settings.AWS_CLOUDFRONT_DOMAIN + str(obj.user_id.avatar_url)
 
-    def get_like_count(self, obj):
-        return FeedLikeLog.objects.filter(
-            feed_id=obj.id,
-            user_id__user_group_id=self.context.get('user_group_id')
-        ).count()
-
-    def get_comment_count(self, obj):
-        return FeedComment.objects.filter(
-            feed_id=obj.id,
-            user_group_id=self.context.get('user_group_id')
-        ).count()
-
-    def get_liked(self, obj):
-        return FeedLikeLog.objects.filter(
-            feed_id=obj.id,
-            user_id=self.context.get('user_id')
-        ).count() > 0
-
-    def get_commented(self, obj):
-        return FeedComment.objects.filter(
-            feed_id=obj.id,
-            user_id=self.context.get('user_id')
-        ).count() > 0
-
     def get_trend(self, obj):
         if cache.get('trend_user_%s' % obj.user_id.id) is not None:
             return int(cache.get('trend_user_%s' % obj.user_id.id))
@@ -374,7 +639,11 @@ class LevelUpForFeedSerializer(serializers.ModelSerializer):
         ]
 
 
-class CompletedQuizForFeedSerializer(serializers.ModelSerializer):
+class CompletedQuizForFeedSerializer(
+    WithFeedCounters,
+    WithContentTitles,
+    serializers.ModelSerializer,
+):
     user_id = serializers.IntegerField(source='user_id.id')
     name = serializers.CharField(source='user_id.name')
     avatar_url = serializers.SerializerMethodField()
@@ -393,41 +662,7 @@ class CompletedQuizForFeedSerializer(serializers.ModelSerializer):
         return obj.knowledge_id.order
 
     def get_content(self, obj):
-        language_code = self.context.get('language_code')
-
-        if language_code == 'EN':
-            return obj.knowledge_id.title
-
-        translation = KnowledgeTranslation.objects.filter(
-            language_id=language_code,
-            knowledge_id=obj.knowledge_id_id
-        ).first()
-
-        return translation.title if translation else obj.knowledge_id.title
-
-    def get_like_count(self, obj):
-        return FeedLikeLog.objects.filter(
-            feed_id=obj.id,
-            user_id__user_group_id=self.context.get('user_group_id')
-        ).count()
-
-    def get_comment_count(self, obj):
-        return FeedComment.objects.filter(
-            feed_id=obj.id,
-            user_group_id=self.context.get('user_group_id')
-        ).count()
-
-    def get_liked(self, obj):
-        return FeedLikeLog.objects.filter(
-            feed_id=obj.id,
-            user_id=self.context.get('user_id')
-        ).count() > 0
-
-    def get_commented(self, obj):
-        return FeedComment.objects.filter(
-            feed_id=obj.id,
-            user_id=self.context.get('user_id')
-        ).count() > 0
+        return self.get_content_title(obj.knowledge_id)
 
     class Meta:
         model = Feed
@@ -446,6 +681,8 @@ class CompletedQuizForFeedSerializer(serializers.ModelSerializer):
 
 
 class NewContentForFeedSerializer(
+    WithFeedCounters,
+    WithContentTitles,
     serializer_mixins.WithExtractedImagePaths,
     serializers.ModelSerializer,
 ):
@@ -469,32 +706,12 @@ class NewContentForFeedSerializer(
         return 0
 
     def get_content(self, obj):
-        language_code = self.context.get('language_code')
-
         # knowledge content
         if obj.knowledge_id:
-            if language_code == 'EN':
-                return obj.knowledge_id.title
-
-            knowledge_translation = KnowledgeTranslation.objects.filter(
-                language_id=language_code,
-                knowledge_id=obj.knowledge_id
-            ).first()
-            if knowledge_translation:
-                return knowledge_translation.title
-            return obj.knowledge_id.title
+            return self.get_content_title(obj.knowledge_id)
 
         # luxury culture content
-        if language_code == 'EN':
-            return obj.luxury_culture_id.title
-
-        luxury_culture_translation = LuxuryCultureTranslation.objects.filter(
-            language_id=language_code,
-            luxury_culture_id=obj.luxury_culture_id
-        ).first()
-        if luxury_culture_translation:
-            return luxury_culture_translation.title
-        return obj.luxury_culture_id.title
+        return self.get_content_title(obj.luxury_culture_id)
 
     def get_company(self, obj):
         if not obj.user_id:
@@ -510,30 +727,6 @@ class NewContentForFeedSerializer(
             self.get_company(obj).app.avatar
         )
 
-    def get_like_count(self, obj):
-        return FeedLikeLog.objects.filter(
-            feed_id=obj.id,
-            user_id__user_group_id=self.context.get('user_group_id')
-        ).count()
-
-    def get_comment_count(self, obj):
-        return FeedComment.objects.filter(
-            feed_id=obj.id,
-            user_group_id=self.context.get('user_group_id')
-        ).count()
-
-    def get_liked(self, obj):
-        return FeedLikeLog.objects.filter(
-            feed_id=obj.id,
-            user_id=self.context.get('user_id')
-        ).count() > 0
-
-    def get_commented(self, obj):
-        return FeedComment.objects.filter(
-            feed_id=obj.id,
-            user_id=self.context.get('user_id')
-        ).count() > 0
-
     def get_order(self, obj):
         if obj.knowledge_id:
             return obj.knowledge_id.order
@@ -596,7 +789,7 @@ class NewContentForFeedSerializer(
         ]
 
 
-class NewRankingForFeedSerializer(serializers.ModelSerializer):
+class NewRankingForFeedSerializer(WithFeedCounters, serializers.ModelSerializer):
     user_id = serializers.SerializerMethodField()
     name = serializers.SerializerMethodField()
     avatar_url = serializers.SerializerMethodField()
@@ -622,30 +815,6 @@ class NewRankingForFeedSerializer(serializers.ModelSerializer):
             self.get_company(obj).app.avatar
         )
 
-    def get_like_count(self, obj):
-        return FeedLikeLog.objects.filter(
-            feed_id=obj.id,
-            user_id__user_group_id=self.context.get('user_group_id')
-        ).count()
-
-    def get_comment_count(self, obj):
-        return FeedComment.objects.filter(
-            feed_id=obj.id,
-            user_group_id=self.context.get('user_group_id')
-        ).count()
-
-    def get_liked(self, obj):
-        return FeedLikeLog.objects.filter(
-            feed_id=obj.id,
-            user_id=self.context.get('user_id')
-        ).count() > 0
-
-    def get_commented(self, obj):
-        return FeedComment.objects.filter(
-            feed_id=obj.id,
-            user_id=self.context.get('user_id')
-        ).count() > 0
-
     class Meta:
         model = Feed
         fields = ['user_id',
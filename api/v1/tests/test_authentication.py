@@ -0,0 +1,112 @@
+import mock
+import requests_mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from PoleLuxe.factories import UserFactory
+from PoleLuxe.helpers.user_token_cache import user_token_cache_helper
+from PoleLuxe.models import User
+
+from api.tests.base import BaseAPITestCase
+from api.v1.authentication import legacy, multi_logout
+
+
+@override_settings(ENABLE_AUTH_CACHE=True)
+class TokenAuthenticationCacheTestCase(BaseAPITestCase):
+    @requests_mock.mock()
+    def setUp(self, m):
+        m.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+        super(TokenAuthenticationCacheTestCase, self).setUp()
+
+        cache.clear()
+        user_token_cache_helper.local_cache.clear()
+
+    def authenticate(self, token):
+        return legacy.authenticate(
+            RequestFactory().get('/', HTTP_X_AUTH_TOKEN=token)
+        )
+
+    def test_authenticate_cached(self):
+        self.assertEqual(self.user.id, self.authenticate(self.user.token).id)
+
+        with self.assertNumQueries(0):
+            user = self.authenticate(self.user.token)
+
+        self.assertEqual(self.user.id, user.id)
+        self.assertEqual(self.user.user_group_id_id, user.user_group_id_id)
+        self.assertEqual(self.user.language_id, user.language_id)
+
+    def test_invalidated_on_save(self):
+        token = self.user.token
+        self.authenticate(token)
+
+        user = User.objects.get(pk=self.user.id)
+        user.token = 'new-token'
+        user.save()
+
+        self.assertIsNone(self.authenticate(token))
+        self.assertEqual(user.id, self.authenticate('new-token').id)
+
+    def test_deactivated_by_update(self):
+        self.authenticate(self.user.token)
+        User.objects.filter(pk=self.user.id).update(active=False)
+
+        user = self.authenticate(self.user.token)
+        self.assertEqual('default', user._state.db)
+        # Not snapshotted, read from the row.
+        with self.assertNumQueries(1):
+            self.assertFalse(user.active)
+
+
+class MultipleLogoutTestCase(BaseAPITestCase):
+    @requests_mock.mock()
+    def create_users(self, count, m):
+        m.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+        return [UserFactory() for _ in range(count)]
+
+    @mock.patch('api.v1.authentication.push_notification')
+    def test_logout_multiple(self, push_notification_mock):
+        users = self.create_users(3)
+        tokens = [user.token for user in users] + [
+            ' {} '.format(users[0].token),
+            'unknown-token',
+        ]
+
+        status = multi_logout.logout_multiple(tokens)
+
+        expected_status = {token: False for token in tokens}
+        for user in users:
+            expected_status[user.token] = True
+        self.assertEqual(expected_status, status)
+
+        self.assertFalse(User.objects.filter(
+            id__in=[user.id for user in users],
+            token__isnull=False
+        ).exists())
+        self.assertFalse(User.objects.filter(
+            id__in=[user.id for user in users],
+            is_login=True
+        ).exists())
+        self.assertEqual(
+            sorted(user.id for user in users),
+            sorted(
+                call[0][0]
+                for call in push_notification_mock.delete_devices.call_args_list
+            )
+        )
+
+    @mock.patch('api.v1.authentication.push_notification')
+    def test_logout_multiple_query_count(self, push_notification_mock):
+        """
+        The number of queries does not depend on the number of tokens.
+        """
+        for count in (1, 10, 100):
+            tokens = [user.token for user in self.create_users(count)]
+
+            with self.assertNumQueries(2):
+                status = multi_logout.logout_multiple(tokens)
+
+            self.assertTrue(all(status.values()))
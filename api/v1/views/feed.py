@@ -12,9 +12,10 @@ from ..serializers.feed import (
 from ..filters.feed import FeedFilterBackend, LEGACY_SCHEMA_FIELDS
 from ..decorators import exceptions_catched, active_user_required
 from api import permissions
+from api.pagination import WithCursorPagination
 
 
-class FeedViewSet(ReadOnlyBaseModelViewSet):
+class FeedViewSet(WithCursorPagination, ReadOnlyBaseModelViewSet):
     """
     Manage feeds
     """
@@ -25,6 +26,10 @@ class FeedViewSet(ReadOnlyBaseModelViewSet):
         FeedFilterBackend,
     )
 
+    def use_cursor_pagination(self):
+        return (self.action != 'legacy' and
+                super(FeedViewSet, self).use_cursor_pagination())
+
     def get_permissions(self):
         if self.action != 'legacy':
             self.permission_classes = (permissions.IsCustomAuthenticated,)
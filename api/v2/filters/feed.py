@@ -1,12 +1,15 @@
 from rest_framework import filters
 from rest_framework import exceptions
 
-from django.db.models import Q, Count, Case, When, IntegerField
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Q
 from django.db.models.functions import Coalesce
 
 from PoleLuxe.constants import CategoryType
+from PoleLuxe.helpers.user_group_cache import user_group_cache_helper
 from PoleLuxe.models import (
     Feed,
+    ReadFeed,
     UserGroup
 )
 
@@ -25,18 +28,24 @@ class FeedFilterBackend(filters.BaseFilterBackend):
 
         category = request.query_params.get('category')
 
-        try:
-            user_group = UserGroup.objects.get(
-                pk=user_group_id
-            )
-        except UserGroup.DoesNotExist:
+        if user_group_cache_helper.is_enabled():
+            user_group = user_group_cache_helper.get(user_group_id)
+        else:
+            user_group = UserGroup.objects.filter(pk=user_group_id).first()
+
+        if user_group is None:
             raise exceptions.NotFound(
                 detail='Usergroup {}'.format(user_group_id)
             )
 
         # if pinned tag is detected, use a different filtering
         if pinned_tag_id is not None:
-            return self.filter_by_pinned_tag(pinned_tag_id, request.authenticated_user.id, user_group.id)
+            return self.filter_by_pinned_tag(
+                queryset,
+                pinned_tag_id,
+                request.authenticated_user.id,
+                user_group.id
+            )
 
         if feed_id:
             queryset = queryset.filter(
@@ -65,6 +74,9 @@ class FeedFilterBackend(filters.BaseFilterBackend):
                 Feed.NEW_POSTED_VIDEO_TYPE,
                 Feed.EVALUATION_REMINDER_TYPE
             ],
+            # the page IDs are then read from the feed timelines
+            timeline=(hasattr(view, 'use_feed_timeline') and
+                      view.use_feed_timeline()),
         ).filter_evaluation_reminders(
             request.authenticated_user
         )
@@ -108,25 +120,37 @@ class FeedFilterBackend(filters.BaseFilterBackend):
             Q(type=Feed.NEW_CONTENT_AVAILABLE_TYPE) &
             ((Q(knowledge_id__expiry_date__isnull=True) & Q(luxury_culture_id__isnull=True)) |
                 (Q(luxury_culture_id__expiry_date__isnull=True) & Q(knowledge_id__isnull=True)))
-        ).distinct()
+        )
+
+    def filter_by_pinned_tag(self, queryset, tag_id, user_id, group_id):
+        """
+        Feeds of a pinned tag, unread first, then by publish date.
 
-    def filter_by_pinned_tag(self, tag_id, user_id, group_id):
-        queryset = Feed.objects.filter(pinned_tags__id=tag_id).filter(
+        The read state is an EXISTS subquery on the user's own ReadFeed row,
+        so the other readers of a feed are never joined. With
+        `ENABLE_FEED_PUBLISH_DATE`, the publish date is the stored
+        `Feed.publish_date` rather than a join of both contents.
+        """
+        queryset = queryset.filter(pinned_tags__id=tag_id).filter(
             Q(user_group_id__id=group_id) | Q(user_id__id=user_id)
         )
-        queryset = queryset.annotate(
-            readfeed_count=Count(
-                Case(
-                    When(readfeed__user__id=user_id, then=1),
-                    output_field=IntegerField(),
-                )
-            ),
-            publish_date=Coalesce(
+
+        if getattr(settings, 'ENABLE_FEED_PUBLISH_DATE', False):
+            publish_date = F('publish_date')
+        else:
+            publish_date = Coalesce(
                 'knowledge_id__publish_date',
                 'luxury_culture_id__publish_date',
             )
+
+        queryset = queryset.annotate(
+            is_read=Exists(ReadFeed.objects.filter(
+                feed=OuterRef('pk'),
+                user_id=user_id
+            )),
+            sort_publish_date=publish_date
         )
-        queryset = queryset.order_by('readfeed_count', 'publish_date', 'id')
+        queryset = queryset.order_by('is_read', 'sort_publish_date', 'id')
         return queryset
 
     def get_schema_fields(self, view):
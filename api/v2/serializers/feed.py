@@ -1,20 +1,23 @@
 from django.conf import settings
+from django.db.models import Count
 from rest_framework import serializers
 
 from PoleLuxe.models import (
-    DailyChallengeResult,
     KnowledgeComment,
     KnowledgeLikeLog,
     LuxuryCultureComment,
     LuxuryCultureLikeLog,
     Feed,
     Media,
+    ReadFeed,
 )
 
+from api.v1.helpers.feed_personal_fields import FeedPersonalFields
 from api.v2.serializers.daily_challenge import DailyChallengeResultForFeedSerializer
 from api.v1.serializers.feed import (
     CompletedQuizForFeedSerializer,
     EvaluationReminderForFeedSerializer,
+    FeedListSerializer,
     FeedSerializer as FeedSerializerV1,
     LevelUpForFeedSerializer,
     MediaForFeedSerializer,
@@ -105,6 +108,13 @@ class ActualNewContentForFeedSerializer(NewContentForFeedSerializer):
         ]
 
     def get_like_count(self, obj):
+        counters = self.context.get('feed_counters')
+        if counters is not None:
+            return counters.like_count(
+                self.get_content_key(obj),
+                self.get_likable_object(obj).id
+            )
+
         like_params = {
             self.get_content_key(obj): self.get_likable_object(obj),
             'user_id__user_group_id__id': self.context.get('user_group_id')
@@ -114,6 +124,13 @@ class ActualNewContentForFeedSerializer(NewContentForFeedSerializer):
         ).count()
 
     def get_liked(self, obj):
+        counters = self.context.get('feed_counters')
+        if counters is not None:
+            return counters.liked(
+                self.get_content_key(obj),
+                self.get_likable_object(obj).id
+            )
+
         like_params = {
             self.get_content_key(obj): self.get_likable_object(obj),
             'user_id__id': self.context.get('user_id')
@@ -123,6 +140,13 @@ class ActualNewContentForFeedSerializer(NewContentForFeedSerializer):
         ).exists()
 
     def get_comment_count(self, obj):
+        counters = self.context.get('feed_counters')
+        if counters is not None:
+            return counters.comment_count(
+                self.get_content_key(obj),
+                self.get_likable_object(obj).id
+            )
+
         comment_params = {
             self.get_content_key(obj): self.get_likable_object(obj),
             'user_group_id': self.context.get('user_group_id')
@@ -132,6 +156,13 @@ class ActualNewContentForFeedSerializer(NewContentForFeedSerializer):
         ).count()
 
     def get_commented(self, obj):
+        counters = self.context.get('feed_counters')
+        if counters is not None:
+            return counters.commented(
+                self.get_content_key(obj),
+                self.get_likable_object(obj).id
+            )
+
         comment_params = {
             self.get_content_key(obj): self.get_likable_object(obj),
             'user_id__id': self.context.get('user_id')
@@ -222,18 +253,40 @@ class ActualMediaForFeedSerializer(MediaForFeedSerializer):
             'created_at',
         ]
 
+    def get_media_counters(self, obj):
+        """
+        :return tuple or None: (like count, comment count, liked,
+            commented) preloaded for the page, None when not preloaded
+        """
+        media_counters = self.context.get('media_counters')
+        if media_counters is None:
+            return None
+        return media_counters.get(obj.id, (0, 0, False, False))
+
     def get_like_count(self, obj):
+        counters = self.get_media_counters(obj)
+        if counters is not None:
+            return counters[0]
         return obj.likes.count()
 
     def has_liked(self, obj):
+        counters = self.get_media_counters(obj)
+        if counters is not None:
+            return counters[2]
         return obj.likes.filter(
             id=self.context.get('user_id')
         ).exists()
 
     def get_comment_count(self, obj):
+        counters = self.get_media_counters(obj)
+        if counters is not None:
+            return counters[1]
         return obj.comments.count()
 
     def has_commented(self, obj):
+        counters = self.get_media_counters(obj)
+        if counters is not None:
+            return counters[3]
         return obj.comments.filter(
             id=self.context.get('user_id')
         ).exists()
@@ -241,13 +294,14 @@ class ActualMediaForFeedSerializer(MediaForFeedSerializer):
 
 class FeedSerializer(FeedSerializerV1):
 
-    read = serializers.BooleanField(
-        source='readfeed_set.count',
-        read_only=True
-    )
+    # Read by anyone.
+    read = serializers.SerializerMethodField()
+
+    personal_fields_class = FeedPersonalFields
 
     class Meta:
         model = Feed
+        list_serializer_class = FeedListSerializer
         fields = [
             'id',
             'type',
@@ -267,79 +321,124 @@ class FeedSerializer(FeedSerializerV1):
             'read'
         ]
 
+    def preload_more_details(self, feeds):
+        super(FeedSerializer, self).preload_more_details(feeds)
+
+        self._media_counters = {}
+        if not self._preloaded_media:
+            return
+
+        # Same lookups as `ActualMediaForFeedSerializer`, for the whole page.
+        media = Media.objects.using(feeds[0]._state.db).filter(
+            id__in=list(self._preloaded_media)
+        ).order_by()
+        like_counts = dict(
+            media.values_list('id').annotate(count=Count('likes'))
+        )
+        comment_counts = dict(
+            media.values_list('id').annotate(count=Count('comments'))
+        )
+        user_id = self.context.get('user_id')
+        liked_ids = set(
+            media.filter(likes__id=user_id).values_list('id', flat=True)
+        )
+        commented_ids = set(
+            media.filter(comments__id=user_id).values_list('id', flat=True)
+        )
+
+        self._media_counters = {
+            media_id: (
+                like_counts.get(media_id, 0),
+                comment_counts.get(media_id, 0),
+                media_id in liked_ids,
+                media_id in commented_ids,
+            )
+            for media_id in self._preloaded_media
+        }
+
+    def preload_read_flags(self, feeds):
+        super(FeedSerializer, self).preload_read_flags(feeds)
+
+        if feeds:
+            self._any_read_feed_ids = set(ReadFeed.objects.using(
+                feeds[0]._state.db
+            ).filter(
+                feed_id__in=[feed.id for feed in feeds]
+            ).values_list('feed_id', flat=True).distinct())
+
+    def get_read(self, obj):
+        any_read_feed_ids = getattr(self, '_any_read_feed_ids', None)
+        if any_read_feed_ids is None:
+            return obj.readfeed_set.exists()
+        return obj.id in any_read_feed_ids
+
     def get_more_details(self, obj):
         if (obj.type == Feed.COMPLETE_DAILY_CHALLENGE_TYPE and
                 obj.daily_challenge_result_id):
-            return DailyChallengeResultForFeedSerializer(
-                DailyChallengeResult.objects.get(
-                    pk=obj.daily_challenge_result_id.id
-                ),
-                context={
-                    'language_code': self.context.get('language_code')
-                }
-            ).data
+            return self.get_details_data(
+                DailyChallengeResultForFeedSerializer,
+                obj.daily_challenge_result_id,
+                'language_code'
+            )
 
         if obj.type == Feed.TIPS_OF_THE_DAY_TYPE:
-            return TipsOfTheDayForFeedSerializer(
+            return self.get_details_data(
+                TipsOfTheDayForFeedSerializer,
                 obj,
-                context={
-                    'language_code': self.context.get('language_code')
-                }
-            ).data
+                'language_code'
+            )
 
         if obj.type == Feed.COLLEAGUE_LEVEL_UP_TYPE:
-            return ActualLevelUpForFeedSerializer(
+            return self.get_details_data(
+                ActualLevelUpForFeedSerializer,
                 obj,
-                context={
-                    'user_id': self.context.get('user_id'),
-                    'user_group_id': self.context.get('user_group_id')
-                }
-            ).data
+                'user_id', 'user_group_id'
+            )
 
         if obj.type == Feed.COLLEAGUE_COMPLETED_QUIZ_TYPE:
-            return ActualCompletedQuizForFeedSerializer(
+            return self.get_details_data(
+                ActualCompletedQuizForFeedSerializer,
                 obj,
-                context={
-                    'user_id': self.context.get('user_id'),
-                    'user_group_id': self.context.get('user_group_id'),
-                    'language_code': self.context.get('language_code')
-                }
-            ).data
+                'user_id', 'user_group_id', 'language_code'
+            )
 
         # has like_count
         if obj.type == Feed.NEW_CONTENT_AVAILABLE_TYPE:
-            return ActualNewContentForFeedSerializer(
+            return self.get_details_data(
+                ActualNewContentForFeedSerializer,
                 obj,
-                context={
-                    'user_id': self.context.get('user_id'),
-                    'user_group_id': self.context.get('user_group_id'),
-                    'language_code': self.context.get('language_code')
-                }
-            ).data
+                'user_id', 'user_group_id', 'language_code'
+            )
 
         # has like_count
         if obj.type == Feed.UPDATED_RANKING_AVAILABLE_TYPE:
-            return ActualNewRankingForFeedSerializer(
+            return self.get_details_data(
+                ActualNewRankingForFeedSerializer,
                 obj,
-                context={
-                    'user_id': self.context.get('user_id'),
-                    'user_group_id': self.context.get('user_group_id')
-                }
-            ).data
+                'user_id', 'user_group_id'
+            )
 
         # has like_count
         if obj.type == Feed.EVALUATION_REMINDER_TYPE:
-            return EvaluationReminderForFeedSerializer(obj).data
+            return self.get_details_data(
+                EvaluationReminderForFeedSerializer,
+                obj
+            )
 
         # has like_count
         try:
             if obj.type == Feed.NEW_POSTED_MEDIA_TYPE:
                 return ActualMediaForFeedSerializer(
-                    Media.objects.get(pk=obj.model_id),
+                    self.get_media(obj),
                     context={
                         'user_id': self.context.get('user_id'),
                         'user_group_id': self.context.get('user_group_id'),
                         'feed': obj,
+                        'media_counters': getattr(
+                            self,
+                            '_media_counters',
+                            None
+                        ),
                     }
                 ).data
         except Media.DoesNotExist:
@@ -1,19 +1,46 @@
+import datetime
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from PoleLuxe.constants import CategoryType
+from PoleLuxe.helpers.feed_page_cache import feed_page_cache_helper
+from PoleLuxe.helpers.feed_timeline import feed_timeline_helper
+from PoleLuxe.helpers.replica_selector import replica_selector
 from PoleLuxe.models import Feed
 
+from api.v1.helpers.feed_personal_fields import FeedPersonalFields
 from api.v1.views.base import ReadOnlyBaseModelViewSet
 from api.v2.filters.feed import FeedFilterBackend
 from api.v2.serializers.feed import (
     FeedSerializer
 )
 from api.v1.mixins.views import ReadReplica
+from api.pagination import (
+    CreatedAtCursorPagination,
+    FeedTimelineCursorPagination,
+    PinnedFeedCursorPagination,
+    WithCursorPagination,
+)
 from django.db.models import Count
 
 
-class FeedViewSet(ReadOnlyBaseModelViewSet, ReadReplica):
+class FeedViewSet(WithCursorPagination, ReadOnlyBaseModelViewSet, ReadReplica):
     """
     Manage feeds
     use readonly database
+
+    With `ENABLE_FEED_PAGE_CACHE`, rendered pages are cached per user group,
+    language, include set, category and position, and the fields depending
+    on the user are overlaid on every hit. Cached pages leave out the daily
+    challenge feeds, which are their owner's own: those in the range of the
+    page are loaded and merged in for every request.
+
+    With `ENABLE_FEED_TIMELINE`, cursor pages of the user groups whose
+    timeline is built read their IDs from it, see `FeedTimelineHelper`.
     """
+    PAGE_CACHE_HEADERS = ('Next-Page-Link', 'Prev-Page-Link')
     queryset = Feed.objects.order_by('-id')
     serializer_class = FeedSerializer
 
@@ -22,7 +49,212 @@ class FeedViewSet(ReadOnlyBaseModelViewSet, ReadReplica):
     )
 
     def get_queryset(self):
-        return self.queryset.using(self.get_random_replica_db())
+        return self.queryset.using(self.get_replica_db())
+
+    def get_replica_db(self):
+        """
+        Database the request reads from, picked once per request. With
+        `ENABLE_REPLICA_SELECTOR`, lagging replicas are skipped and users
+        who just wrote read from the primary.
+        """
+        if not hasattr(self, '_replica_db'):
+            if replica_selector.is_enabled():
+                user = getattr(self.request, 'authenticated_user', None)
+                self._replica_db = replica_selector.select(
+                    user.id if user is not None else None
+                )
+            else:
+                self._replica_db = self.get_random_replica_db()
+
+        return self._replica_db
+
+    def get_cursor_pagination_class(self):
+        # pinned feeds have their own ordering
+        if 'pinned_tag_id' in self.request.query_params:
+            return PinnedFeedCursorPagination
+        if self.get_feed_timeline() is not None:
+            return FeedTimelineCursorPagination
+        return super(FeedViewSet, self).get_cursor_pagination_class()
+
+    def get_feed_timeline(self):
+        """
+        :return FeedTimeline or None: None when the list reads from SQL
+        """
+        if not hasattr(self, '_feed_timeline'):
+            self._feed_timeline = None
+
+            params = self.request.query_params
+            if (feed_timeline_helper.is_enabled() and
+                    'feed_id' not in params and
+                    'pinned_tag_id' not in params and
+                    hasattr(self.request, 'authenticated_user')):
+                try:
+                    user_group_id = int(params['user_group_id'])
+                except (KeyError, ValueError):
+                    pass
+                else:
+                    self._feed_timeline = feed_timeline_helper.get_timeline(
+                        user_group_id,
+                        self.request.authenticated_user.id
+                    )
+
+        return self._feed_timeline
+
+    def use_feed_timeline(self):
+        return (self.use_cursor_pagination() and
+                self.get_feed_timeline() is not None)
+
+    def get_page_cache_key(self):
+        """
+        :return string or None: None when the page is not cached
+        """
+        if not getattr(settings, 'ENABLE_FEED_PAGE_CACHE', False):
+            return None
+
+        params = self.request.query_params
+        if ('feed_id' in params or 'pinned_tag_id' in params or
+                'user_group_id' not in params or
+                not hasattr(self.request, 'authenticated_user')):
+            return None
+
+        context = self.get_serializer_context()
+        page_params = {
+            'language_code': context['language_code'],
+            'include': sorted(set(context.get('include', '').split(','))),
+        }
+        for name in ('category', 'cursor', 'oldest_feed_id', 'page', 'page_size'):
+            page_params[name] = params.get(name)
+
+        # Unread pages are the user's own.
+        owner_id = None
+        if params.get('category') == CategoryType.UNREAD:
+            owner_id = self.request.authenticated_user.id
+
+        return feed_page_cache_helper.get_page_key(
+            page_params,
+            params['user_group_id'],
+            owner_id
+        )
+
+    def filter_queryset(self, queryset):
+        queryset = super(FeedViewSet, self).filter_queryset(queryset)
+        if getattr(self, 'shared_page', False):
+            queryset = queryset.exclude(
+                type=Feed.COMPLETE_DAILY_CHALLENGE_TYPE
+            )
+        return queryset
+
+    def get_page_range(self):
+        """
+        Positions, as (created_at, id), of the items of the rendered page
+        and of its bounds: the page holds the feeds older than `upper` and
+        newer than `lower`, None when unbounded.
+
+        :return dict
+        """
+        paginator = self.paginator
+        if isinstance(paginator, CreatedAtCursorPagination):
+            items = paginator.page
+            has_next = paginator.has_next
+            upper = paginator.decode_cursor(self.request)
+        else:
+            page = paginator.page
+            items = list(page)
+            has_next = page.has_next()
+            upper = None
+            if page.number > 1:
+                # The last feed of the previous page.
+                previous = page.paginator.object_list[page.start_index() - 2]
+                upper = (previous.created_at, previous.id)
+
+        positions = [(item.created_at, item.id) for item in items]
+        return {
+            'positions': positions,
+            'upper': upper,
+            'lower': positions[-1] if has_next and positions else None,
+        }
+
+    def get_daily_challenge_items(self, page):
+        """
+        Render the daily challenge feeds of the user in the range of a
+        cached page.
+
+        :return list: (position, rendered feed) pairs
+        """
+        if self.request.query_params.get('category'):
+            # Every category is of other feed types.
+            return []
+
+        queryset = super(FeedViewSet, self).filter_queryset(
+            self.get_queryset()
+        ).filter(
+            type=Feed.COMPLETE_DAILY_CHALLENGE_TYPE,
+            user_id=self.request.authenticated_user.id
+        )
+
+        pagination = CreatedAtCursorPagination()
+        if page['upper'] is not None:
+            queryset = pagination.seek(queryset, *page['upper'])
+        if page['lower'] is not None:
+            queryset = pagination.seek_newer(queryset, *page['lower'])
+
+        feeds = list(queryset.order_by(*pagination.ordering))
+        if not feeds:
+            return []
+
+        return list(zip(
+            [(feed.created_at, feed.id) for feed in feeds],
+            self.get_serializer(feeds, many=True).data
+        ))
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_page_cache_key()
+        if key is None:
+            return super(FeedViewSet, self).list(request, *args, **kwargs)
+
+        self.shared_page = True
+        page = feed_page_cache_helper.get_page(key)
+        if page is None:
+            response = super(FeedViewSet, self).list(request, *args, **kwargs)
+            if (response.status_code != status.HTTP_200_OK or
+                    self.paginator is None):
+                return response
+
+            page = dict(self.get_page_range(), **{
+                'data': response.data,
+                'headers': {
+                    name: response[name]
+                    for name in self.PAGE_CACHE_HEADERS
+                    if response.has_header(name)
+                },
+            })
+            feed_page_cache_helper.set_page(key, page)
+        else:
+            include = self.get_serializer_context().get('include', '')
+            FeedPersonalFields(
+                request.authenticated_user.id,
+                include.split(','),
+                using=self.get_replica_db()
+            ).apply(page['data'])
+
+        items = list(zip(page['positions'], page['data']))
+        daily_challenge_items = self.get_daily_challenge_items(page)
+        if daily_challenge_items:
+            # Newest first, feeds without `created_at` last.
+            items = sorted(
+                items + daily_challenge_items,
+                key=lambda item: (
+                    item[0][0] is not None,
+                    item[0][0] or datetime.datetime.min,
+                    item[0][1],
+                ),
+                reverse=True
+            )
+
+        return Response(
+            [data for _, data in items],
+            headers=page['headers']
+        )
 
     def get_serializer_context(self):
         context = super(FeedViewSet, self).get_serializer_context()
@@ -1,3 +1,5 @@
+import fakeredis
+import mock
 import requests_mock
 import datetime
 import random
@@ -10,9 +12,12 @@ from PIL import Image
 from rest_framework import status
 
 from django.conf import settings
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.db.models import Q
-from django.test.utils import override_settings
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.six.moves.urllib.parse import urlencode
 
 from PoleLuxe.factories import (
     AppLanguageFactory,
@@ -37,6 +42,7 @@ from PoleLuxe.factories import (
     TipsOfTheDayTranslationFactory,
     UserAchievementGroupFactory,
     UserFactory,
+    UserGroupFactory,
     UserKnowledgeQuizResultFactory,
     UserLevelUpLogFactory,
     VideoFactory,
@@ -62,8 +68,12 @@ from PoleLuxe.models import (
     UserKnowledgeQuizResult,
 )
 from PoleLuxe.constants import CategoryType
+from PoleLuxe.helpers.feed_page_cache import feed_page_cache_helper
+from PoleLuxe.helpers.feed_timeline import feed_timeline_helper
 
+from api.pagination import FeedTimelineCursorPagination
 from api.tests.base import BaseAPITestCase
+from api.v2.serializers.feed import FeedSerializer
 from PoleLuxe.factories.pinned import PinnedTagFactory
 
 
@@ -1326,6 +1336,45 @@ class TestFeeds(BaseAPITestCase):
         self.assertEqual(feed1.id, response.data[2]['id'], "Wrong sorting")
         self.assertTrue(response.data[2]['read'])
 
+    @override_settings(ENABLE_FEED_PUBLISH_DATE=True)
+    def test_pinned_filter_cursor_pagination(self):
+        tag = PinnedTagFactory(company=self.user.user_group_id.company_id)
+        base_time = datetime.datetime(year=2020, month=10, day=27, hour=9)
+
+        feeds = []
+        for days in (3, 1, 2, 2):
+            feed = FeedFactory(
+                type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+                knowledge_id=KnowledgeFactory(
+                    publish_date=base_time + datetime.timedelta(days=days)
+                ),
+                user_group_id=self.user.user_group_id,
+                is_pinned=True,
+            )
+            feed.pinned_tags = [tag.id]
+            feeds.append(feed)
+        ReadFeedFactory(user=self.user, feed=feeds[1])
+
+        url = '{}?{}'.format(self.url, urlencode({
+            'user_group_id': self.user.user_group_id.id,
+            'pinned_tag_id': tag.id,
+            'page_size': 1,
+            'cursor': '',
+        }))
+        ids = []
+        while url:
+            response = self.client.get(url, HTTP_X_AUTH_TOKEN=self.user.token)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            ids.extend(item['id'] for item in response.data)
+
+            url = response.get('Next-Page-Link')
+
+        # unread first, then by publish date and id
+        self.assertEqual(
+            [feeds[2].id, feeds[3].id, feeds[0].id, feeds[1].id],
+            ids
+        )
+
     def test_tips(self):
         response = self.client.get(
             self.url,
@@ -1344,6 +1393,426 @@ class TestFeeds(BaseAPITestCase):
         self.assertIn('message', tip['more_details'].keys())
         self.assertIn('publish_date', tip['more_details'].keys())
 
+    def test_list_more_details_same_as_single_feed(self):
+        """
+        Page-level loading of `more_details` renders the same payload as
+        serializing each feed on its own.
+        """
+        response = self.client.get(
+            self.url,
+            data={
+                'user_group_id': self.user.user_group_id.id,
+                'include': 'more_details',
+            },
+            HTTP_X_AUTH_TOKEN=self.user.token,
+        )
+        self.assertEqual(
+            status.HTTP_200_OK,
+            response.status_code
+        )
+
+        context = {
+            'user_id': self.user.id,
+            'user_group_id': str(self.user.user_group_id.id),
+            'language_code': self.user.language_id,
+            'include': 'more_details',
+        }
+        for response_data in response.data:
+            expected = FeedSerializer(
+                Feed.objects.get(pk=response_data['id']),
+                context=context
+            ).data
+            self.assertEqual(
+                expected['more_details'],
+                response_data['more_details']
+            )
+
+    def test_list_more_details_query_count(self):
+        """
+        Rendering `more_details` costs the same number of queries whatever
+        the number of new content and media feeds in the page.
+        """
+        def list_feeds():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    self.url,
+                    data={
+                        'user_group_id': self.user.user_group_id.id,
+                        'include': 'more_details',
+                        'language_code': 'EN',
+                    },
+                    HTTP_X_AUTH_TOKEN=self.user.token,
+                )
+            self.assertEqual(
+                status.HTTP_200_OK,
+                response.status_code
+            )
+            return len(response.data), len(queries)
+
+        def add_new_content_feeds(count):
+            for _ in range(count):
+                knowledge = KnowledgeFactory(
+                    expiry_date=self.server_time + datetime.timedelta(days=10)
+                )
+                KnowledgeLikeLogFactory(
+                    knowledge_id=knowledge,
+                    user_id=self.user
+                )
+                FeedFactory(
+                    type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+                    knowledge_id=knowledge,
+                    user_group_id=self.user.user_group_id
+                )
+
+        def add_media_feeds(count):
+            for _ in range(count):
+                media = MediaFactory(user=self.user)
+                MediaResourceFactory(media=media)
+                MediaCommentFactory(media=media, user=self.user)
+                media.likes.add(self.user)
+                FeedFactory(
+                    type=Feed.NEW_POSTED_MEDIA_TYPE,
+                    model_id=media.id,
+                    user_id=self.user,
+                    user_group_id=self.user.user_group_id
+                )
+
+        add_new_content_feeds(3)
+        add_media_feeds(1)
+        feeds_count, queries_count = list_feeds()
+
+        add_new_content_feeds(6)
+        add_media_feeds(3)
+        more_feeds_count, more_queries_count = list_feeds()
+
+        self.assertEqual(feeds_count + 9, more_feeds_count)
+        self.assertEqual(queries_count, more_queries_count)
+
+    def test_list_cursor_pagination(self):
+        expected_ids = list(
+            self._default_filter_queryset().exclude(
+                Q(type=Feed.NEW_CONTENT_AVAILABLE_TYPE) &
+                ((Q(knowledge_id__expiry_date__isnull=True) & Q(luxury_culture_id__isnull=True)) |
+                 (Q(luxury_culture_id__expiry_date__isnull=True) & Q(knowledge_id__isnull=True)))
+            ).filter(is_pinned=False).values_list('id', flat=True)
+        )
+
+        url = '{}?{}'.format(self.url, urlencode({
+            'user_group_id': self.user.user_group_id.id,
+            'page_size': 2,
+            'cursor': '',
+        }))
+        actual_ids = []
+        while url:
+            response = self.client.get(url, HTTP_X_AUTH_TOKEN=self.user.token)
+            self.assertEqual(
+                status.HTTP_200_OK,
+                response.status_code
+            )
+            self.assertLessEqual(len(response.data), 2)
+            actual_ids.extend(item['id'] for item in response.data)
+
+            url = response.get('Next-Page-Link')
+
+        self.assertEqual(expected_ids, actual_ids)
+
+    @override_settings(ENABLE_FEED_TIMELINE=True)
+    @requests_mock.mock()
+    def test_list_feed_timeline(self, m):
+        m.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+        redis = fakeredis.FakeStrictRedis()
+        patcher = mock.patch.object(
+            feed_timeline_helper,
+            'get_connection',
+            lambda: redis
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        user_group = self.user.user_group_id
+
+        def list_ids(category=None):
+            params = {
+                'user_group_id': user_group.id,
+                'page_size': 2,
+                'cursor': '',
+            }
+            if category:
+                params['category'] = category
+            url = '{}?{}'.format(self.url, urlencode(params))
+
+            ids = []
+            while url:
+                response = self.client.get(
+                    url,
+                    HTTP_X_AUTH_TOKEN=self.user.token
+                )
+                self.assertEqual(status.HTTP_200_OK, response.status_code)
+                self.assertLessEqual(len(response.data), 2)
+                ids.extend(item['id'] for item in response.data)
+
+                url = response.get('Next-Page-Link')
+            return ids
+
+        # Not built yet: read from SQL.
+        expected_ids = list_ids()
+        expected_unread_ids = list_ids(CategoryType.UNREAD)
+        self.assertIsNone(feed_timeline_helper.get_timeline(
+            user_group.id,
+            self.user.id
+        ))
+
+        feed_timeline_helper.build(user_group.id)
+        self.assertIsNotNone(feed_timeline_helper.get_timeline(
+            user_group.id,
+            self.user.id
+        ))
+        self.assertEqual(expected_ids, list_ids())
+        self.assertEqual(expected_unread_ids, list_ids(CategoryType.UNREAD))
+
+        # New feeds are pushed to the built timelines.
+        feed = FeedFactory(
+            type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+            knowledge_id=KnowledgeFactory(
+                expiry_date=self.server_time + datetime.timedelta(days=10)
+            ),
+            user_group_id=user_group
+        )
+        self.assertEqual([feed.id] + expected_ids, list_ids())
+
+        feed.delete()
+        self.assertEqual(expected_ids, list_ids())
+
+        # Pages the timeline cannot fill in one batch are loaded from SQL.
+        with mock.patch.object(FeedTimelineCursorPagination, 'max_batches', 1):
+            self.assertEqual(expected_ids, list_ids())
+            self.assertEqual(
+                expected_unread_ids,
+                list_ids(CategoryType.UNREAD)
+            )
+
+        # A timeline gone from Redis reads from SQL.
+        redis.delete(feed_timeline_helper.GROUP_KEY.format(user_group.id))
+        self.assertIsNone(feed_timeline_helper.get_timeline(
+            user_group.id,
+            self.user.id
+        ))
+        self.assertEqual(expected_ids, list_ids())
+
+        # Saving a user group does not rebuild its timeline.
+        feed_timeline_helper.build(user_group.id)
+        with mock.patch.object(feed_timeline_helper, 'build') as build:
+            user_group.save()
+            self.assertFalse(build.called)
+
+        # Writes made with the flag off leave the timelines alone.
+        with self.settings(ENABLE_FEED_TIMELINE=False):
+            KnowledgeFactory()
+        self.assertIsNotNone(feed_timeline_helper.get_timeline(
+            user_group.id,
+            self.user.id
+        ))
+
+        call_command('rebuildfeedtimelines', drop=True)
+        self.assertIsNone(feed_timeline_helper.get_timeline(
+            user_group.id,
+            self.user.id
+        ))
+
+        feed_timeline_helper.build(user_group.id)
+        feed_timeline_helper.drop(user_group.id)
+        self.assertEqual(expected_ids, list_ids())
+
+    def test_list_query_row_unique(self):
+        """
+        The feed page query is row-unique without DISTINCT, so MySQL does
+        not need a temporary table to run it.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                self.url,
+                data={
+                    'user_group_id': self.user.user_group_id.id,
+                    'category': CategoryType.BRAND,
+                },
+                HTTP_X_AUTH_TOKEN=self.user.token,
+            )
+        self.assertEqual(
+            status.HTTP_200_OK,
+            response.status_code
+        )
+
+        feed_table = 'FROM {} '.format(
+            connection.ops.quote_name(Feed._meta.db_table)
+        )
+        feed_queries = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and
+            feed_table in query['sql'] and 'ORDER BY' in query['sql']
+        ]
+        self.assertTrue(feed_queries)
+
+        for sql in feed_queries:
+            self.assertNotIn('DISTINCT', sql)
+
+        if connection.vendor != 'mysql':
+            return
+
+        with connection.cursor() as cursor:
+            for sql in feed_queries:
+                cursor.execute('EXPLAIN ' + sql)
+                columns = [column[0] for column in cursor.description]
+                for row in cursor.fetchall():
+                    extra = dict(zip(columns, row)).get('Extra') or ''
+                    self.assertNotIn('Using temporary', extra, sql)
+
+    @override_settings(ENABLE_FEED_PAGE_CACHE=True)
+    @requests_mock.mock()
+    def test_list_page_cache(self, m):
+        m.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+
+        user_group = self.user.user_group_id
+        first_user = UserFactory(user_group_id=user_group)
+        second_user = UserFactory(user_group_id=user_group)
+
+        def add_new_content_feed():
+            return FeedFactory(
+                type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+                knowledge_id=KnowledgeFactory(
+                    expiry_date=self.server_time + datetime.timedelta(days=10)
+                ),
+                user_group_id=user_group
+            )
+
+        def list_feeds(user):
+            response = self.client.get(
+                self.url,
+                data={
+                    'user_group_id': user_group.id,
+                    'include': 'more_details',
+                },
+                HTTP_X_AUTH_TOKEN=user.token,
+            )
+            self.assertEqual(
+                status.HTTP_200_OK,
+                response.status_code
+            )
+            return {item['id']: item for item in response.data}
+
+        feed = add_new_content_feed()
+        KnowledgeLikeLogFactory(
+            knowledge_id=feed.knowledge_id,
+            user_id=second_user
+        )
+        feed_page_cache_helper.reset_stats()
+
+        # The second user is served the page rendered for the first one,
+        # with their own `liked` flag.
+        first_page = list_feeds(first_user)
+        second_page = list_feeds(second_user)
+
+        stats = feed_page_cache_helper.get_stats()
+        self.assertEqual((1, 1), (stats['hit'], stats['miss']))
+        self.assertEqual(set(first_page), set(second_page))
+        self.assertFalse(first_page[feed.id]['more_details']['liked'])
+        self.assertTrue(second_page[feed.id]['more_details']['liked'])
+        self.assertEqual(
+            first_page[feed.id]['more_details']['like_count'],
+            second_page[feed.id]['more_details']['like_count']
+        )
+
+        # A new feed invalidates the cached pages.
+        new_feed = add_new_content_feed()
+        self.assertIn(new_feed.id, list_feeds(first_user))
+
+        stats = feed_page_cache_helper.get_stats()
+        self.assertEqual(2, stats['miss'])
+        self.assertLess(0, stats['invalidation'])
+
+        # Daily challenge feeds are merged into the shared page for their
+        # owner only.
+        feed_page_cache_helper.reset_stats()
+        owner_page = list_feeds(self.user)
+        self.assertIn(self.feed_1.id, owner_page)
+        self.assertNotIn(self.feed_1.id, list_feeds(second_user))
+
+        stats = feed_page_cache_helper.get_stats()
+        self.assertEqual((2, 0), (stats['hit'], stats['miss']))
+
+        # A feed of another user group leaves the pages of this one.
+        FeedFactory(
+            type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+            knowledge_id=KnowledgeFactory(
+                expiry_date=self.server_time + datetime.timedelta(days=10)
+            ),
+            user_group_id=UserGroupFactory()
+        )
+        list_feeds(first_user)
+        self.assertEqual(3, feed_page_cache_helper.get_stats()['hit'])
+
+    @requests_mock.mock()
+    def test_list_fragment_cache(self, m):
+        m.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+
+        user_group = self.user.user_group_id
+        first_user = UserFactory(user_group_id=user_group)
+        second_user = UserFactory(user_group_id=user_group)
+
+        feed = FeedFactory(
+            type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+            knowledge_id=KnowledgeFactory(
+                expiry_date=self.server_time + datetime.timedelta(days=10)
+            ),
+            user_group_id=user_group
+        )
+        KnowledgeLikeLogFactory(
+            knowledge_id=feed.knowledge_id,
+            user_id=second_user
+        )
+
+        def list_feeds(user):
+            response = self.client.get(
+                self.url,
+                data={
+                    'user_group_id': user_group.id,
+                    'include': 'more_details,model_type,is_read',
+                },
+                HTTP_X_AUTH_TOKEN=user.token,
+            )
+            self.assertEqual(
+                status.HTTP_200_OK,
+                response.status_code
+            )
+            return response.data
+
+        expected_data = list_feeds(second_user)
+
+        with self.settings(ENABLE_FEED_FRAGMENT_CACHE=True):
+            feed_page_cache_helper.reset_stats()
+            list_feeds(first_user)
+            actual_data = list_feeds(second_user)
+
+        # Every feed rendered for the first user is reused for the second
+        # one, with their own personal fields.
+        stats = feed_page_cache_helper.get_stats()
+        self.assertEqual(len(actual_data), stats['fragment_miss'])
+        self.assertEqual(len(actual_data), stats['fragment_hit'])
+        self.assertEqual(expected_data, actual_data)
+
+    def test_list_invalid_cursor(self):
+        response = self.client.get(
+            self.url,
+            data={
+                'user_group_id': self.user.user_group_id.id,
+                'cursor': 'invalid',
+            },
+            HTTP_X_AUTH_TOKEN=self.user.token,
+        )
+        self.assertEqual(
+            status.HTTP_404_NOT_FOUND,
+            response.status_code
+        )
+
 
 class TestTipsOfTheDayFeedFilterByLanguageCode(BaseAPITestCase):
     """
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class PoleLuxeConfig(AppConfig):
+    name = 'PoleLuxe'
+
+    def ready(self):
+        # Receivers of caches and routing that are not tied to the feed
+        # models, connected once the models of every app are loaded.
+        from PoleLuxe import signals
@@ -0,0 +1,309 @@
+import json
+import logging
+import uuid
+
+import django_rq
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, transaction
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError, ResponseError, WatchError
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsIngestHelper(object):
+    """
+    Analytics rows (sessions, activities, analytics) written off the
+    request path.
+
+    With `ENABLE_ANALYTICS_INGEST`, `record` pushes the row to a Redis
+    list instead of inserting it, and makes sure a django-rq job is queued
+    to drain the list. The job holds a claim (a token in `SCHEDULED_KEY`)
+    and checks it before each batch, so only one drain runs at a time.
+
+    Each batch is popped row by row with RPOPLPUSH into a processing list
+    of the drain, inserted with `bulk_create`, then the processing list is
+    deleted. A drain that crashed or lost its claim leaves its processing
+    list, which the next drain inserts first: rows may then be inserted
+    twice, never lost. Rows that can not be loaded or inserted on their
+    own are moved to the `DEAD_KEY` list and logged.
+
+    Backpressure: once `ANALYTICS_INGEST_MAX_PENDING` rows are waiting, or
+    when Redis can not be reached, rows are inserted in the request as
+    before. Nothing is buffered in the process, so a stopping web process
+    loses nothing; rows left in Redis by a stopping worker are drained by
+    the next job or by `./manage.py flushanalyticsevents`.
+
+    `bulk_create` sends no signal, and sets `auto_now_add` fields when the
+    rows are inserted.
+    """
+    # New rows are pushed on the left, the oldest are popped on the right.
+    QUEUE_KEY = 'analytics_ingest:rows'
+    # Rows popped by the drain of a claim and not inserted yet.
+    PROCESSING_KEY = 'analytics_ingest:processing:{}'
+    # Processing lists in use.
+    PROCESSING_KEYS = 'analytics_ingest:processing'
+    # Rows that could not be inserted.
+    DEAD_KEY = 'analytics_ingest:dead'
+    # Token of the drain queued or running; expires if it crashed.
+    SCHEDULED_KEY = 'analytics_ingest:scheduled'
+
+    def is_enabled(self):
+        return getattr(settings, 'ENABLE_ANALYTICS_INGEST', False)
+
+    def get_batch_size(self):
+        return getattr(settings, 'ANALYTICS_INGEST_BATCH_SIZE', 500)
+
+    def get_max_pending(self):
+        return getattr(settings, 'ANALYTICS_INGEST_MAX_PENDING', 100000)
+
+    def get_schedule_timeout(self):
+        return getattr(settings, 'ANALYTICS_INGEST_SCHEDULE_TIMEOUT', 60 * 10)
+
+    def get_connection(self):
+        return get_redis_connection('default')
+
+    def get_queue(self):
+        return django_rq.get_queue(
+            getattr(settings, 'ANALYTICS_INGEST_QUEUE', 'default')
+        )
+
+    def dumps(self, instance):
+        fields = {}
+        for field in instance._meta.concrete_fields:
+            value = getattr(instance, field.attname)
+            if field.primary_key and value is None:
+                continue
+            fields[field.attname] = value
+
+        return json.dumps({
+            'model': instance._meta.label,
+            'fields': fields,
+        }, cls=DjangoJSONEncoder)
+
+    def loads(self, row):
+        row = json.loads(row)
+        model = apps.get_model(row['model'])
+        return model(**{
+            attname: model._meta.get_field(attname).to_python(value)
+            for attname, value in row['fields'].items()
+        })
+
+    def record(self, instance):
+        """
+        Save a new analytics row, through Redis when enabled.
+
+        :param Model instance: unsaved row
+        """
+        if not self.is_enabled():
+            return instance.save()
+
+        connection = self.get_connection()
+        try:
+            if connection.llen(self.QUEUE_KEY) >= self.get_max_pending():
+                logger.warning('Analytics ingest backlog full, saving inline')
+                return instance.save()
+
+            connection.lpush(self.QUEUE_KEY, self.dumps(instance))
+        except RedisError:
+            logger.exception('Analytics ingest unavailable, saving inline')
+            return instance.save()
+
+        try:
+            token = self.schedule()
+            if token is not None:
+                self.get_queue().enqueue(drain_analytics_rows, token)
+        except RedisError:
+            # The row is kept; a later row queues the job.
+            logger.exception('Analytics ingest drain could not be queued')
+
+    def schedule(self, force=False):
+        """
+        Claim the drain of the pending rows.
+
+        :param bool force: take the claim over from a queued or running
+            drain, which stops before its next batch
+        :return string or None: token of the claim, None when a drain is
+            already queued or running
+        """
+        token = uuid.uuid4().hex
+        if not self.get_connection().set(
+            self.SCHEDULED_KEY,
+            token,
+            nx=not force,
+            ex=self.get_schedule_timeout()
+        ):
+            return None
+        return token
+
+    def owns(self, token):
+        claim = self.get_connection().get(self.SCHEDULED_KEY)
+        return claim is not None and claim.decode('ascii') == token
+
+    def release(self, token):
+        """
+        Release a claim, unless another drain took it over.
+        """
+        with self.get_connection().pipeline() as pipeline:
+            try:
+                pipeline.watch(self.SCHEDULED_KEY)
+                claim = pipeline.get(self.SCHEDULED_KEY)
+                if claim is None or claim.decode('ascii') != token:
+                    return
+                pipeline.multi()
+                pipeline.delete(self.SCHEDULED_KEY)
+                pipeline.execute()
+            except WatchError:
+                pass
+
+    def get_pending_count(self):
+        return self.get_connection().llen(self.QUEUE_KEY)
+
+    def get_dead_count(self):
+        return self.get_connection().llen(self.DEAD_KEY)
+
+    def pop_batch(self, processing_key):
+        """
+        Move the oldest rows to a processing list. Each RPOPLPUSH is
+        atomic, so no row is popped by two drains.
+
+        :return list: rows moved
+        """
+        connection = self.get_connection()
+        connection.sadd(self.PROCESSING_KEYS, processing_key)
+
+        pipeline = connection.pipeline(transaction=False)
+        for _ in range(self.get_batch_size()):
+            pipeline.rpoplpush(self.QUEUE_KEY, processing_key)
+        rows = [row for row in pipeline.execute() if row is not None]
+
+        if not rows:
+            connection.srem(self.PROCESSING_KEYS, processing_key)
+        return rows
+
+    def claim_orphan(self, processing_key):
+        """
+        Take over the processing list of another drain, which crashed or
+        lost its claim.
+
+        :return list: rows of the list taken over, empty when none is left
+        """
+        connection = self.get_connection()
+        for key in connection.smembers(self.PROCESSING_KEYS):
+            key = key.decode('ascii')
+            if key == processing_key:
+                continue
+
+            connection.srem(self.PROCESSING_KEYS, key)
+            try:
+                # Atomic: a list is taken over by one drain only.
+                connection.rename(key, processing_key)
+            except ResponseError:
+                # Already empty, or taken over meanwhile.
+                continue
+
+            connection.sadd(self.PROCESSING_KEYS, processing_key)
+            return connection.lrange(processing_key, 0, -1)
+
+        return []
+
+    def insert(self, rows):
+        """
+        Insert rows with one `bulk_create` per model. When one fails, its
+        rows are inserted one by one, and those failing again are moved to
+        the dead letter list.
+
+        :return int: number of rows inserted
+        """
+        rows_by_model = {}
+        dead_rows = []
+        for row in rows:
+            try:
+                instance = self.loads(row)
+            except Exception:
+                logger.exception('Analytics row could not be loaded')
+                dead_rows.append(row)
+                continue
+            rows_by_model.setdefault(type(instance), []).append((row, instance))
+
+        count = 0
+        for model, model_rows in rows_by_model.items():
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create(
+                        [instance for _, instance in model_rows]
+                    )
+                count += len(model_rows)
+                continue
+            except DatabaseError:
+                logger.exception('Analytics batch failed, inserting one by one')
+
+            for row, instance in model_rows:
+                try:
+                    with transaction.atomic():
+                        model.objects.bulk_create([instance])
+                    count += 1
+                except DatabaseError:
+                    logger.exception('Analytics row could not be inserted')
+                    dead_rows.append(row)
+
+        if dead_rows:
+            self.get_connection().lpush(self.DEAD_KEY, *dead_rows)
+        return count
+
+    def finish_batch(self, processing_key):
+        pipeline = self.get_connection().pipeline()
+        pipeline.delete(processing_key)
+        pipeline.srem(self.PROCESSING_KEYS, processing_key)
+        pipeline.expire(self.SCHEDULED_KEY, self.get_schedule_timeout())
+        pipeline.execute()
+
+    def drain(self, token):
+        """
+        Insert every pending row, while holding the claim `token`.
+
+        :return int: number of rows inserted
+        """
+        connection = self.get_connection()
+        count = 0
+        orphans = True
+        while True:
+            if not self.owns(token):
+                # Taken over, e.g. by `flushanalyticsevents --force`.
+                return count
+
+            processing_key = self.PROCESSING_KEY.format(token)
+            rows = []
+            if orphans:
+                rows = self.claim_orphan(processing_key)
+                orphans = bool(rows)
+            if not rows:
+                rows = self.pop_batch(processing_key)
+
+            if rows:
+                count += self.insert(rows)
+                self.finish_batch(processing_key)
+                continue
+
+            self.release(token)
+            # A row pushed before the claim is released would otherwise
+            # wait for the next one.
+            if not connection.llen(self.QUEUE_KEY):
+                return count
+            token = self.schedule()
+            if token is None:
+                return count
+
+
+analytics_ingest_helper = AnalyticsIngestHelper()
+
+
+def drain_analytics_rows(token):
+    """
+    django-rq job inserting the pending analytics rows.
+
+    :param string token: claim of the job, see `AnalyticsIngestHelper.schedule`
+    """
+    return analytics_ingest_helper.drain(token)
@@ -0,0 +1,207 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from PoleLuxe.helpers.local_cache import LocalLRUCache
+
+
+class ContentTranslationHelper(object):
+    """
+    Translated titles of knowledges and luxury cultures, loaded with one
+    query per model and memoized in a local LRU cache and in the cache.
+
+    A cached entry is `(title,)` when the content has a translation in the
+    language and `()` when it has none, so missing translations are cached
+    too.
+    """
+    KNOWLEDGE = 'knowledge'
+    LUXURY_CULTURE = 'luxury_culture'
+
+    # content key -> (translation model name, content field)
+    SOURCES = {
+        KNOWLEDGE: ('KnowledgeTranslation', 'knowledge'),
+        LUXURY_CULTURE: ('LuxuryCultureTranslation', 'luxury_culture'),
+    }
+    # content model name -> content key
+    CONTENT_KEYS = {
+        'Knowledge': KNOWLEDGE,
+        'LuxuryCulture': LUXURY_CULTURE,
+    }
+
+    CACHE_KEY = 'content_translation:{}:{}:{}'
+    CACHE_TIMEOUT = 60 * 60 * 24
+
+    def __init__(self):
+        self.local_cache = LocalLRUCache(
+            getattr(settings, 'CONTENT_TRANSLATION_LOCAL_CACHE_SIZE', 10000),
+            getattr(settings, 'CONTENT_TRANSLATION_LOCAL_CACHE_TIMEOUT', 60)
+        )
+
+    def get_cache_key(self, content_key, object_id, language_code):
+        return self.CACHE_KEY.format(content_key, object_id, language_code)
+
+    def get_titles(self, content_key, object_ids, language_code):
+        """
+        Translated titles of contents.
+
+        :param string content_key: KNOWLEDGE or LUXURY_CULTURE
+        :param list object_ids: content IDs
+        :param string language_code
+
+        :return dict: content ID -> translated title, for the translated
+            contents only
+        """
+        keys = {
+            self.get_cache_key(content_key, object_id, language_code):
+                object_id
+            for object_id in set(object_ids)
+        }
+
+        entries = self.local_cache.get_many(list(keys))
+        missing_keys = [key for key in keys if key not in entries]
+        if missing_keys:
+            shared_entries = cache.get_many(missing_keys)
+            self.local_cache.set_many(shared_entries)
+            entries.update(shared_entries)
+
+        missing_ids = [keys[key] for key in keys if key not in entries]
+        if missing_ids:
+            loaded = self.load(content_key, missing_ids, language_code)
+            loaded_entries = {
+                self.get_cache_key(content_key, object_id, language_code):
+                    (loaded[object_id],) if object_id in loaded else ()
+                for object_id in missing_ids
+            }
+            cache.set_many(loaded_entries, self.CACHE_TIMEOUT)
+            self.local_cache.set_many(loaded_entries)
+            entries.update(loaded_entries)
+
+        return {
+            keys[key]: entry[0]
+            for key, entry in entries.items()
+            if entry
+        }
+
+    def load(self, content_key, object_ids, language_code):
+        from PoleLuxe import models as poleluxe_models
+
+        model_name, content_field = self.SOURCES[content_key]
+        translation_model = getattr(poleluxe_models, model_name)
+
+        titles = {}
+        for object_id, title in translation_model.objects.filter(**{
+            'language_id': language_code,
+            '%s__in' % content_field: object_ids,
+        }).order_by('id').values_list(content_field, 'title'):
+            # The first translation wins, as with `.first()`.
+            titles.setdefault(object_id, title)
+
+        return titles
+
+    def get_source(self, instance):
+        """
+        :return tuple or None: content key and content field of a
+            translation, None for other models
+        """
+        for content_key, source in self.SOURCES.items():
+            model_name, content_field = source
+            if type(instance).__name__ == model_name:
+                return content_key, content_field
+
+        return None
+
+    def collect(self, instance):
+        """
+        Remember the cache key of a translation about to be saved, whose
+        content or language may change.
+        """
+        source = self.get_source(instance)
+        if source is None or instance.pk is None:
+            return
+
+        content_key, content_field = source
+        previous = type(instance).objects.filter(
+            pk=instance.pk
+        ).values_list(content_field + '_id', 'language_id').first()
+        if previous is not None:
+            instance._content_translation_key = self.get_cache_key(
+                content_key,
+                *previous
+            )
+
+    def invalidate(self, instance):
+        """
+        Forget the cached titles of a saved or deleted translation, in its
+        current and previous content and language.
+        """
+        source = self.get_source(instance)
+        if source is None:
+            return
+
+        content_key, content_field = source
+        keys = {self.get_cache_key(
+            content_key,
+            getattr(instance, content_field + '_id'),
+            instance.language_id
+        )}
+        previous_key = getattr(instance, '_content_translation_key', None)
+        if previous_key is not None:
+            keys.add(previous_key)
+
+        cache.delete_many(list(keys))
+        for key in keys:
+            self.local_cache.delete(key)
+
+
+content_translation_helper = ContentTranslationHelper()
+
+
+class ContentTitles(object):
+    """
+    Titles of the contents of a page of feeds in one language.
+
+    The translations of the contents given up front are loaded together
+    the first time a title is read; other contents are resolved one by one
+    through the same caches. `EN` and untranslated contents use the title
+    of the content itself.
+    """
+
+    def __init__(self, language_code, knowledge_ids=(), luxury_culture_ids=()):
+        self.language_code = language_code
+        self.object_ids = {
+            ContentTranslationHelper.KNOWLEDGE: set(knowledge_ids),
+            ContentTranslationHelper.LUXURY_CULTURE: set(luxury_culture_ids),
+        }
+        self._titles = {}
+
+    def get_translated_titles(self, content_key, object_id):
+        if content_key not in self._titles:
+            self._titles[content_key] = content_translation_helper.get_titles(
+                content_key,
+                self.object_ids[content_key] | {object_id},
+                self.language_code
+            )
+        elif object_id not in self.object_ids[content_key]:
+            self._titles[content_key].update(
+                content_translation_helper.get_titles(
+                    content_key,
+                    [object_id],
+                    self.language_code
+                )
+            )
+        self.object_ids[content_key].add(object_id)
+
+        return self._titles[content_key]
+
+    def get_title(self, content):
+        """
+        :param Knowledge or LuxuryCulture content
+        """
+        if self.language_code == 'EN':
+            return content.title
+
+        content_key = ContentTranslationHelper.CONTENT_KEYS[
+            type(content).__name__
+        ]
+        titles = self.get_translated_titles(content_key, content.id)
+
+        return titles.get(content.id, content.title)
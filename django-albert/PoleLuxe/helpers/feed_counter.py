@@ -0,0 +1,228 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Count, F
+
+from PoleLuxe.models.feed import FeedCounter
+
+
+class FeedCounterHelper(object):
+    """
+    Read and maintain `FeedCounter` rows, mirrored in the cache so a page of
+    feeds reads its counters without touching the like/comment tables.
+    """
+    CACHE_KEY = 'feed_counter:{}:{}:{}'
+    CACHE_TIMEOUT = 60 * 60 * 24
+
+    # model name -> (content type, content field, counter field,
+    #                user group lookup)
+    SOURCES = {
+        'FeedLikeLog': (
+            FeedCounter.FEED, 'feed_id', 'like_count',
+            'user_id__user_group_id',
+        ),
+        'FeedComment': (
+            FeedCounter.FEED, 'feed_id', 'comment_count',
+            'user_group_id',
+        ),
+        'KnowledgeLikeLog': (
+            FeedCounter.KNOWLEDGE, 'knowledge_id', 'like_count',
+            'user_id__user_group_id',
+        ),
+        'KnowledgeComment': (
+            FeedCounter.KNOWLEDGE, 'knowledge_id', 'comment_count',
+            'user_group_id',
+        ),
+        'LuxuryCultureLikeLog': (
+            FeedCounter.LUXURY_CULTURE, 'luxury_culture_id', 'like_count',
+            'user_id__user_group_id',
+        ),
+        'LuxuryCultureComment': (
+            FeedCounter.LUXURY_CULTURE, 'luxury_culture_id', 'comment_count',
+            'user_group_id',
+        ),
+    }
+
+    def get_cache_key(self, content_type, object_id, user_group_id):
+        return self.CACHE_KEY.format(content_type, object_id, user_group_id)
+
+    def get_user_group_id(self, instance, user_group_lookup):
+        """
+        Resolve the user group a like or comment is counted in.
+
+        :return int or None
+        """
+        if user_group_lookup == 'user_group_id':
+            return instance.user_group_id_id
+
+        try:
+            return instance.user_id.user_group_id_id
+        except ObjectDoesNotExist:
+            # The user is being deleted along with its likes.
+            return None
+
+    def add(self, content_type, object_id, user_group_id, counter_field,
+            delta):
+        """
+        Add `delta` to a counter and drop its cached value.
+        """
+        with transaction.atomic():
+            counter, _ = FeedCounter.objects.get_or_create(
+                content_type=content_type,
+                object_id=object_id,
+                user_group_id=user_group_id
+            )
+            FeedCounter.objects.filter(pk=counter.pk).update(**{
+                counter_field: F(counter_field) + delta
+            })
+
+        key = self.get_cache_key(content_type, object_id, user_group_id)
+        cache.delete(key)
+        # A reader may cache the old count before the caller's transaction
+        # commits; drop it again once committed.
+        transaction.on_commit(lambda: cache.delete(key))
+
+    def count(self, instance, delta):
+        """
+        Add `delta` to the counter a like or comment row belongs to.
+
+        :param Model instance: like or comment row
+        :param int delta: 1 on create, -1 on delete
+        """
+        source = self.SOURCES.get(type(instance).__name__)
+        if source is None:
+            return
+
+        content_type, content_field, counter_field, user_group_lookup = source
+        object_id = getattr(instance, content_field + '_id')
+        user_group_id = self.get_user_group_id(instance, user_group_lookup)
+        if object_id is None or user_group_id is None:
+            return
+
+        self.add(content_type, object_id, user_group_id, counter_field, delta)
+
+    def move_likes(self, user_id, old_user_group_id, new_user_group_id):
+        """
+        Move the likes of a user to the counters of their new user group.
+        Likes are counted in the current user group of their user, while
+        comments keep the user group they were written in.
+        """
+        from PoleLuxe import models as poleluxe_models
+
+        with transaction.atomic():
+            for model_name, source in self.SOURCES.items():
+                content_type, content_field, counter_field, user_group_lookup = (
+                    source
+                )
+                if user_group_lookup == 'user_group_id':
+                    continue
+
+                model = getattr(poleluxe_models, model_name)
+                rows = model.objects.filter(
+                    user_id=user_id
+                ).order_by().values_list(
+                    content_field
+                ).annotate(count=Count('id'))
+
+                for object_id, count in rows:
+                    for user_group_id, delta in (
+                        (old_user_group_id, -count),
+                        (new_user_group_id, count),
+                    ):
+                        if user_group_id is not None:
+                            self.add(
+                                content_type,
+                                object_id,
+                                user_group_id,
+                                counter_field,
+                                delta
+                            )
+
+    def get_counters(self, content_type, object_ids, user_group_id):
+        """
+        Like and comment counts of several objects in a user group.
+
+        :param string content_type: FeedCounter content type
+        :param list object_ids
+        :param int user_group_id
+
+        :return dict: object id -> (like count, comment count)
+        """
+        keys = {
+            self.get_cache_key(content_type, object_id, user_group_id):
+                object_id
+            for object_id in object_ids
+        }
+        counters = {
+            keys[key]: value
+            for key, value in cache.get_many(list(keys)).items()
+        }
+
+        missing_ids = [i for i in object_ids if i not in counters]
+        if missing_ids:
+            loaded = {object_id: (0, 0) for object_id in missing_ids}
+            loaded.update({
+                object_id: (like_count, comment_count)
+                for object_id, like_count, comment_count in
+                FeedCounter.objects.filter(
+                    content_type=content_type,
+                    user_group_id=user_group_id,
+                    object_id__in=missing_ids
+                ).values_list('object_id', 'like_count', 'comment_count')
+            })
+            cache.set_many({
+                self.get_cache_key(content_type, object_id, user_group_id):
+                    value
+                for object_id, value in loaded.items()
+            }, self.CACHE_TIMEOUT)
+            counters.update(loaded)
+
+        return counters
+
+    def rebuild(self, batch_size=1000):
+        """
+        Recompute every counter from the like and comment tables.
+
+        :return int: number of counter rows written
+        """
+        from PoleLuxe import models as poleluxe_models
+
+        totals = defaultdict(lambda: {'like_count': 0, 'comment_count': 0})
+        for model_name, source in self.SOURCES.items():
+            content_type, content_field, counter_field, user_group_lookup = (
+                source
+            )
+            model = getattr(poleluxe_models, model_name)
+            rows = model.objects.filter(**{
+                user_group_lookup + '__isnull': False
+            }).order_by().values_list(
+                content_field,
+                user_group_lookup
+            ).annotate(count=Count('id'))
+
+            for object_id, user_group_id, count in rows:
+                key = (content_type, object_id, user_group_id)
+                totals[key][counter_field] += count
+
+        with transaction.atomic():
+            FeedCounter.objects.all().delete()
+            FeedCounter.objects.bulk_create([
+                FeedCounter(
+                    content_type=content_type,
+                    object_id=object_id,
+                    user_group_id=user_group_id,
+                    **counts
+                )
+                for (content_type, object_id, user_group_id), counts in
+                totals.items()
+            ], batch_size=batch_size)
+
+        if hasattr(cache, 'delete_pattern'):
+            cache.delete_pattern(self.CACHE_KEY.format('*', '*', '*'))
+
+        return len(totals)
+
+
+feed_counter_helper = FeedCounterHelper()
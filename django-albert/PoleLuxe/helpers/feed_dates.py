@@ -0,0 +1,235 @@
+import datetime
+
+from django.db.models import Q
+
+from PoleLuxe.models.feed import Feed
+
+
+class FeedDatesHelper(object):
+    """
+    Keep the dates a feed copies from its content in sync.
+
+    - `publish_date` is the publish date of the knowledge, or else of the
+      luxury culture, of the feed; the ordering of the pinned feeds.
+    - `effective_publish_date` is the latest publish date of the contents
+      of a tips of the day feed; the feed is unpublished before it.
+    - `effective_expiry_date` is the earliest expiry date among the tips,
+      contents or daily challenge the feed type checks; the feed is
+      expired after it.
+
+    Each date is computed from the same lookups as the `FeedQuerySet`
+    filters it replaces, so `exclude(<lookup>__lt=date)` on any of them is
+    `exclude(effective_expiry_date__lt=date)`. Dates of `DateField`s are
+    stored at midnight, which compares the same against a date.
+    """
+    # Lookups giving `publish_date`, by priority.
+    PUBLISH_DATE_LOOKUPS = (
+        'knowledge_id__publish_date',
+        'luxury_culture_id__publish_date',
+    )
+    # Feed type -> lookups giving `effective_publish_date`, the latest wins.
+    EFFECTIVE_PUBLISH_DATE_LOOKUPS = {
+        Feed.TIPS_OF_THE_DAY_TYPE: (
+            'tips_of_the_day_id__knowledge_id__publish_date',
+            'tips_of_the_day_id__luxury_culture_id__publish_date',
+        ),
+    }
+    # Feed type -> lookups giving `effective_expiry_date`, the earliest wins.
+    EFFECTIVE_EXPIRY_DATE_LOOKUPS = {
+        Feed.TIPS_OF_THE_DAY_TYPE: (
+            'tips_of_the_day_id__expiry_date',
+            'tips_of_the_day_id__knowledge_id__expiry_date',
+            'tips_of_the_day_id__luxury_culture_id__expiry_date',
+        ),
+        Feed.NEW_CONTENT_AVAILABLE_TYPE: (
+            'knowledge_id__expiry_date',
+            'luxury_culture_id__expiry_date',
+        ),
+        Feed.COMPLETE_DAILY_CHALLENGE_TYPE: (
+            'daily_challenge_result_id__daily_challenge_id__publish_date',
+        ),
+    }
+    DATE_FIELDS = (
+        'publish_date',
+        'effective_publish_date',
+        'effective_expiry_date',
+    )
+    # Feed fields the dates depend on.
+    FEED_FIELDS = (
+        'type',
+        'tips_of_the_day_id',
+        'knowledge_id',
+        'luxury_culture_id',
+        'daily_challenge_result_id',
+    )
+    # Model name -> lookups from a feed to an instance of the model.
+    CONTENT_LOOKUPS = {
+        'TipsOfTheDay': ('tips_of_the_day_id',),
+        'Knowledge': (
+            'knowledge_id',
+            'tips_of_the_day_id__knowledge_id',
+        ),
+        'LuxuryCulture': (
+            'luxury_culture_id',
+            'tips_of_the_day_id__luxury_culture_id',
+        ),
+        'DailyChallenge': (
+            'daily_challenge_result_id__daily_challenge_id',
+        ),
+        'DailyChallengeResult': ('daily_challenge_result_id',),
+    }
+
+    def get_lookups(self):
+        lookups = set(self.PUBLISH_DATE_LOOKUPS)
+        for lookups_by_type in (
+            self.EFFECTIVE_PUBLISH_DATE_LOOKUPS,
+            self.EFFECTIVE_EXPIRY_DATE_LOOKUPS,
+        ):
+            for type_lookups in lookups_by_type.values():
+                lookups.update(type_lookups)
+        return sorted(lookups)
+
+    def to_datetime(self, value):
+        if value is None or isinstance(value, datetime.datetime):
+            return value
+        return datetime.datetime.combine(value, datetime.time())
+
+    def compute(self, feed_type, values):
+        """
+        :param int feed_type
+        :param dict values: lookup -> value
+        :return dict: date field -> value
+        """
+        publish_date = next((
+            values[lookup] for lookup in self.PUBLISH_DATE_LOOKUPS
+            if values[lookup] is not None
+        ), None)
+
+        def pick(lookups_by_type, choose):
+            dates = [
+                self.to_datetime(values[lookup])
+                for lookup in lookups_by_type.get(feed_type, ())
+                if values[lookup] is not None
+            ]
+            return choose(dates) if dates else None
+
+        return {
+            'publish_date': publish_date,
+            'effective_publish_date': pick(
+                self.EFFECTIVE_PUBLISH_DATE_LOOKUPS,
+                max
+            ),
+            'effective_expiry_date': pick(
+                self.EFFECTIVE_EXPIRY_DATE_LOOKUPS,
+                min
+            ),
+        }
+
+    def get_value(self, feed, lookup):
+        """
+        Follow a lookup through the related objects of an unsaved feed.
+        """
+        value = feed
+        for name in lookup.split('__'):
+            value = getattr(value, name)
+            if value is None:
+                return None
+        return value
+
+    def get_update_fields(self, update_fields):
+        """
+        Fields to save for `Feed.save(update_fields=...)`: the dates are
+        saved too when a field they depend on is.
+
+        :param iterable update_fields
+        :return list
+        """
+        update_fields = list(update_fields)
+        if set(self.FEED_FIELDS) & set(update_fields):
+            update_fields.extend(
+                name for name in self.DATE_FIELDS if name not in update_fields
+            )
+        return update_fields
+
+    def set_feed_dates(self, feed, update_fields=None):
+        """
+        Set the dates of a feed about to be saved.
+
+        :param Feed feed
+        :param frozenset update_fields: fields saved, None for all of them
+        """
+        if update_fields is not None and not (
+            set(self.FEED_FIELDS) & set(update_fields)
+        ):
+            return
+
+        dates = self.compute(feed.type, {
+            lookup: self.get_value(feed, lookup)
+            for lookup in self.get_lookups()
+        })
+        for field_name, value in dates.items():
+            setattr(feed, field_name, value)
+
+    def refresh(self, feed_ids=None, batch_size=1000):
+        """
+        Recompute the dates of some feeds, `None` meaning all of them.
+
+        :param list feed_ids
+        :return int: number of feeds updated
+        """
+        feeds = Feed.objects.all()
+        if feed_ids is None:
+            feed_ids = feeds.order_by('id').values_list('id', flat=True)
+        feed_ids = list(feed_ids)
+
+        lookups = self.get_lookups()
+        count = 0
+        for start in range(0, len(feed_ids), batch_size):
+            rows = feeds.filter(
+                id__in=feed_ids[start:start + batch_size]
+            ).values_list(
+                'id',
+                'type',
+                *(self.DATE_FIELDS + tuple(lookups))
+            )
+
+            ids_by_dates = {}
+            for row in rows:
+                feed_id, feed_type = row[:2]
+                current = tuple(row[2:2 + len(self.DATE_FIELDS)])
+                dates = self.compute(
+                    feed_type,
+                    dict(zip(lookups, row[2 + len(self.DATE_FIELDS):]))
+                )
+                dates = tuple(dates[name] for name in self.DATE_FIELDS)
+                if dates != current:
+                    ids_by_dates.setdefault(dates, []).append(feed_id)
+
+            # One UPDATE per distinct dates; no save() so no feed signals.
+            for dates, ids in ids_by_dates.items():
+                count += feeds.filter(id__in=ids).update(
+                    **dict(zip(self.DATE_FIELDS, dates))
+                )
+
+        return count
+
+    def refresh_for(self, instance):
+        """
+        Refresh the feeds of a saved tips of the day, content or daily
+        challenge.
+        """
+        lookups = self.CONTENT_LOOKUPS.get(type(instance).__name__)
+        if lookups is None:
+            return 0
+
+        affected = Q()
+        for lookup in lookups:
+            affected |= Q(**{lookup: instance})
+
+        return self.refresh(Feed.objects.filter(affected).values_list(
+            'id',
+            flat=True
+        ).distinct())
+
+
+feed_dates_helper = FeedDatesHelper()
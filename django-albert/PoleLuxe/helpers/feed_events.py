@@ -0,0 +1,379 @@
+import datetime
+import hashlib
+
+import django_rq
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+
+from PoleLuxe.helpers.date import date_helper
+from PoleLuxe.helpers.feed_page_cache import feed_page_cache_helper
+from PoleLuxe.helpers.local_date import local_date_helper
+from PoleLuxe.models.feed import Feed
+
+
+class FeedEventHelper(object):
+    """
+    Publish and expiry instants of the feeds, processed when they happen.
+
+    Contents are published and expire at the local midnight of each user
+    group offset: a feed is published once its `effective_publish_date`
+    is reached and expired after its `effective_expiry_date`, both kept on
+    the feed by `FeedDatesHelper`. Media feeds follow
+    `Media.objects.get_active()`, which depends on the current time.
+
+    With `ENABLE_FEED_EVENTS`, the `process_feed_events` django-rq job is
+    queued (rq-scheduler) at the next of these instants. It drops the
+    cached feed pages of the user groups whose feeds were published or
+    expired, and all of them when the active media changed, then queues
+    the next run. Saving a feed, tips of the day, content, daily challenge
+    or media queues an earlier run when its dates call for one.
+
+    `./manage.py schedulefeedevents` queues the first run, and a periodic
+    one every `FEED_EVENTS_INTERVAL` seconds, which queues the next run
+    again if it was lost and catches the media leaving `get_active()`
+    over time. Feed pages are then at most that stale, so
+    `FEED_PAGE_CACHE_TIMEOUT` can be longer than the interval.
+    """
+    # UTC instant up to which the events were processed.
+    PROCESSED_KEY = 'feed_events:processed_at'
+    # UTC instant of the next queued run.
+    SCHEDULED_KEY = 'feed_events:scheduled'
+    # Digest of the IDs of the active media at the previous run.
+    ACTIVE_MEDIA_KEY = 'feed_events:active_media'
+
+    # Model name -> (publish date fields, expiry date fields), compared to
+    # the local date of each offset.
+    DATE_FIELDS = {
+        'Feed': (('effective_publish_date',), ('effective_expiry_date',)),
+        'TipsOfTheDay': ((), ('expiry_date',)),
+        'Knowledge': (('publish_date',), ('expiry_date',)),
+        'LuxuryCulture': (('publish_date',), ('expiry_date',)),
+        # Daily challenge results expire after the publish day.
+        'DailyChallenge': ((), ('publish_date',)),
+    }
+
+    def is_enabled(self):
+        return getattr(settings, 'ENABLE_FEED_EVENTS', False)
+
+    def get_connection(self):
+        return get_redis_connection('default')
+
+    def get_scheduler(self):
+        return django_rq.get_scheduler(
+            getattr(settings, 'FEED_EVENTS_QUEUE', 'default')
+        )
+
+    def get_interval(self):
+        return getattr(settings, 'FEED_EVENTS_INTERVAL', 60 * 10)
+
+    def get_midnight(self, local_date):
+        return datetime.datetime.combine(local_date, datetime.time())
+
+    def to_datetime(self, value):
+        if isinstance(value, datetime.datetime):
+            return value
+        return self.get_midnight(value)
+
+    def get_publish_day(self, value):
+        """
+        :return date: first local date on which a feed with this publish
+            date is published
+        """
+        value = self.to_datetime(value)
+        day = value.date()
+        if value > self.get_midnight(day):
+            day += datetime.timedelta(days=1)
+        return day
+
+    def get_expiry_day(self, value):
+        """
+        :return date: first local date on which a feed with this expiry
+            date is expired
+        """
+        return self.to_datetime(value).date() + datetime.timedelta(days=1)
+
+    def get_instant(self, local_date, timezone):
+        """
+        :return datetime: UTC instant of the local midnight of a date
+        """
+        return self.get_midnight(local_date) - datetime.timedelta(
+            hours=timezone
+        )
+
+    def get_instants(self, publish_dates, expiry_dates, timezones):
+        """
+        :return list: UTC instants at which feeds with these dates are
+            published or expire, for every offset
+        """
+        days = [self.get_publish_day(value) for value in publish_dates]
+        days.extend(self.get_expiry_day(value) for value in expiry_dates)
+
+        return [
+            self.get_instant(day, timezone)
+            for day in days
+            for timezone in timezones
+        ]
+
+    def get_next_instant(self, utc_datetime):
+        """
+        :return datetime or None: UTC instant of the next event after
+            `utc_datetime`
+        """
+        from PoleLuxe.models.media import Media
+
+        instants = []
+
+        media_publish_date = Media.objects.filter(
+            publish_date__gt=utc_datetime
+        ).order_by('publish_date').values_list(
+            'publish_date',
+            flat=True
+        ).first()
+        if media_publish_date is not None:
+            instants.append(media_publish_date)
+
+        for timezone in local_date_helper.get_timezones():
+            today = self.get_midnight(
+                local_date_helper.get_local_date(timezone, utc_datetime)
+            )
+            # Indexed: the first feed published or expiring after today.
+            publish_date = Feed.objects.filter(
+                effective_publish_date__gt=today
+            ).order_by('effective_publish_date').values_list(
+                'effective_publish_date',
+                flat=True
+            ).first()
+            expiry_date = Feed.objects.filter(
+                effective_expiry_date__gte=today
+            ).order_by('effective_expiry_date').values_list(
+                'effective_expiry_date',
+                flat=True
+            ).first()
+
+            instants.extend(self.get_instants(
+                [publish_date] if publish_date is not None else [],
+                [expiry_date] if expiry_date is not None else [],
+                [timezone]
+            ))
+
+        instants = [
+            instant for instant in instants if instant > utc_datetime
+        ]
+        return min(instants) if instants else None
+
+    def get_scheduled_instant(self):
+        scheduled = self.get_connection().get(self.SCHEDULED_KEY)
+        if scheduled is None:
+            return None
+        return parse_datetime(scheduled.decode('utf-8'))
+
+    def schedule(self, run_at, utc_datetime=None):
+        """
+        Queue a run at `run_at`, unless one is queued at or before it.
+
+        :param datetime utc_datetime: defaults to now
+        :return bool: whether a run was queued
+        """
+        if run_at is None:
+            return False
+
+        if utc_datetime is None:
+            utc_datetime = date_helper.get_current_datetime()
+
+        scheduled = self.get_scheduled_instant()
+        # A past instant is the current run, or a lost one.
+        if scheduled is not None and utc_datetime < scheduled <= run_at:
+            return False
+
+        timeout = max(
+            int((run_at - utc_datetime).total_seconds()),
+            0
+        ) + 60 * 10
+        self.get_connection().set(
+            self.SCHEDULED_KEY,
+            run_at.isoformat(),
+            ex=timeout
+        )
+        # An already queued later run finds this one queued, and queues
+        # nothing.
+        self.get_scheduler().enqueue_at(run_at, process_feed_events)
+        return True
+
+    def schedule_next(self, utc_datetime=None):
+        if utc_datetime is None:
+            utc_datetime = date_helper.get_current_datetime()
+
+        return self.schedule(self.get_next_instant(utc_datetime), utc_datetime)
+
+    def schedule_periodic(self):
+        """
+        Queue a run every `FEED_EVENTS_INTERVAL` seconds from now on,
+        replacing the previous periodic one.
+
+        :return int: interval in seconds
+        """
+        scheduler = self.get_scheduler()
+        func_name = '{}.{}'.format(
+            process_feed_events.__module__,
+            process_feed_events.__name__
+        )
+        for job in scheduler.get_jobs():
+            if job.func_name == func_name and job.meta.get('interval'):
+                scheduler.cancel(job)
+
+        interval = self.get_interval()
+        scheduler.schedule(
+            scheduled_time=date_helper.get_current_datetime(),
+            func=process_feed_events,
+            interval=interval,
+            repeat=None
+        )
+        return interval
+
+    def schedule_for(self, instance):
+        """
+        Queue an earlier run if a saved instance has dates calling for one.
+        """
+        if not self.is_enabled():
+            return False
+
+        model_name = type(instance).__name__
+        now = date_helper.get_current_datetime()
+
+        if model_name == 'Media':
+            instants = [instance.publish_date]
+        elif model_name in self.DATE_FIELDS:
+            publish_fields, expiry_fields = self.DATE_FIELDS[model_name]
+            instants = self.get_instants(
+                [
+                    getattr(instance, name) for name in publish_fields
+                    if getattr(instance, name) is not None
+                ],
+                [
+                    getattr(instance, name) for name in expiry_fields
+                    if getattr(instance, name) is not None
+                ],
+                local_date_helper.get_timezones()
+            )
+        else:
+            return False
+
+        instants = [
+            instant for instant in instants
+            if instant is not None and instant > now
+        ]
+        return self.schedule(min(instants)) if instants else False
+
+    def get_changed_feeds(self, previous_date, local_date):
+        """
+        :return QuerySet: feeds published or expired between the local
+            midnights of two dates
+        """
+        previous_midnight = self.get_midnight(previous_date)
+        midnight = self.get_midnight(local_date)
+
+        return Feed.objects.filter(
+            Q(
+                effective_publish_date__gt=previous_midnight,
+                effective_publish_date__lte=midnight
+            )
+            | Q(
+                effective_expiry_date__gte=previous_midnight,
+                effective_expiry_date__lt=midnight
+            )
+        )
+
+    def get_active_media(self):
+        """
+        :return str: digest of the sorted IDs of the active media, which
+            changes when a media becomes active or inactive
+        """
+        from PoleLuxe.models.media import Media
+
+        digest = hashlib.sha1()
+        for media_id in Media.objects.get_active().order_by(
+            'id'
+        ).values_list('id', flat=True).iterator():
+            digest.update('{},'.format(media_id).encode('ascii'))
+
+        return digest.hexdigest()
+
+    def process(self, utc_datetime=None):
+        """
+        Process the events since the previous run, then queue the next
+        run.
+
+        :return dict: whether the active media changed, and IDs of the
+            user groups whose pages were dropped
+        """
+        from PoleLuxe.models import UserGroup
+
+        if utc_datetime is None:
+            utc_datetime = date_helper.get_current_datetime()
+
+        connection = self.get_connection()
+        processed_at = connection.get(self.PROCESSED_KEY)
+        if processed_at is not None:
+            processed_at = parse_datetime(processed_at.decode('utf-8'))
+        if processed_at is None or processed_at > utc_datetime:
+            # First run: nothing is known to have happened yet.
+            processed_at = utc_datetime
+
+        active_media = self.get_active_media()
+        previous_active_media = connection.getset(
+            self.ACTIVE_MEDIA_KEY,
+            active_media
+        )
+        media_changed = (
+            previous_active_media is not None and
+            previous_active_media.decode('utf-8') != active_media
+        )
+        if media_changed:
+            # Media feeds are shared by every user group.
+            feed_page_cache_helper.bump(feed_page_cache_helper.GLOBAL_SCOPE)
+
+        user_group_ids = []
+        for timezone in local_date_helper.get_timezones():
+            previous_date = local_date_helper.get_local_date(
+                timezone,
+                processed_at
+            )
+            local_date = local_date_helper.get_local_date(
+                timezone,
+                utc_datetime
+            )
+            if previous_date == local_date or not self.get_changed_feeds(
+                previous_date,
+                local_date
+            ).exists():
+                continue
+
+            user_group_ids.extend(UserGroup.objects.filter(
+                timezone=timezone
+            ).values_list('id', flat=True))
+
+        for user_group_id in user_group_ids:
+            feed_page_cache_helper.bump(
+                feed_page_cache_helper.get_group_scope(user_group_id)
+            )
+
+        connection.set(self.PROCESSED_KEY, utc_datetime.isoformat())
+        self.schedule_next(utc_datetime)
+
+        return {
+            'media_changed': media_changed,
+            'user_group_ids': user_group_ids,
+        }
+
+
+feed_event_helper = FeedEventHelper()
+
+
+def process_feed_events():
+    """
+    django-rq job run at each feed publish or expiry instant, and
+    periodically.
+    """
+    return feed_event_helper.process()
@@ -0,0 +1,268 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+
+class FeedPageCacheHelper(object):
+    """
+    Generations and statistics of the feed page and feed fragment caches.
+
+    A cached page or rendered feed fragment key embeds the current
+    generations of its scopes: the global one (feed contents), its user
+    group (like and comment counts) and, for pages depending on the user,
+    the user (reads). Bumping a generation makes every entry of the scope
+    unreachable at once; stale entries then expire on their own.
+
+    A content change bumps the user groups its feeds are visible to, or the
+    global scope when that is all of them. Daily challenge feeds are the
+    owner's own: they are left out of the shared pages and fragments and
+    rendered on every request, see `FeedViewSet.get_daily_challenge_items()`.
+    Nothing is bumped while both caches are off.
+    """
+    PAGE_KEY = 'feed_page:{}'
+    FRAGMENT_KEY = 'feed_fragment:{}:{}'
+    GENERATION_KEY = 'feed_page:generation:{}'
+    STATS_KEY = 'feed_page:stats:{}'
+    GLOBAL_SCOPE = 'all'
+
+    # Models whose changes alter the rendered content of their feeds:
+    # model name -> (feed lookups, attribute of the instance to match)
+    CONTENT_MODELS = {
+        'Media': (('model_id',), 'id'),
+        'MediaComment': (('model_id',), 'media_id'),
+        'MediaResource': (('model_id',), 'media_id'),
+        'TipsOfTheDay': (('tips_of_the_day_id',), 'id'),
+        'Knowledge': (
+            ('knowledge_id', 'tips_of_the_day_id__knowledge_id'),
+            'id',
+        ),
+        'KnowledgeTranslation': (
+            ('knowledge_id', 'tips_of_the_day_id__knowledge_id'),
+            'knowledge_id',
+        ),
+        'LuxuryCulture': (
+            ('luxury_culture_id', 'tips_of_the_day_id__luxury_culture_id'),
+            'id',
+        ),
+        'LuxuryCultureTranslation': (
+            ('luxury_culture_id', 'tips_of_the_day_id__luxury_culture_id'),
+            'luxury_culture_id',
+        ),
+    }
+    STATS = ('hit', 'miss', 'fragment_hit', 'fragment_miss', 'invalidation')
+
+    def is_enabled(self):
+        return (getattr(settings, 'ENABLE_FEED_PAGE_CACHE', False) or
+                getattr(settings, 'ENABLE_FEED_FRAGMENT_CACHE', False))
+
+    def get_timeout(self):
+        return getattr(settings, 'FEED_PAGE_CACHE_TIMEOUT', 60)
+
+    def get_group_scope(self, user_group_id):
+        return 'group:{}'.format(user_group_id)
+
+    def get_user_scope(self, user_id):
+        return 'user:{}'.format(user_id)
+
+    def get_generations(self, scopes):
+        """
+        :param list scopes
+        :return list: generation of each scope, 0 when never bumped
+        """
+        keys = [self.GENERATION_KEY.format(scope) for scope in scopes]
+        generations = cache.get_many(keys)
+        return [generations.get(key, 0) for key in keys]
+
+    def bump(self, scope):
+        key = self.GENERATION_KEY.format(scope)
+        # `add` is a no-op when the key exists, then `incr` is atomic.
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted between add and incr.
+            cache.set(key, 1, None)
+        self.count('invalidation')
+
+    def get_page_key(self, params, user_group_id, user_id=None):
+        """
+        :param dict params: normalized request parameters of the page
+        :param int user_group_id
+        :param int user_id: set when the page depends on the user
+        """
+        scopes = [self.GLOBAL_SCOPE, self.get_group_scope(user_group_id)]
+        if user_id is not None:
+            scopes.append(self.get_user_scope(user_id))
+
+        signature = json.dumps({
+            'params': params,
+            'user_group_id': user_group_id,
+            'user_id': user_id,
+            'generations': self.get_generations(scopes),
+        }, sort_keys=True)
+
+        return self.PAGE_KEY.format(
+            hashlib.md5(signature.encode('utf-8')).hexdigest()
+        )
+
+    def get_fragment_keys(self, feed_ids, params, user_group_id):
+        """
+        Keys of the rendered fragments of feeds, shared by every user of
+        the user group.
+
+        :param list feed_ids
+        :param dict params: rendering parameters (serializer, language, include)
+        :param int user_group_id
+
+        :return dict: feed id -> key
+        """
+        scopes = [self.GLOBAL_SCOPE, self.get_group_scope(user_group_id)]
+        signature = json.dumps({
+            'params': params,
+            'user_group_id': user_group_id,
+            'generations': self.get_generations(scopes),
+        }, sort_keys=True)
+        prefix = hashlib.md5(signature.encode('utf-8')).hexdigest()
+
+        return {
+            feed_id: self.FRAGMENT_KEY.format(prefix, feed_id)
+            for feed_id in feed_ids
+        }
+
+    def get_fragments(self, keys):
+        """
+        :param list keys
+        :return dict: key -> fragment, for the cached ones only
+        """
+        fragments = cache.get_many(keys)
+        if fragments:
+            self.count('fragment_hit', len(fragments))
+        if len(fragments) < len(keys):
+            self.count('fragment_miss', len(keys) - len(fragments))
+        return fragments
+
+    def set_fragments(self, fragments):
+        cache.set_many(fragments, self.get_timeout())
+
+    def get_page(self, key):
+        page = cache.get(key)
+        self.count('miss' if page is None else 'hit')
+        return page
+
+    def set_page(self, key, page):
+        cache.set(key, page, self.get_timeout())
+
+    def count(self, stat, delta=1):
+        key = self.STATS_KEY.format(stat)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, None)
+
+    def get_stats(self):
+        """
+        :return dict: page and fragment hits and misses, invalidations and
+            page hit rate
+        """
+        keys = {self.STATS_KEY.format(stat): stat for stat in self.STATS}
+        stats = {stat: 0 for stat in self.STATS}
+        stats.update({
+            keys[key]: value for key, value in cache.get_many(list(keys)).items()
+        })
+
+        lookups = stats['hit'] + stats['miss']
+        stats['hit_rate'] = float(stats['hit']) / lookups if lookups else 0.0
+        return stats
+
+    def reset_stats(self):
+        cache.delete_many([self.STATS_KEY.format(stat) for stat in self.STATS])
+
+    def get_content_scopes(self, instance):
+        """
+        Scopes of the feeds rendering `instance`: the user groups they are
+        visible to, or the global scope when that is all of them.
+
+        :return list
+        """
+        from PoleLuxe.helpers.visible_feed import visible_feed_helper
+        from PoleLuxe.models import Feed, UserGroup
+
+        model_name = type(instance).__name__
+        if model_name == 'Feed':
+            if instance.type == Feed.COMPLETE_DAILY_CHALLENGE_TYPE:
+                return []
+            feed_ids = [instance.id]
+        else:
+            lookups, attribute = self.CONTENT_MODELS[model_name]
+            object_id = getattr(instance, attribute)
+            affected = Q()
+            for lookup in lookups:
+                affected |= Q(**{lookup: object_id})
+            if model_name.startswith('Media'):
+                affected &= Q(type=Feed.NEW_POSTED_MEDIA_TYPE)
+
+            feed_ids = list(Feed.objects.filter(affected).exclude(
+                type=Feed.COMPLETE_DAILY_CHALLENGE_TYPE
+            ).values_list('id', flat=True).distinct())
+
+        all_ids = set(UserGroup.objects.values_list('id', flat=True))
+        visible = visible_feed_helper.get_visible_user_group_ids(
+            feed_ids,
+            all_ids
+        )
+
+        user_group_ids = set()
+        for feed_id in feed_ids:
+            if feed_id in visible:
+                user_group_ids |= visible[feed_id]
+            elif (model_name == 'Feed' and
+                    instance.user_group_id_id is not None):
+                # A deleted feed, only its own user group can tell.
+                user_group_ids.add(instance.user_group_id_id)
+            else:
+                user_group_ids = all_ids
+
+        if user_group_ids and user_group_ids >= all_ids:
+            return [self.GLOBAL_SCOPE]
+        return [
+            self.get_group_scope(user_group_id)
+            for user_group_id in sorted(user_group_ids)
+        ]
+
+    def invalidate(self, instance):
+        """
+        Invalidate the pages a change of `instance` may alter.
+        """
+        from PoleLuxe.helpers.feed_counter import feed_counter_helper
+
+        if not self.is_enabled():
+            return
+
+        model_name = type(instance).__name__
+
+        if model_name == 'Feed' or model_name in self.CONTENT_MODELS:
+            for scope in self.get_content_scopes(instance):
+                self.bump(scope)
+            return
+
+        if model_name == 'ReadFeed':
+            # Read flags are overlaid on every hit; only the unread
+            # category pages depend on the reads of the user.
+            return self.bump(self.get_user_scope(instance.user_id))
+
+        source = feed_counter_helper.SOURCES.get(model_name)
+        if source is not None:
+            user_group_id = feed_counter_helper.get_user_group_id(
+                instance,
+                source[3]
+            )
+            if user_group_id is None:
+                return self.bump(self.GLOBAL_SCOPE)
+            return self.bump(self.get_group_scope(user_group_id))
+
+
+feed_page_cache_helper = FeedPageCacheHelper()
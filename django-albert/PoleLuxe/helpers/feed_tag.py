@@ -0,0 +1,122 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from PoleLuxe.models.feed import Feed, FeedTag
+
+
+class FeedTagHelper(object):
+    """
+    Keep the `FeedTag` index in sync with the tags of the feed contents.
+
+    The keys of a feed are always recomputed from all the tags of its
+    content, so renamed and removed tags leave no stale row behind.
+
+    Rows are only written with `ENABLE_FEED_TAG_INDEX`: run
+    `./manage.py rebuildfeedtags` after enabling it, before the index is
+    read, as the writes made while it was off are missing.
+    """
+    # Feed field -> content model name
+    CONTENT_FIELDS = {
+        'knowledge_id': 'Knowledge',
+        'luxury_culture_id': 'LuxuryCulture',
+    }
+
+    def is_enabled(self):
+        return getattr(settings, 'ENABLE_FEED_TAG_INDEX', False)
+
+    def get_key(self, text):
+        return text.lower()
+
+    def get_content_model(self, field_name):
+        return Feed._meta.get_field(field_name).related_model
+
+    def is_tag_relation(self, through):
+        """
+        Whether a many-to-many relation is the tags of a content.
+        """
+        return any(
+            through is self.get_content_model(field_name).tags.through
+            for field_name in self.CONTENT_FIELDS
+        )
+
+    def refresh(self, feed_ids=None, batch_size=1000):
+        """
+        Recompute the index rows of some feeds, `None` meaning all of them.
+
+        :param list feed_ids
+        :return int: number of index rows written
+        """
+        if feed_ids is not None:
+            feed_ids = list(feed_ids)
+            if not feed_ids:
+                return 0
+
+        feeds = Feed.objects.all()
+        stale_rows = FeedTag.objects.all()
+        if feed_ids is not None:
+            feeds = feeds.filter(id__in=feed_ids)
+            stale_rows = stale_rows.filter(feed_id__in=feed_ids)
+
+        keys = set()
+        for field_name in self.CONTENT_FIELDS:
+            tag_texts = feeds.filter(**{
+                '%s__tags__isnull' % field_name: False
+            }).values_list('id', '%s__tags__text' % field_name)
+
+            keys.update(
+                (feed_id, self.get_key(text)) for feed_id, text in tag_texts
+            )
+
+        rows = [FeedTag(feed_id=feed_id, key=key) for feed_id, key in keys]
+
+        with transaction.atomic():
+            stale_rows.delete()
+            FeedTag.objects.bulk_create(rows, batch_size=batch_size)
+
+        return len(rows)
+
+    def get_affected_feed_ids(self, instance):
+        """
+        Feeds whose tags may change when `instance` changes.
+
+        :return list or None: None when `instance` has no tag rule
+        """
+        model_name = type(instance).__name__
+
+        if model_name == 'Feed':
+            return [instance.id]
+
+        if model_name == 'Tag':
+            affected = Q(id__in=FeedTag.objects.filter(
+                key=self.get_key(instance.text)
+            ).values('feed_id'))
+            for field_name in self.CONTENT_FIELDS:
+                affected |= Q(**{'%s__tags' % field_name: instance})
+        else:
+            affected = None
+            for field_name, content_model_name in self.CONTENT_FIELDS.items():
+                if model_name == content_model_name:
+                    affected = Q(**{field_name: instance})
+            if affected is None:
+                return None
+
+        return list(
+            Feed.objects.filter(affected).values_list('id', flat=True).distinct()
+        )
+
+    def refresh_for(self, instance):
+        """
+        Refresh the index rows affected by a change of `instance`.
+        """
+        if not self.is_enabled():
+            return 0
+
+        feed_ids = self.get_affected_feed_ids(instance)
+        if feed_ids is None:
+            return 0
+
+        return self.refresh(feed_ids=feed_ids)
+
+
+feed_tag_helper = FeedTagHelper()
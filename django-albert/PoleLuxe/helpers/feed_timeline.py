@@ -0,0 +1,343 @@
+import datetime
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from PoleLuxe.helpers.visible_feed import visible_feed_helper
+from PoleLuxe.models.feed import Feed
+
+
+class FeedTimeline(object):
+    """
+    Timelines a user reads, merged newest first: the one of the user group
+    and the user's own.
+    """
+
+    def __init__(self, helper, user_group_id, keys):
+        self.helper = helper
+        self.user_group_id = user_group_id
+        self.keys = keys
+
+    def get_score(self, created_at):
+        return self.helper.get_score(created_at)
+
+    def get_created_at(self, score):
+        return self.helper.get_created_at(score)
+
+    def filter_queryset(self, queryset):
+        """
+        Restrict `queryset` to the feeds of the timeline in SQL, for the
+        pages the timeline cannot fill.
+        """
+        return queryset.filter(
+            type__in=self.helper.GROUP_TYPES + self.helper.USER_TYPES
+        ).filter_user_group_visibility(self.user_group_id)
+
+    def read(self, after, count):
+        """
+        :param tuple after: (score, feed ID) of the last entry read, None
+            from the start
+        :param int count
+        :return list: next (score, feed ID) entries, newest first
+        """
+        pipeline = self.helper.get_connection().pipeline(transaction=False)
+        for key in self.keys:
+            if after is None:
+                pipeline.zrevrangebyscore(
+                    key,
+                    '+inf',
+                    '-inf',
+                    start=0,
+                    num=count,
+                    withscores=True
+                )
+                continue
+
+            # Entries of the same score as the last one read, then the
+            # older ones.
+            pipeline.zrevrangebyscore(key, after[0], after[0], withscores=True)
+            pipeline.zrevrangebyscore(
+                key,
+                '(%d' % after[0],
+                '-inf',
+                start=0,
+                num=count,
+                withscores=True
+            )
+
+        entries = []
+        for members in pipeline.execute():
+            for member, score in members:
+                entry = (int(score), int(member))
+                if after is None or entry < after:
+                    entries.append(entry)
+
+        return sorted(entries, reverse=True)[:count]
+
+
+class FeedTimelineHelper(object):
+    """
+    Fan-out-on-write timelines of feed IDs in Redis sorted sets, scored by
+    `created_at`, for the v2 feed list.
+
+    A user group timeline holds the feeds of `GROUP_TYPES` the user group
+    is allowed to see, per `FeedQuerySet.filter_user_group_visibility()`;
+    a user timeline holds the user's own COMPLETE_DAILY_CHALLENGE_TYPE
+    feeds. The filters depending on time or on the reader (publish and
+    expiry dates, media, read state, category) are still applied when the
+    IDs of a page are loaded, see `FeedTimelineCursorPagination`.
+
+    With `ENABLE_FEED_TIMELINE`, only the user groups whose timeline was
+    built with `./manage.py rebuildfeedtimelines` read from it; the others,
+    and those whose sorted set is gone from Redis, keep the SQL path.
+    Timelines are refreshed by the same signals as the `VisibleFeed` index.
+    User timelines are built on their first read.
+
+    Writes made with the flag off are not pushed: drop the timelines with
+    `./manage.py rebuildfeedtimelines --drop` when turning it off, and
+    build them again once every process runs with it on.
+    """
+    GROUP_KEY = 'feed_timeline:group:{}'
+    USER_KEY = 'feed_timeline:user:{}'
+    # IDs of the user groups and users whose timeline is built.
+    GROUPS_KEY = 'feed_timeline:groups'
+    USERS_KEY = 'feed_timeline:users'
+
+    GROUP_TYPES = (
+        Feed.TIPS_OF_THE_DAY_TYPE,
+        Feed.NEW_CONTENT_AVAILABLE_TYPE,
+        Feed.NEW_POSTED_MEDIA_TYPE,
+    )
+    USER_TYPES = (
+        Feed.COMPLETE_DAILY_CHALLENGE_TYPE,
+    )
+    EPOCH = datetime.datetime(1970, 1, 1)
+
+    def is_enabled(self):
+        return getattr(settings, 'ENABLE_FEED_TIMELINE', False)
+
+    def is_maintained(self):
+        """
+        :return bool: whether writes are pushed to the built timelines
+        """
+        return self.is_enabled()
+
+    def get_connection(self):
+        return get_redis_connection('default')
+
+    def get_score(self, created_at):
+        """
+        :return int: microseconds since the epoch, exact in a Redis score;
+            0 without `created_at`, which sorts last
+        """
+        if created_at is None:
+            return 0
+
+        delta = created_at - self.EPOCH
+        return (
+            (delta.days * 86400 + delta.seconds) * 1000000 +
+            delta.microseconds
+        )
+
+    def get_created_at(self, score):
+        if not score:
+            return None
+
+        return self.EPOCH + datetime.timedelta(microseconds=score)
+
+    def get_member(self, feed_id):
+        # Zero-padded, so equal scores sort by ID.
+        return '%012d' % feed_id
+
+    def get_mapping(self, rows):
+        """
+        :param rows: (feed ID, created_at) pairs
+        :return dict: member -> score
+        """
+        return {
+            self.get_member(feed_id): self.get_score(created_at)
+            for feed_id, created_at in rows
+        }
+
+    def get_built_ids(self, key):
+        return {int(pk) for pk in self.get_connection().smembers(key)}
+
+    def is_built(self, user_group_id):
+        return self.get_connection().sismember(
+            self.GROUPS_KEY,
+            int(user_group_id)
+        )
+
+    def get_visible_rows(self, feeds, user_group_id):
+        return feeds.filter(
+            type__in=self.GROUP_TYPES
+        ).filter_user_group_visibility(
+            user_group_id
+        ).order_by().distinct().values_list('id', 'created_at')
+
+    def get_user_rows(self, feeds, user_id):
+        return feeds.filter(
+            type__in=self.USER_TYPES,
+            user_id=user_id
+        ).values_list('id', 'created_at')
+
+    def replace(self, key, mapping):
+        """
+        Replace the content of a timeline. Entries added by other writes
+        since it was read are kept.
+        """
+        connection = self.get_connection()
+        stale = set(connection.zrange(key, 0, -1)) - {
+            member.encode('ascii') for member in mapping
+        }
+
+        pipeline = connection.pipeline()
+        if stale:
+            pipeline.zrem(key, *stale)
+        if mapping:
+            pipeline.zadd(key, mapping)
+        pipeline.execute()
+
+    def build(self, user_group_id):
+        """
+        Build the timeline of a user group, which then reads from it.
+
+        :return int: number of feeds in the timeline
+        """
+        mapping = self.get_mapping(
+            self.get_visible_rows(Feed.objects.all(), user_group_id)
+        )
+        self.replace(self.GROUP_KEY.format(user_group_id), mapping)
+        self.get_connection().sadd(self.GROUPS_KEY, user_group_id)
+        return len(mapping)
+
+    def build_user(self, user_id):
+        mapping = self.get_mapping(
+            self.get_user_rows(Feed.objects.all(), user_id)
+        )
+        self.replace(self.USER_KEY.format(user_id), mapping)
+        self.get_connection().sadd(self.USERS_KEY, user_id)
+        return len(mapping)
+
+    def drop(self, user_group_id):
+        """
+        Forget the timeline of a user group, which reads from SQL again.
+        """
+        pipeline = self.get_connection().pipeline()
+        pipeline.srem(self.GROUPS_KEY, user_group_id)
+        pipeline.delete(self.GROUP_KEY.format(user_group_id))
+        pipeline.execute()
+
+    def drop_all(self):
+        """
+        Forget every timeline, user groups read from SQL again.
+        """
+        keys = [self.GROUPS_KEY, self.USERS_KEY]
+        keys.extend(
+            self.GROUP_KEY.format(user_group_id)
+            for user_group_id in self.get_built_ids(self.GROUPS_KEY)
+        )
+        keys.extend(
+            self.USER_KEY.format(user_id)
+            for user_id in self.get_built_ids(self.USERS_KEY)
+        )
+        self.get_connection().delete(*keys)
+
+    def get_timeline(self, user_group_id, user_id):
+        """
+        :return FeedTimeline or None: None when the user group timeline is
+            not built, or is gone from Redis
+        """
+        pipeline = self.get_connection().pipeline(transaction=False)
+        pipeline.sismember(self.GROUPS_KEY, int(user_group_id))
+        pipeline.exists(self.GROUP_KEY.format(user_group_id))
+        pipeline.sismember(self.USERS_KEY, user_id)
+        is_built, exists, is_user_built = pipeline.execute()
+
+        # An evicted or flushed timeline would read as empty. An empty one
+        # has no key either, SQL is cheap then.
+        if not is_built or not exists:
+            return None
+
+        if not is_user_built:
+            self.build_user(user_id)
+
+        return FeedTimeline(self, user_group_id, [
+            self.GROUP_KEY.format(user_group_id),
+            self.USER_KEY.format(user_id),
+        ])
+
+    def refresh(self, feed_ids):
+        """
+        Add the feeds to the built timelines they belong to, and remove
+        them from the others.
+        """
+        feed_ids = list(feed_ids)
+        if not feed_ids:
+            return
+
+        members = [self.get_member(feed_id) for feed_id in feed_ids]
+        feeds = Feed.objects.filter(id__in=feed_ids)
+        pipeline = self.get_connection().pipeline(transaction=False)
+
+        user_group_ids = self.get_built_ids(self.GROUPS_KEY)
+        visible = visible_feed_helper.get_visible_user_group_ids(
+            feed_ids,
+            user_group_ids
+        )
+        rows = list(feeds.filter(
+            type__in=self.GROUP_TYPES
+        ).values_list('id', 'created_at'))
+
+        for user_group_id in user_group_ids:
+            key = self.GROUP_KEY.format(user_group_id)
+            mapping = self.get_mapping(
+                (feed_id, created_at) for feed_id, created_at in rows
+                if user_group_id in visible[feed_id]
+            )
+            pipeline.zrem(key, *members)
+            if mapping:
+                pipeline.zadd(key, mapping)
+
+        user_ids = self.get_built_ids(self.USERS_KEY)
+        for feed_id, user_id, created_at in feeds.filter(
+            type__in=self.USER_TYPES,
+            user_id__in=user_ids
+        ).values_list('id', 'user_id', 'created_at'):
+            pipeline.zadd(self.USER_KEY.format(user_id), {
+                self.get_member(feed_id): self.get_score(created_at)
+            })
+
+        pipeline.execute()
+
+    def remove(self, feed_id, user_id=None):
+        """
+        Remove a deleted feed from the built timelines.
+        """
+        member = self.get_member(feed_id)
+        pipeline = self.get_connection().pipeline(transaction=False)
+        for user_group_id in self.get_built_ids(self.GROUPS_KEY):
+            pipeline.zrem(self.GROUP_KEY.format(user_group_id), member)
+        if user_id is not None:
+            pipeline.zrem(self.USER_KEY.format(user_id), member)
+        pipeline.execute()
+
+    def refresh_for(self, instance):
+        """
+        Refresh the timelines affected by a change of `instance`; for a
+        user group, a change of its memberships.
+        """
+        if not self.is_maintained():
+            return
+
+        if type(instance).__name__ == 'UserGroup':
+            if self.is_built(instance.id):
+                self.build(instance.id)
+            return
+
+        feed_ids = visible_feed_helper.get_affected_feed_ids(instance)
+        if feed_ids is not None:
+            self.refresh(feed_ids)
+
+
+feed_timeline_helper = FeedTimelineHelper()
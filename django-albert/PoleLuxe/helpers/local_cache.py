@@ -0,0 +1,48 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalLRUCache(object):
+    """
+    Small thread safe in-process LRU cache with a time to live.
+
+    Other processes can not invalidate it, so entries only live for
+    `timeout` seconds.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is None or entry[0] < now:
+                    continue
+                # Re-inserted as the most recently used.
+                self._entries[key] = entry
+                found[key] = entry[1]
+        return found
+
+    def set_many(self, values):
+        expires_at = time.time() + self.timeout
+        with self._lock:
+            for key, value in values.items():
+                self._entries.pop(key, None)
+                self._entries[key] = (expires_at, value)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
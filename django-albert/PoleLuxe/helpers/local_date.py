@@ -0,0 +1,217 @@
+import datetime
+import logging
+
+import django_rq
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+
+from PoleLuxe.helpers.date import date_helper
+
+logger = logging.getLogger(__name__)
+
+
+class LocalDateHelper(object):
+    """
+    Current local date of each timezone offset (in hours) of the user
+    groups.
+
+    The date of an offset only changes at its local midnight, so with
+    `ENABLE_LOCAL_DATES` each process keeps it until then: every feed
+    filter of a request compares against the same date, and caches keyed
+    by it roll over exactly at each group's midnight.
+
+    The `roll_local_dates` django-rq job runs at each of these midnights
+    (rq-scheduler). It stores the dates in Redis for the other services,
+    drops the feed pages cached with the previous date (unless the feed
+    events drop them, see `FeedEventHelper`) and queues its next run.
+    Saving a user group queues an earlier run when its offset calls for
+    one.
+
+    `./manage.py schedulelocaldates` queues the first run, and a periodic
+    one every `LOCAL_DATES_INTERVAL` seconds: a roll with no date to
+    change does nothing but queue the next run if it was lost.
+    """
+    DATES_KEY = 'local_dates'
+    # UTC instant of the queued run.
+    SCHEDULED_KEY = 'local_dates:scheduled'
+
+    def __init__(self):
+        # timezone -> (local date, UTC instant it ends)
+        self.dates = {}
+
+    def is_enabled(self):
+        return getattr(settings, 'ENABLE_LOCAL_DATES', False)
+
+    def get_connection(self):
+        return get_redis_connection('default')
+
+    def get_scheduler(self):
+        return django_rq.get_scheduler(
+            getattr(settings, 'LOCAL_DATES_QUEUE', 'default')
+        )
+
+    def get_interval(self):
+        return getattr(settings, 'LOCAL_DATES_INTERVAL', 60 * 10)
+
+    def get_timezones(self):
+        from PoleLuxe.models import UserGroup
+
+        return sorted(set(UserGroup.objects.values_list(
+            'timezone',
+            flat=True
+        )))
+
+    def compute(self, timezone, utc_datetime):
+        """
+        :return tuple: local date at `utc_datetime`, and the UTC instant of
+            the next local midnight
+        """
+        offset = datetime.timedelta(hours=timezone)
+        local_date = (utc_datetime + offset).date()
+        next_midnight = datetime.datetime.combine(
+            local_date + datetime.timedelta(days=1),
+            datetime.time()
+        ) - offset
+
+        return local_date, next_midnight
+
+    def get_local_date(self, timezone, utc_datetime=None):
+        """
+        :param int timezone: offset in hours
+        :param datetime utc_datetime: defaults to now
+        :return date
+        """
+        if utc_datetime is None:
+            utc_datetime = date_helper.get_current_datetime()
+
+        entry = self.dates.get(timezone)
+        if entry is None or not (
+            entry[1] - datetime.timedelta(days=1) <= utc_datetime < entry[1]
+        ):
+            entry = self.compute(timezone, utc_datetime)
+            self.dates[timezone] = entry
+
+        return entry[0]
+
+    def schedule(self, utc_datetime=None):
+        """
+        Queue the roll of the dates at the next local midnight of the
+        user group offsets.
+
+        :return datetime or None: UTC instant of the run, None when a run
+            is already queued by then or there is no user group
+        """
+        if utc_datetime is None:
+            utc_datetime = date_helper.get_current_datetime()
+
+        timezones = self.get_timezones()
+        if not timezones:
+            return None
+
+        run_at = min(
+            self.compute(timezone, utc_datetime)[1] for timezone in timezones
+        )
+        connection = self.get_connection()
+        scheduled = connection.get(self.SCHEDULED_KEY)
+        if scheduled is not None:
+            scheduled = parse_datetime(scheduled.decode('utf-8'))
+            # A past instant is the current run, or a lost one.
+            if utc_datetime < scheduled <= run_at:
+                return None
+
+        # A later queued run rolls nothing and finds this one queued.
+        timeout = int((run_at - utc_datetime).total_seconds()) + 60 * 10
+        connection.set(self.SCHEDULED_KEY, run_at.isoformat(), ex=timeout)
+        self.get_scheduler().enqueue_at(run_at, roll_local_dates)
+        return run_at
+
+    def schedule_periodic(self):
+        """
+        Queue a roll every `LOCAL_DATES_INTERVAL` seconds from now on,
+        replacing the previous periodic one.
+
+        :return int: interval in seconds
+        """
+        scheduler = self.get_scheduler()
+        func_name = '{}.{}'.format(
+            roll_local_dates.__module__,
+            roll_local_dates.__name__
+        )
+        for job in scheduler.get_jobs():
+            if job.func_name == func_name and job.meta.get('interval'):
+                scheduler.cancel(job)
+
+        interval = self.get_interval()
+        scheduler.schedule(
+            scheduled_time=date_helper.get_current_datetime(),
+            func=roll_local_dates,
+            interval=interval,
+            repeat=None
+        )
+        return interval
+
+    def get_stored_dates(self):
+        """
+        :return dict: timezone (as stored) -> ISO date
+        """
+        return {
+            timezone.decode('utf-8'): local_date.decode('utf-8')
+            for timezone, local_date in self.get_connection().hgetall(
+                self.DATES_KEY
+            ).items()
+        }
+
+    def roll(self, utc_datetime=None):
+        """
+        Store the current dates and drop the feed pages of the previous
+        ones, then queue the next roll.
+
+        :return list: timezones whose date changed
+        """
+        from PoleLuxe.helpers.feed_events import feed_event_helper
+        from PoleLuxe.helpers.feed_page_cache import feed_page_cache_helper
+
+        if utc_datetime is None:
+            utc_datetime = date_helper.get_current_datetime()
+
+        dates = {
+            str(timezone): self.get_local_date(
+                timezone,
+                utc_datetime
+            ).isoformat()
+            for timezone in self.get_timezones()
+        }
+        stored_dates = self.get_stored_dates()
+        changed = sorted(
+            timezone for timezone, local_date in dates.items()
+            if stored_dates.get(timezone) != local_date
+        )
+
+        connection = self.get_connection()
+        if changed:
+            connection.hmset(self.DATES_KEY, {
+                timezone: dates[timezone] for timezone in changed
+            })
+            # Pages only store the user group, not its offset. The feed
+            # events only drop the pages of the groups whose feeds changed.
+            if not feed_event_helper.is_enabled():
+                feed_page_cache_helper.bump(
+                    feed_page_cache_helper.GLOBAL_SCOPE
+                )
+
+        self.schedule(utc_datetime)
+
+        logger.info('Rolled the local date of timezones %s', changed)
+        return changed
+
+
+local_date_helper = LocalDateHelper()
+
+
+def roll_local_dates():
+    """
+    django-rq job run at each local midnight of the user group offsets,
+    and periodically.
+    """
+    return local_date_helper.roll()
@@ -0,0 +1,98 @@
+from PoleLuxe.models.feed import Feed
+
+
+class MediaStateHelper(object):
+    """
+    Keep `Feed.media_state` in sync with the posted media of
+    NEW_POSTED_MEDIA_TYPE feeds.
+
+    The flags are computed with the `Media` manager rules themselves
+    (`get_completed()`, TEXT_TYPE) so both paths of the feed filters share
+    the same semantics. `get_active()` depends on the current time, so it
+    is not stored: `exclude_expired_media()` keeps checking it in SQL.
+    """
+
+    def get_states(self, media_ids):
+        """
+        :param list media_ids
+        :return dict: media id -> `media_state`, 0 for missing media
+        """
+        from PoleLuxe.models.media import Media
+
+        media_ids = list(media_ids)
+        states = {media_id: 0 for media_id in media_ids}
+        if not media_ids:
+            return states
+
+        flagged_media = (
+            (Feed.MEDIA_COMPLETED, Media.objects.get_completed()),
+            (Feed.MEDIA_TEXT, Media.objects.filter(type=Media.TEXT_TYPE)),
+        )
+        for flag, media in flagged_media:
+            for media_id in media.filter(
+                id__in=media_ids
+            ).values_list('id', flat=True).distinct():
+                states[media_id] |= flag
+
+        return states
+
+    def set_feed_state(self, feed):
+        """
+        Set the state of a feed about to be saved.
+        """
+        if feed.type != Feed.NEW_POSTED_MEDIA_TYPE:
+            feed.media_state = 0
+            return
+
+        feed.media_state = self.get_states([feed.model_id])[feed.model_id]
+
+    def refresh(self, media_ids=None, batch_size=1000):
+        """
+        Recompute the state of the feeds of some media. `None` means all
+        the media feeds.
+
+        :param list media_ids
+        :return int: number of feeds updated
+        """
+        feeds = Feed.objects.filter(type=Feed.NEW_POSTED_MEDIA_TYPE)
+
+        if media_ids is None:
+            media_ids = feeds.order_by().values_list(
+                'model_id',
+                flat=True
+            ).distinct()
+        media_ids = list(media_ids)
+
+        count = 0
+        for start in range(0, len(media_ids), batch_size):
+            states = self.get_states(media_ids[start:start + batch_size])
+
+            ids_by_state = {}
+            for media_id, state in states.items():
+                ids_by_state.setdefault(state, []).append(media_id)
+
+            # One UPDATE per distinct state; no save() so no feed signals.
+            for state, ids in ids_by_state.items():
+                count += feeds.filter(
+                    model_id__in=ids
+                ).exclude(
+                    media_state=state
+                ).update(media_state=state)
+
+        return count
+
+    def refresh_for(self, instance):
+        """
+        Refresh the feeds of a saved or deleted Media or MediaResource.
+        """
+        model_name = type(instance).__name__
+
+        if model_name == 'Media':
+            return self.refresh([instance.id])
+        if model_name == 'MediaResource':
+            return self.refresh([instance.media_id])
+
+        return 0
+
+
+media_state_helper = MediaStateHelper()
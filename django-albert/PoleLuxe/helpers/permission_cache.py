@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+
+
+class PermissionCacheHelper(object):
+    """
+    Django users with their full permission set, and company ownership and
+    management of app users, cached across requests.
+
+    Entries are keyed by a permission set version, bumped whenever a group,
+    a permission, a group membership through the group side or a company
+    owner/manager row changes, which forgets every entry at once. Changes
+    of a single Django user (save, groups, permissions) only forget that
+    user's entry.
+
+    The permission set is put into Django's own `_perm_cache`, so
+    `has_perm()` keeps its semantics and costs no query.
+    """
+    DJANGO_USER_KEY = 'permissions:django_user:{}:{}'
+    MEMBERSHIP_KEY = 'permissions:{}:{}:{}'
+    VERSION_KEY = 'permissions:version'
+
+    # Django user fields permission classes read; others load on access.
+    DJANGO_USER_FIELDS = (
+        'id',
+        'username',
+        'is_active',
+        'is_staff',
+        'is_superuser',
+    )
+
+    def is_enabled(self):
+        return getattr(settings, 'ENABLE_PERMISSION_CACHE', False)
+
+    def get_timeout(self):
+        return getattr(settings, 'PERMISSION_CACHE_TIMEOUT', 60 * 5)
+
+    def get_version(self):
+        return cache.get(self.VERSION_KEY, 0)
+
+    def bump_version(self):
+        cache.add(self.VERSION_KEY, 0, None)
+        try:
+            cache.incr(self.VERSION_KEY)
+        except ValueError:
+            cache.set(self.VERSION_KEY, 1, None)
+
+    def preload(self, user):
+        """
+        Attach the Django user of an app user, with its permission set
+        loaded, once per app user instance (hence once per request).
+
+        :param User user: app user
+        """
+        if getattr(user, '_permissions_preloaded', False):
+            return
+        user._permissions_preloaded = True
+
+        if user.django_user_id is None:
+            return
+
+        key = self.DJANGO_USER_KEY.format(
+            user.django_user_id,
+            self.get_version()
+        )
+        entry = cache.get(key)
+
+        if entry is None:
+            django_user = user.django_user
+            permissions = django_user.get_all_permissions()
+            cache.set(key, (
+                [getattr(django_user, name) for name in self.DJANGO_USER_FIELDS],
+                sorted(permissions),
+            ), self.get_timeout())
+            return
+
+        values, permissions = entry
+        django_user = get_user_model().from_db(
+            'default',
+            self.DJANGO_USER_FIELDS,
+            values
+        )
+        django_user._perm_cache = set(permissions)
+        user.django_user = django_user
+
+    def get_membership(self, user, name, load):
+        """
+        Cached company membership of an app user, memoized on the instance.
+
+        :param User user: app user
+        :param string name: membership name
+        :param callable load: returns the membership from the database
+        :return bool
+        """
+        attribute = '_is_%s' % name
+        if hasattr(user, attribute):
+            return getattr(user, attribute)
+
+        key = self.MEMBERSHIP_KEY.format(name, user.id, self.get_version())
+        is_member = cache.get(key)
+        if is_member is None:
+            is_member = bool(load())
+            cache.set(key, is_member, self.get_timeout())
+
+        setattr(user, attribute, is_member)
+        return is_member
+
+    def is_company_owner(self, user):
+        from PoleLuxe.models.company import CompanyOwner
+
+        return self.get_membership(
+            user,
+            'company_owner',
+            CompanyOwner.objects.filter(owner=user).exists
+        )
+
+    def is_company_manager(self, user):
+        return self.get_membership(
+            user,
+            'company_manager',
+            user.is_company_manager
+        )
+
+    def invalidate(self, instance):
+        """
+        Forget the entries a saved or deleted instance may alter.
+        """
+        if isinstance(instance, get_user_model()):
+            cache.delete(self.DJANGO_USER_KEY.format(
+                instance.pk,
+                self.get_version()
+            ))
+            return
+
+        if isinstance(instance, (Group, Permission)) or type(
+            instance
+        ).__name__ in ('CompanyOwner', 'CompanyManager'):
+            self.bump_version()
+
+    def invalidate_m2m(self, instance):
+        """
+        Forget the entries a group or permission membership change may
+        alter. The receivers are only connected to these relations.
+        """
+        if isinstance(instance, get_user_model()):
+            return self.invalidate(instance)
+
+        self.bump_version()
+
+
+permission_cache_helper = PermissionCacheHelper()
@@ -0,0 +1,132 @@
+from django.conf import settings
+from django_redis import get_redis_connection
+
+
+class ReadSetHelper(object):
+    """
+    Feeds read by each user, as chunked bitmaps in Redis.
+
+    The set of a user is split in chunks of 2^16 feed ids, each a bitmap
+    of at most 8 KB that only exists once the user read one of its feeds,
+    so a user costs memory for the id ranges they read rather than for the
+    highest feed id.
+
+    A marker key tells the set is loaded; without it, the set is loaded
+    from `ReadFeed` with one query. ReadFeed writes set and clear bits
+    whether the set is loaded or not. Markers expire after
+    `READ_SET_TIMEOUT` and chunks after twice as long, so a loaded set
+    never misses a chunk.
+    """
+    CHUNK_BITS = 16
+    MARKER_KEY = 'read_set:{}'
+    CHUNK_KEY = 'read_set:{}:{}'
+
+    def is_enabled(self):
+        return getattr(settings, 'ENABLE_READ_SET', False)
+
+    def get_timeout(self):
+        return getattr(settings, 'READ_SET_TIMEOUT', 60 * 60 * 24)
+
+    def get_connection(self):
+        return get_redis_connection('default')
+
+    def get_position(self, user_id, feed_id):
+        """
+        :return tuple: chunk key and bit offset of a feed
+        """
+        chunk, offset = divmod(feed_id, 1 << self.CHUNK_BITS)
+        return self.CHUNK_KEY.format(user_id, chunk), offset
+
+    def set_bits(self, pipeline, user_id, feed_ids, value):
+        chunk_keys = set()
+        for feed_id in feed_ids:
+            chunk_key, offset = self.get_position(user_id, feed_id)
+            pipeline.setbit(chunk_key, offset, value)
+            chunk_keys.add(chunk_key)
+
+        for chunk_key in chunk_keys:
+            pipeline.expire(chunk_key, self.get_timeout() * 2)
+
+    def load(self, user_id, using=None):
+        from PoleLuxe.models import ReadFeed
+
+        feed_ids = ReadFeed.objects.using(using).filter(
+            user_id=user_id
+        ).values_list('feed_id', flat=True)
+
+        pipeline = self.get_connection().pipeline()
+        self.set_bits(pipeline, user_id, feed_ids, 1)
+        pipeline.set(self.MARKER_KEY.format(user_id), 1, ex=self.get_timeout())
+        pipeline.execute()
+
+    def get_read_ids(self, user_id, feed_ids, using=None):
+        """
+        Feeds of a page read by a user, in one call.
+
+        :param int user_id
+        :param list feed_ids
+        :param string using: database alias to read from when the set is
+            disabled or not loaded
+        :return set: IDs of the read feeds among `feed_ids`
+        """
+        from PoleLuxe.models import ReadFeed
+
+        feed_ids = list(set(feed_ids))
+        if not feed_ids:
+            return set()
+
+        if not self.is_enabled():
+            return set(ReadFeed.objects.using(using).filter(
+                user_id=user_id,
+                feed_id__in=feed_ids
+            ).values_list('feed_id', flat=True))
+
+        loaded, bits = self.get_bits(user_id, feed_ids)
+        if not loaded:
+            self.load(user_id, using)
+            loaded, bits = self.get_bits(user_id, feed_ids)
+
+        return {feed_id for feed_id, bit in zip(feed_ids, bits) if bit}
+
+    def get_bits(self, user_id, feed_ids):
+        """
+        :return tuple: whether the set is loaded, and the bit of each feed
+        """
+        pipeline = self.get_connection().pipeline(transaction=False)
+        pipeline.exists(self.MARKER_KEY.format(user_id))
+        for feed_id in feed_ids:
+            pipeline.getbit(*self.get_position(user_id, feed_id))
+        results = pipeline.execute()
+
+        return bool(results[0]), results[1:]
+
+    def update(self, instance, read):
+        """
+        Set or clear the bit of a saved or deleted ReadFeed.
+
+        :param ReadFeed instance
+        :param bool read
+        """
+        from PoleLuxe.models import ReadFeed
+
+        if not self.is_enabled() or instance.feed_id is None:
+            return
+
+        if not read and ReadFeed.objects.filter(
+            user_id=instance.user_id,
+            feed_id=instance.feed_id
+        ).exists():
+            # Another read of the same feed remains.
+            return
+
+        pipeline = self.get_connection().pipeline()
+        self.set_bits(
+            pipeline,
+            instance.user_id,
+            [instance.feed_id],
+            1 if read else 0
+        )
+        pipeline.execute()
+
+
+read_set_helper = ReadSetHelper()
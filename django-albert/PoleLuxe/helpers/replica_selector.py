@@ -0,0 +1,268 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from PoleLuxe.models.feed import ReplicationHeartbeat
+
+
+class ReplicaSelector(object):
+    """
+    Picks the read replica a request reads from.
+
+    `./manage.py replicationheartbeat` writes the `ReplicationHeartbeat`
+    row on the primary every `REPLICA_PROBE_INTERVAL` seconds, and probes
+    the replicas just before each beat: it reads the row back from each
+    one, whose distance to the primary's gives the replication lag (0 for
+    a replica which applied the previous beat), and times the read, which
+    feeds an exponentially weighted moving average of the latency. The states are
+    shared through the cache, which every process reads at most every
+    `REPLICA_PROBE_INTERVAL` seconds, so no request waits for a probe. They
+    expire when the command stops, and requests then read from the primary.
+
+    Replicas lagging more than `REPLICA_MAX_LAG` seconds, or failing the
+    probe, are skipped; the others are picked at random, weighted by the
+    inverse of their latency.
+
+    A user who just wrote (like, comment, read) is pinned to the primary
+    for `REPLICA_PIN_TIMEOUT` seconds so they read their own writes.
+
+    A `REPLICA_STATS_SAMPLE_RATE` share of the decisions are counted in the
+    cache, see `get_stats`.
+    """
+    PRIMARY = 'default'
+    HEARTBEAT_ID = 1
+    PIN_KEY = 'replica_selector:pin:{}'
+    STATES_KEY = 'replica_selector:states'
+    STATS_KEY = 'replica_selector:stats:{}'
+    # Decisions not tied to a replica.
+    PINNED = 'pinned'
+    FALLBACK = 'fallback'
+
+    def __init__(self):
+        # alias -> {'latency': EWMA in seconds, 'lag': seconds or None}
+        self.states = {}
+        # When `states` was read from the cache.
+        self.probed_at = None
+
+    def is_enabled(self):
+        return getattr(settings, 'ENABLE_REPLICA_SELECTOR', False)
+
+    def get_aliases(self):
+        return list(getattr(settings, 'READ_REPLICA_DB_ALIASES', ()))
+
+    def get_max_lag(self):
+        return getattr(settings, 'REPLICA_MAX_LAG', 5)
+
+    def get_probe_interval(self):
+        return getattr(settings, 'REPLICA_PROBE_INTERVAL', 1)
+
+    def get_pin_timeout(self):
+        return getattr(settings, 'REPLICA_PIN_TIMEOUT', 10)
+
+    def get_latency_alpha(self):
+        return getattr(settings, 'REPLICA_LATENCY_ALPHA', 0.3)
+
+    def get_stats_sample_rate(self):
+        return getattr(settings, 'REPLICA_STATS_SAMPLE_RATE', 0.01)
+
+    def beat(self, using=PRIMARY):
+        """
+        Write the current time into the heartbeat row.
+        """
+        now = time.time()
+        ReplicationHeartbeat.objects.using(using).update_or_create(
+            id=self.HEARTBEAT_ID,
+            defaults={'beat_at': now}
+        )
+
+        return now
+
+    def get_beat(self, using):
+        """
+        :return float or None: time of the last beat a database applied
+        """
+        return ReplicationHeartbeat.objects.using(using).filter(
+            id=self.HEARTBEAT_ID
+        ).values_list('beat_at', flat=True).first()
+
+    def probe(self, alias, primary_beat_at):
+        """
+        Read the heartbeat of a replica and update its state.
+
+        :param float primary_beat_at: last beat of the primary
+        :return dict: state of the replica; `lag` is None when the probe
+            failed
+        """
+        started_at = time.time()
+        try:
+            beat_at = self.get_beat(alias)
+        except DatabaseError:
+            beat_at = None
+        finished_at = time.time()
+
+        state = self.states.get(alias)
+        latency = finished_at - started_at
+        if state is not None and state['latency'] is not None:
+            alpha = self.get_latency_alpha()
+            latency = alpha * latency + (1 - alpha) * state['latency']
+
+        state = {
+            'latency': latency,
+            'lag': (
+                max(primary_beat_at - beat_at, 0)
+                if beat_at is not None and primary_beat_at is not None
+                else None
+            ),
+        }
+        self.states[alias] = state
+        return state
+
+    def probe_all(self):
+        """
+        Probe every replica and share their states with the processes.
+        """
+        primary_beat_at = self.get_beat(self.PRIMARY)
+        for alias in self.get_aliases():
+            self.probe(alias, primary_beat_at)
+
+        # A few missed probes make the states expire.
+        cache.set(self.STATES_KEY, self.states, self.get_probe_interval() * 3)
+        return self.states
+
+    def refresh(self, force=False):
+        """
+        Read the states of the replicas from the cache when the copy of the
+        process is too old.
+        """
+        now = time.time()
+        if not force and self.probed_at is not None and (
+            now - self.probed_at < self.get_probe_interval()
+        ):
+            return
+
+        self.states = cache.get(self.STATES_KEY) or {}
+        self.probed_at = now
+
+    def pin(self, user_id):
+        """
+        Read from the primary for a while after a write of the user.
+        """
+        cache.set(self.PIN_KEY.format(user_id), 1, self.get_pin_timeout())
+
+    def is_pinned(self, user_id):
+        return cache.get(self.PIN_KEY.format(user_id)) is not None
+
+    def select(self, user_id=None):
+        """
+        :param int user_id: ID of the reading user, if any
+        :return string: database alias
+        """
+        if user_id is not None and self.is_pinned(user_id):
+            self.count(self.PINNED)
+            return self.PRIMARY
+
+        self.refresh()
+
+        max_lag = self.get_max_lag()
+        candidates = []
+        for alias in self.get_aliases():
+            state = self.states.get(alias)
+            if state is None:
+                continue
+            if state['lag'] is None or state['lag'] > max_lag:
+                self.count('excluded:{}'.format(alias))
+                continue
+            candidates.append((alias, 1.0 / max(state['latency'], 0.0001)))
+
+        if not candidates:
+            self.count(self.FALLBACK)
+            return self.PRIMARY
+
+        point = random.random() * sum(weight for _, weight in candidates)
+        for alias, weight in candidates:
+            point -= weight
+            if point <= 0:
+                break
+
+        self.count('routed:{}'.format(alias))
+        return alias
+
+    def count(self, decision):
+        sample_rate = self.get_stats_sample_rate()
+        if not sample_rate or random.random() >= sample_rate:
+            return
+
+        key = self.STATS_KEY.format(decision)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # First count, or evicted.
+            if not cache.add(key, 1, None):
+                cache.incr(key)
+
+    def get_decisions(self):
+        decisions = [self.PINNED, self.FALLBACK]
+        for alias in self.get_aliases():
+            decisions.extend([
+                'routed:{}'.format(alias),
+                'excluded:{}'.format(alias),
+            ])
+        return decisions
+
+    def get_stats(self):
+        """
+        :return dict: decision -> count of the sampled decisions, over
+            every process
+        """
+        keys = {
+            self.STATS_KEY.format(decision): decision
+            for decision in self.get_decisions()
+        }
+        stats = {decision: 0 for decision in keys.values()}
+        stats.update({
+            keys[key]: value
+            for key, value in cache.get_many(list(keys)).items()
+        })
+        return stats
+
+    def reset_stats(self):
+        cache.delete_many([
+            self.STATS_KEY.format(decision)
+            for decision in self.get_decisions()
+        ])
+
+    def pin_writer(self, instance):
+        """
+        Pin the user who wrote `instance` to the primary.
+        """
+        for field in instance._meta.concrete_fields:
+            if not field.is_relation:
+                continue
+
+            opts = field.related_model._meta
+            if (opts.app_label, opts.object_name) == ('PoleLuxe', 'User'):
+                user_id = getattr(instance, field.attname)
+                if user_id is not None:
+                    self.pin(user_id)
+                return
+
+    def pin_likers(self, instance, pk_set):
+        """
+        Pin the users of media likes added or removed through the
+        many-to-many field.
+        """
+        from PoleLuxe.models import Media
+
+        if isinstance(instance, Media):
+            user_ids = pk_set or ()
+        else:
+            user_ids = [instance.pk]
+
+        for user_id in user_ids:
+            self.pin(user_id)
+
+
+replica_selector = ReplicaSelector()
@@ -0,0 +1,173 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from PoleLuxe.helpers.local_cache import LocalLRUCache
+
+UserGroupRecord = namedtuple('UserGroupRecord', [
+    'id',
+    'timezone',
+    'company_id',
+    # IDs of the product groups the user group belongs to.
+    'product_group_ids',
+    # Content name -> IDs of the contents white/black listing the group.
+    'white_list',
+    'black_list',
+])
+
+
+class UserGroupCacheHelper(object):
+    """
+    Read-through cache of the static metadata of user groups, so the feed
+    filters do not query the user group on every request.
+
+    Records are deleted when the user group is saved or deleted and when
+    its product group, white list or black list memberships change. The
+    deletion of a product group or content leaves its ID in the records,
+    where it matches no row anymore. The in-process LRU can not be reached
+    by other processes, so its entries only live a few seconds.
+    """
+    KEY = 'user_group:{}'
+    # Content name -> model name, for the white and black lists.
+    LISTED_MODELS = (
+        ('tips_of_the_day', 'TipsOfTheDay'),
+        ('knowledge', 'Knowledge'),
+        ('luxury_culture', 'LuxuryCulture'),
+    )
+
+    def __init__(self):
+        self.local_cache = LocalLRUCache(
+            getattr(settings, 'USER_GROUP_LOCAL_CACHE_SIZE', 1000),
+            getattr(settings, 'USER_GROUP_LOCAL_CACHE_TIMEOUT', 5)
+        )
+
+    def is_enabled(self):
+        return getattr(settings, 'ENABLE_USER_GROUP_CACHE', False)
+
+    def get_timeout(self):
+        return getattr(settings, 'USER_GROUP_CACHE_TIMEOUT', 60 * 60)
+
+    def get_model(self, model_name):
+        from django.apps import apps
+
+        return apps.get_model('PoleLuxe', model_name)
+
+    def load(self, user_group_id):
+        """
+        :return UserGroupRecord or None: None for a missing user group
+        """
+        from PoleLuxe.models import ProductGroup, UserGroup
+
+        row = UserGroup.objects.filter(pk=user_group_id).values_list(
+            'id',
+            'timezone',
+            'company_id'
+        ).first()
+        if row is None:
+            return None
+
+        lists = {}
+        for list_name in ('white_list', 'black_list'):
+            lists[list_name] = {
+                name: frozenset(self.get_model(model_name).objects.filter(**{
+                    '%s_user_group' % list_name: user_group_id
+                }).values_list('id', flat=True))
+                for name, model_name in self.LISTED_MODELS
+            }
+
+        return UserGroupRecord(
+            id=row[0],
+            timezone=row[1],
+            company_id=row[2],
+            product_group_ids=frozenset(ProductGroup.objects.filter(
+                user_group=user_group_id
+            ).values_list('id', flat=True)),
+            **lists
+        )
+
+    def get(self, user_group_id):
+        """
+        :param user_group_id: ID of the user group, possibly a query
+            parameter
+        :return UserGroupRecord or None: None for a missing user group
+        """
+        try:
+            user_group_id = int(user_group_id)
+        except (TypeError, ValueError):
+            return None
+
+        key = self.KEY.format(user_group_id)
+        record = self.local_cache.get_many([key]).get(key)
+        if record is None:
+            record = cache.get(key)
+            if record is None:
+                record = self.load(user_group_id)
+                if record is None:
+                    return None
+                cache.set(key, record, self.get_timeout())
+            self.local_cache.set_many({key: record})
+
+        return record
+
+    def invalidate(self, user_group_ids):
+        keys = [self.KEY.format(pk) for pk in user_group_ids]
+        cache.delete_many(keys)
+        for key in keys:
+            self.local_cache.delete(key)
+
+    def get_relation_fields(self, through):
+        """
+        :return tuple or None: names of the user group and of the other
+            foreign key of a membership relation, None for other relations
+        """
+        from PoleLuxe.models import ProductGroup
+
+        relations = [ProductGroup.user_group.through]
+        for _, model_name in self.LISTED_MODELS:
+            model = self.get_model(model_name)
+            relations.extend([
+                model.white_list_user_group.through,
+                model.black_list_user_group.through,
+            ])
+        if through not in relations:
+            return None
+
+        user_group_model = self.get_model('UserGroup')
+        group_field = other_field = None
+        for field in through._meta.concrete_fields:
+            if not field.is_relation:
+                continue
+            if field.related_model is user_group_model:
+                group_field = field.name
+            else:
+                other_field = field.name
+
+        return group_field, other_field
+
+    def invalidate_m2m(self, sender, instance, action, pk_set):
+        """
+        Forget the records a membership change alters. The user groups
+        losing a cleared membership are collected before the clear.
+        """
+        fields = self.get_relation_fields(sender)
+        if fields is None:
+            return
+
+        if isinstance(instance, self.get_model('UserGroup')):
+            if action in ('post_add', 'post_remove', 'post_clear'):
+                self.invalidate([instance.pk])
+            return
+
+        group_field, other_field = fields
+        if action == 'pre_clear':
+            instance._user_group_cache_ids = list(sender.objects.filter(**{
+                other_field: instance.pk
+            }).values_list(group_field, flat=True))
+        elif action == 'post_clear':
+            self.invalidate(getattr(instance, '_user_group_cache_ids', ()))
+        elif action in ('post_add', 'post_remove'):
+            self.invalidate(pk_set or ())
+
+
+user_group_cache_helper = UserGroupCacheHelper()
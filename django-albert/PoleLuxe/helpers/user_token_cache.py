@@ -0,0 +1,130 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from PoleLuxe.helpers.local_cache import LocalLRUCache
+
+
+class UserTokenCacheHelper(object):
+    """
+    Authenticated users by legacy token or by Django user, so the
+    authentication of a request costs no query once cached.
+
+    Entries are snapshots of the columns of `FIELDS`, from which a fresh
+    `User` instance is built on every hit, on the database the user was
+    read from. The other columns are deferred: reading one (e.g. `active`
+    or `end_date`, which `QuerySet.update()` changes without signals)
+    queries the row, so it is never stale. Tokens are stored hashed.
+    Entries are deleted when the credentials are cleared and when the user
+    is saved or deleted; the in-process LRU can not be reached by other
+    processes, so its entries only live a few seconds.
+    """
+    # Columns the authentication and the per-request lookups read.
+    FIELDS = (
+        'id',
+        'token',
+        'django_user_id',
+        'user_group_id_id',
+        'language_id',
+        'company_id_id',
+    )
+    TOKEN_KEY = 'auth_token:{}'
+    DJANGO_USER_KEY = 'auth_django_user:{}'
+    # Token hash last cached for a user, to forget it once the token changes.
+    USER_TOKEN_KEY = 'auth_user_token:{}'
+
+    def __init__(self):
+        self.local_cache = LocalLRUCache(
+            getattr(settings, 'AUTH_LOCAL_CACHE_SIZE', 10000),
+            getattr(settings, 'AUTH_LOCAL_CACHE_TIMEOUT', 5)
+        )
+
+    def is_enabled(self):
+        return getattr(settings, 'ENABLE_AUTH_CACHE', False)
+
+    def get_timeout(self):
+        return getattr(settings, 'AUTH_CACHE_TIMEOUT', 60)
+
+    def hash_token(self, token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get_token_key(self, token):
+        return self.TOKEN_KEY.format(self.hash_token(token))
+
+    def get_django_user_key(self, django_user_id):
+        return self.DJANGO_USER_KEY.format(django_user_id)
+
+    def get_snapshot(self, user):
+        """
+        :return tuple: database alias, names and values of `FIELDS`
+        """
+        return (
+            user._state.db,
+            self.FIELDS,
+            tuple(getattr(user, name) for name in self.FIELDS),
+        )
+
+    def from_snapshot(self, snapshot):
+        """
+        :return User or None: None when `FIELDS` have changed since the
+            snapshot was taken
+        """
+        from PoleLuxe.models import User
+
+        if len(snapshot) != 3 or snapshot[1] != self.FIELDS:
+            return None
+
+        db, field_names, values = snapshot
+        return User.from_db(db, field_names, values)
+
+    def get(self, key):
+        snapshot = self.local_cache.get_many([key]).get(key)
+        if snapshot is None:
+            snapshot = cache.get(key)
+            if snapshot is None:
+                return None
+            self.local_cache.set_many({key: snapshot})
+
+        return self.from_snapshot(snapshot)
+
+    def set(self, key, user):
+        snapshot = self.get_snapshot(user)
+        cache.set(key, snapshot, self.get_timeout())
+        self.local_cache.set_many({key: snapshot})
+
+    def get_by_token(self, token):
+        return self.get(self.get_token_key(token))
+
+    def set_by_token(self, token, user):
+        key = self.get_token_key(token)
+        self.set(key, user)
+        cache.set(self.USER_TOKEN_KEY.format(user.id), key, self.get_timeout())
+
+    def get_by_django_user(self, django_user_id):
+        return self.get(self.get_django_user_key(django_user_id))
+
+    def set_by_django_user(self, django_user_id, user):
+        self.set(self.get_django_user_key(django_user_id), user)
+
+    def invalidate(self, user, token=None):
+        """
+        Forget the cached entries of a user.
+
+        :param User user
+        :param string token: token the user had before the change, if any
+        """
+        keys = {cache.get(self.USER_TOKEN_KEY.format(user.id))}
+        for user_token in (token, user.token):
+            if user_token:
+                keys.add(self.get_token_key(user_token))
+        if user.django_user_id:
+            keys.add(self.get_django_user_key(user.django_user_id))
+        keys.discard(None)
+
+        cache.delete_many(list(keys) + [self.USER_TOKEN_KEY.format(user.id)])
+        for key in keys:
+            self.local_cache.delete(key)
+
+
+user_token_cache_helper = UserTokenCacheHelper()
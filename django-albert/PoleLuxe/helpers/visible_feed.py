@@ -0,0 +1,216 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from PoleLuxe.models.feed import Feed, VisibleFeed
+
+
+class VisibleFeedHelper(object):
+    """
+    Keep the `VisibleFeed` index in sync with
+    `FeedQuerySet.filter_user_group_visibility()`.
+
+    A full rebuild runs the queryset rules themselves, one query per user
+    group. Refreshing a few feeds, on every feed or content write, instead
+    loads the memberships of their contents and applies the same rules in
+    Python, so it costs the same number of queries whatever the number of
+    user groups. The parity tests check both against the queryset.
+
+    Rows are only written with `ENABLE_VISIBLE_FEED_INDEX`: run
+    `./manage.py rebuildvisiblefeeds` after enabling it, before the index
+    is read, as the writes made while it was off are missing.
+    """
+    # Contents of a tips of the day feed with their own product groups,
+    # white list and black list: model name, path from the feed.
+    LISTED_CONTENTS = (
+        ('TipsOfTheDay', 'tips_of_the_day_id'),
+        ('Knowledge', 'tips_of_the_day_id__knowledge_id'),
+        ('LuxuryCulture', 'tips_of_the_day_id__luxury_culture_id'),
+    )
+
+    def is_enabled(self):
+        return getattr(settings, 'ENABLE_VISIBLE_FEED_INDEX', False)
+
+    def get_lists(self, model_name, content_ids):
+        """
+        :return dict: content id -> [restricted to its product groups and
+            white list, user group ids allowed, user group ids black listed]
+        """
+        model = apps.get_model('PoleLuxe', model_name)
+        lists = {content_id: [False, set(), set()] for content_id in content_ids}
+        if not lists:
+            return lists
+
+        contents = model.objects.filter(id__in=lists).order_by()
+        for content_id, user_group_id in contents.filter(
+            product_group__isnull=False
+        ).values_list('id', 'product_group__user_group'):
+            lists[content_id][0] = True
+            if user_group_id is not None:
+                lists[content_id][1].add(user_group_id)
+
+        for content_id, user_group_id in contents.filter(
+            white_list_user_group__isnull=False
+        ).values_list('id', 'white_list_user_group'):
+            lists[content_id][0] = True
+            lists[content_id][1].add(user_group_id)
+
+        for content_id, user_group_id in contents.filter(
+            black_list_user_group__isnull=False
+        ).values_list('id', 'black_list_user_group'):
+            lists[content_id][2].add(user_group_id)
+
+        return lists
+
+    def get_visible_user_group_ids(self, feed_ids, user_group_ids):
+        """
+        User groups allowed to see each feed, per the rules of
+        `filter_user_group_visibility()`.
+
+        :param list feed_ids
+        :param set user_group_ids: user groups to check
+        :return dict: feed id -> set of user group ids
+        """
+        paths = [path for _, path in self.LISTED_CONTENTS]
+        rows = list(Feed.objects.filter(id__in=feed_ids).values_list(
+            'id',
+            'type',
+            'user_group_id',
+            *paths
+        ))
+
+        lists = [
+            self.get_lists(model_name, {
+                row[3 + index] for row in rows
+                if row[1] == Feed.TIPS_OF_THE_DAY_TYPE and
+                row[3 + index] is not None
+            })
+            for index, (model_name, _) in enumerate(self.LISTED_CONTENTS)
+        ]
+
+        visible = {}
+        for row in rows:
+            feed_id, feed_type, feed_user_group_id = row[:3]
+            if feed_user_group_id is None:
+                allowed = set(user_group_ids)
+            else:
+                allowed = {feed_user_group_id} & set(user_group_ids)
+
+            if feed_type == Feed.TIPS_OF_THE_DAY_TYPE:
+                for index, content_id in enumerate(row[3:]):
+                    if content_id is None:
+                        continue
+                    restricted, listed, black_listed = lists[index][content_id]
+                    if restricted:
+                        allowed &= listed
+                    allowed -= black_listed
+
+            visible[feed_id] = allowed
+
+        return visible
+
+    def refresh(self, feed_ids=None, user_group_ids=None, batch_size=1000):
+        """
+        Recompute the index rows of some feeds and/or user groups. `None`
+        means all of them.
+
+        :param list feed_ids
+        :param list user_group_ids
+
+        :return int: number of index rows written
+        """
+        from PoleLuxe.models import UserGroup
+
+        if feed_ids is not None:
+            feed_ids = list(feed_ids)
+            if not feed_ids:
+                return 0
+
+        feeds = Feed.objects.all()
+        stale_rows = VisibleFeed.objects.all()
+        if feed_ids is not None:
+            feeds = feeds.filter(id__in=feed_ids)
+            stale_rows = stale_rows.filter(feed_id__in=feed_ids)
+
+        user_groups = UserGroup.objects.all()
+        if user_group_ids is not None:
+            user_groups = user_groups.filter(id__in=user_group_ids)
+            stale_rows = stale_rows.filter(user_group_id__in=user_group_ids)
+
+        rows = []
+        if feed_ids is not None:
+            visible = self.get_visible_user_group_ids(
+                feed_ids,
+                set(user_groups.values_list('id', flat=True))
+            )
+            rows.extend(
+                VisibleFeed(user_group_id=user_group_id, feed_id=feed_id)
+                for feed_id, visible_ids in visible.items()
+                for user_group_id in visible_ids
+            )
+        else:
+            for user_group_id in user_groups.values_list('id', flat=True):
+                visible = feeds.filter_user_group_visibility(
+                    user_group_id
+                ).order_by().distinct().values_list('id', flat=True)
+
+                rows.extend(
+                    VisibleFeed(user_group_id=user_group_id, feed_id=feed_id)
+                    for feed_id in visible
+                )
+
+        with transaction.atomic():
+            stale_rows.delete()
+            VisibleFeed.objects.bulk_create(rows, batch_size=batch_size)
+
+        return len(rows)
+
+    def get_affected_feed_ids(self, instance):
+        """
+        Feeds whose visibility may change when `instance` changes.
+
+        :return list or None: None when `instance` has no visibility rule
+        """
+        model_name = type(instance).__name__
+
+        if model_name == 'Feed':
+            return [instance.id]
+
+        if model_name == 'TipsOfTheDay':
+            affected = Q(tips_of_the_day_id=instance)
+        elif model_name == 'Knowledge':
+            affected = Q(tips_of_the_day_id__knowledge_id=instance)
+        elif model_name == 'LuxuryCulture':
+            affected = Q(tips_of_the_day_id__luxury_culture_id=instance)
+        elif model_name == 'ProductGroup':
+            affected = (
+                Q(tips_of_the_day_id__product_group=instance)
+                | Q(tips_of_the_day_id__knowledge_id__product_group=instance)
+                | Q(tips_of_the_day_id__luxury_culture_id__product_group=instance)
+            )
+        else:
+            return None
+
+        return list(
+            Feed.objects.filter(affected).values_list('id', flat=True).distinct()
+        )
+
+    def refresh_for(self, instance):
+        """
+        Refresh the index rows affected by a change of `instance`.
+        """
+        if not self.is_enabled():
+            return 0
+
+        if type(instance).__name__ == 'UserGroup':
+            return self.refresh(user_group_ids=[instance.id])
+
+        feed_ids = self.get_affected_feed_ids(instance)
+        if feed_ids is None:
+            return 0
+
+        return self.refresh(feed_ids=feed_ids)
+
+
+visible_feed_helper = VisibleFeedHelper()
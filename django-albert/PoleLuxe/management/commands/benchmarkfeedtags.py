@@ -0,0 +1,72 @@
+import timeit
+
+from django.core.management import BaseCommand
+from django.db.models import Count
+from django.test.utils import override_settings
+
+from PoleLuxe.models.feed import Feed, FeedTag
+
+
+class Command(BaseCommand):
+    """
+    Compare `filter_contents_with_tags` with and without the feed tag index
+    on the current database, whose tag cardinalities are the real ones.
+    e.g.
+    ./manage.py benchmarkfeedtags
+    ./manage.py benchmarkfeedtags --tag brand --tag market --number 50
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tag',
+            help='tag to filter on (repeatable), brand and market by default',
+            dest='tags',
+            action='append'
+        )
+        parser.add_argument(
+            '--number',
+            help='number of runs of each query',
+            type=int,
+            default=20
+        )
+        parser.add_argument(
+            '--page-size',
+            help='number of feeds fetched by each query',
+            type=int,
+            default=20
+        )
+
+    def get_page(self, tags, page_size):
+        return list(Feed.objects.filter(
+            type=Feed.NEW_CONTENT_AVAILABLE_TYPE
+        ).filter_contents_with_tags(tags).order_by(
+            '-id'
+        ).values_list('id', flat=True)[:page_size])
+
+    def handle(self, *args, **options):
+        tags = options['tags'] or ['brand', 'market']
+
+        print('{} feed tag rows, {} distinct keys'.format(
+            FeedTag.objects.count(),
+            FeedTag.objects.values('key').distinct().count()
+        ))
+        for key, count in FeedTag.objects.filter(
+            key__in=[tag.lower() for tag in tags]
+        ).values_list('key').annotate(count=Count('id')):
+            print('{}: {} feeds'.format(key, count))
+
+        pages = {}
+        for enabled in (False, True):
+            with override_settings(ENABLE_FEED_TAG_INDEX=enabled):
+                pages[enabled] = self.get_page(tags, options['page_size'])
+                duration = timeit.timeit(
+                    lambda: self.get_page(tags, options['page_size']),
+                    number=options['number']
+                )
+            print('{}: {:.2f} ms/query'.format(
+                'index' if enabled else 'tag joins',
+                duration * 1000 / options['number']
+            ))
+
+        if pages[False] != pages[True]:
+            print('Results differ, run ./manage.py rebuildfeedtags')
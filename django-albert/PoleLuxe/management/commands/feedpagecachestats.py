@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+
+from PoleLuxe.helpers.feed_page_cache import feed_page_cache_helper
+
+
+class Command(BaseCommand):
+    """
+    Print the hit, miss and invalidation counts of the feed page and
+    fragment caches.
+    e.g.
+    ./manage.py feedpagecachestats
+    ./manage.py feedpagecachestats --reset
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            help='reset the counts after printing them',
+            action='store_true'
+        )
+
+    def handle(self, *args, **options):
+        stats = feed_page_cache_helper.get_stats()
+        print('hits: {hit}, misses: {miss}, hit rate: {hit_rate:.2%}, '
+              'fragment hits: {fragment_hit}, '
+              'fragment misses: {fragment_miss}, '
+              'invalidations: {invalidation}'.format(**stats))
+
+        if options['reset']:
+            feed_page_cache_helper.reset_stats()
@@ -0,0 +1,38 @@
+from django.core.management import BaseCommand
+
+from PoleLuxe.helpers.analytics_ingest import analytics_ingest_helper
+
+
+class Command(BaseCommand):
+    """
+    Insert the analytics rows waiting in Redis, e.g. before stopping the
+    workers for good.
+    e.g.
+    ./manage.py flushanalyticsevents
+    ./manage.py flushanalyticsevents --force
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            help='take the drain over from a queued or running drain job',
+            action='store_true'
+        )
+
+    def handle(self, *args, **options):
+        print('{} pending rows'.format(
+            analytics_ingest_helper.get_pending_count()
+        ))
+
+        token = analytics_ingest_helper.schedule(force=options['force'])
+        if token is None:
+            print('A drain job is queued or running, use --force to drain anyway')
+            return
+
+        print('{} rows inserted'.format(analytics_ingest_helper.drain(token)))
+        dead_count = analytics_ingest_helper.get_dead_count()
+        if dead_count:
+            print('{} rows could not be inserted, see {}'.format(
+                dead_count,
+                analytics_ingest_helper.DEAD_KEY
+            ))
@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand
+
+from PoleLuxe.helpers.feed_counter import feed_counter_helper
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the per user group like/comment counters of feeds and contents
+    from the like and comment tables.
+    e.g.
+    ./manage.py rebuildfeedcounters
+    ./manage.py rebuildfeedcounters --batch-size 5000
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            help='number of counters inserted per query',
+            default=1000,
+            type=int
+        )
+
+    def handle(self, *args, **options):
+        count = feed_counter_helper.rebuild(batch_size=options['batch_size'])
+        print('Rebuilt {} feed counter(s)'.format(count))
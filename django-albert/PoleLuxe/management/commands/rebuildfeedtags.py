@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from PoleLuxe.helpers.feed_tag import feed_tag_helper
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the feed tag index, to run before enabling
+    ENABLE_FEED_TAG_INDEX
+    e.g.
+    ./manage.py rebuildfeedtags
+    """
+
+    def handle(self, *args, **options):
+        count = feed_tag_helper.refresh()
+        print('Rebuilt {} feed tag(s)'.format(count))
@@ -0,0 +1,65 @@
+from django.core.management import BaseCommand
+
+from PoleLuxe.helpers.feed_timeline import feed_timeline_helper
+from PoleLuxe.models import UserGroup
+
+
+class Command(BaseCommand):
+    """
+    Build the feed timelines of user groups, which then read their feed
+    list from them
+    e.g.
+    ./manage.py rebuildfeedtimelines --user-group 12 --user-group 13
+    ./manage.py rebuildfeedtimelines --user-group 12 --drop
+    ./manage.py rebuildfeedtimelines --drop
+    ./manage.py rebuildfeedtimelines
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user-group',
+            help='only rebuild this user group (repeatable)',
+            dest='user_group_ids',
+            action='append',
+            type=int
+        )
+        parser.add_argument(
+            '--drop',
+            help='drop the timelines instead, back to the SQL feed list; '
+                 'all of them, user ones included, without --user-group',
+            action='store_true'
+        )
+
+    def handle(self, *args, **options):
+        user_group_ids = options['user_group_ids']
+        if options['drop'] and user_group_ids is None:
+            # Also the timelines left stale by turning the flag off.
+            feed_timeline_helper.drop_all()
+            print('Dropped every timeline')
+            return
+
+        if user_group_ids is None:
+            user_group_ids = list(UserGroup.objects.order_by('id').values_list(
+                'id',
+                flat=True
+            ))
+
+        if options['drop']:
+            for user_group_id in user_group_ids:
+                feed_timeline_helper.drop(user_group_id)
+            print('Dropped {} timeline(s)'.format(len(user_group_ids)))
+            return
+
+        if not feed_timeline_helper.is_enabled():
+            # Writes made with the flag off are not pushed.
+            print('ENABLE_FEED_TIMELINE is off, no timeline built')
+            return
+
+        count = sum(
+            feed_timeline_helper.build(user_group_id)
+            for user_group_id in user_group_ids
+        )
+        print('Built {} timeline(s) of {} feed(s)'.format(
+            len(user_group_ids),
+            count
+        ))
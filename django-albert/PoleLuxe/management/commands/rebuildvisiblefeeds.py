@@ -0,0 +1,27 @@
+from django.core.management import BaseCommand
+
+from PoleLuxe.helpers.visible_feed import visible_feed_helper
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the per user group visible feed index
+    e.g.
+    ./manage.py rebuildvisiblefeeds
+    ./manage.py rebuildvisiblefeeds --user-group 12 --user-group 13
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user-group',
+            help='only rebuild this user group (repeatable)',
+            dest='user_group_ids',
+            action='append',
+            type=int
+        )
+
+    def handle(self, *args, **options):
+        count = visible_feed_helper.refresh(
+            user_group_ids=options['user_group_ids']
+        )
+        print('Rebuilt {} visible feed(s)'.format(count))
@@ -0,0 +1,24 @@
+from django.core.management import BaseCommand
+
+from PoleLuxe.helpers.feed_dates import feed_dates_helper
+
+
+class Command(BaseCommand):
+    """
+    Recompute the dates every feed copies from its content.
+    e.g.
+    ./manage.py refreshfeeddates
+    ./manage.py refreshfeeddates --batch-size 5000
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            help='number of feeds processed per batch',
+            default=1000,
+            type=int
+        )
+
+    def handle(self, *args, **options):
+        count = feed_dates_helper.refresh(batch_size=options['batch_size'])
+        print('Updated the dates of {} feed(s)'.format(count))
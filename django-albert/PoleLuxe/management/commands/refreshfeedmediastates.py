@@ -0,0 +1,24 @@
+from django.core.management import BaseCommand
+
+from PoleLuxe.helpers.media_state import media_state_helper
+
+
+class Command(BaseCommand):
+    """
+    Recompute the `media_state` of every posted media feed.
+    e.g.
+    ./manage.py refreshfeedmediastates
+    ./manage.py refreshfeedmediastates --batch-size 5000
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            help='number of media processed per batch',
+            default=1000,
+            type=int
+        )
+
+    def handle(self, *args, **options):
+        count = media_state_helper.refresh(batch_size=options['batch_size'])
+        print('Updated {} feed media state(s)'.format(count))
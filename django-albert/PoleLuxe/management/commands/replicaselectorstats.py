@@ -0,0 +1,41 @@
+from django.core.management import BaseCommand
+
+from PoleLuxe.helpers.replica_selector import replica_selector
+
+
+class Command(BaseCommand):
+    """
+    Print the routing decisions of the replica selector and the current
+    lag and latency of every read replica.
+    e.g.
+    ./manage.py replicaselectorstats
+    ./manage.py replicaselectorstats --reset
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            help='reset the counts after printing them',
+            action='store_true'
+        )
+
+    def handle(self, *args, **options):
+        print('Sample rate: {}'.format(
+            replica_selector.get_stats_sample_rate()
+        ))
+        for decision, count in sorted(replica_selector.get_stats().items()):
+            print('{}: {}'.format(decision, count))
+
+        replica_selector.probe_all()
+        for alias in replica_selector.get_aliases():
+            state = replica_selector.states[alias]
+            print('{}: lag: {}, latency: {:.1f} ms'.format(
+                alias,
+                'unknown' if state['lag'] is None else '{:.1f} s'.format(
+                    state['lag']
+                ),
+                state['latency'] * 1000
+            ))
+
+        if options['reset']:
+            replica_selector.reset_stats()
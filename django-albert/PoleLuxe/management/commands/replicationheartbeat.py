@@ -0,0 +1,45 @@
+import time
+
+from django.core.management import BaseCommand
+
+from PoleLuxe.helpers.replica_selector import replica_selector
+
+
+class Command(BaseCommand):
+    """
+    Write the replication heartbeat on the primary database and probe the
+    read replicas for the replica selector, every REPLICA_PROBE_INTERVAL
+    seconds unless given another interval.
+    e.g.
+    ./manage.py replicationheartbeat
+    ./manage.py replicationheartbeat --interval 0.5
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            help='seconds between two beats, at most REPLICA_PROBE_INTERVAL',
+            type=float
+        )
+
+    def handle(self, *args, **options):
+        probe_interval = replica_selector.get_probe_interval()
+        interval = options['interval'] or probe_interval
+
+        # Lags are measured in beats.
+        if interval >= replica_selector.get_max_lag():
+            print('The interval must be shorter than REPLICA_MAX_LAG '
+                  '({} s)'.format(replica_selector.get_max_lag()))
+            return
+        # The shared states expire after a few probe intervals.
+        if interval > probe_interval:
+            print('The interval must not exceed REPLICA_PROBE_INTERVAL '
+                  '({} s)'.format(probe_interval))
+            return
+
+        while True:
+            # Probing before the next beat, a replica which kept up has
+            # applied the previous one.
+            replica_selector.probe_all()
+            replica_selector.beat()
+            time.sleep(interval)
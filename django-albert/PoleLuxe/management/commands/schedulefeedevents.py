@@ -0,0 +1,39 @@
+from django.core.management import BaseCommand
+
+from PoleLuxe.helpers.feed_events import feed_event_helper
+
+
+class Command(BaseCommand):
+    """
+    Queue the processing of the next feed publish or expiry event; every
+    run then queues the next one. A periodic run queues it again if it is
+    lost.
+    e.g.
+    ./manage.py schedulefeedevents
+    ./manage.py schedulefeedevents --force
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            help='queue a run even if an earlier one is already queued',
+            action='store_true'
+        )
+
+    def handle(self, *args, **options):
+        if options['force']:
+            feed_event_helper.get_connection().delete(
+                feed_event_helper.SCHEDULED_KEY
+            )
+
+        print('Periodic run queued every {} second(s)'.format(
+            feed_event_helper.schedule_periodic()
+        ))
+
+        if not feed_event_helper.schedule_next():
+            print('No event to process, or a run is already queued')
+            return
+
+        print('Run queued at {} UTC'.format(
+            feed_event_helper.get_scheduled_instant().isoformat()
+        ))
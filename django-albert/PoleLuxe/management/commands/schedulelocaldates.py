@@ -0,0 +1,38 @@
+from django.core.management import BaseCommand
+
+from PoleLuxe.helpers.local_date import local_date_helper
+
+
+class Command(BaseCommand):
+    """
+    Queue the roll of the local dates at the next local midnight of the
+    user group offsets; every roll then queues the next one. A periodic
+    roll queues it again if it is lost.
+    e.g.
+    ./manage.py schedulelocaldates
+    ./manage.py schedulelocaldates --force
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            help='queue a roll even if one is already queued',
+            action='store_true'
+        )
+
+    def handle(self, *args, **options):
+        if options['force']:
+            local_date_helper.get_connection().delete(
+                local_date_helper.SCHEDULED_KEY
+            )
+
+        print('Periodic roll queued every {} second(s)'.format(
+            local_date_helper.schedule_periodic()
+        ))
+
+        run_at = local_date_helper.schedule()
+        if run_at is None:
+            print('A roll is already queued, use --force to queue one anyway')
+            return
+
+        print('Roll queued at {} UTC'.format(run_at.isoformat()))
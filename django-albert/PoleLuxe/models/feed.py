@@ -1,6 +1,13 @@
 import datetime
 
 from django.db import models
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.conf import settings
 
 from .dailychallenge import (
@@ -14,6 +21,43 @@ from PoleLuxe.constants import FeedReferenceModelType
 
 
 class FeedQuerySet(models.query.QuerySet):
+    def get_local_date(self, utc_datetime, timezone):
+        """
+        Local date of a timezone offset at a UTC datetime.
+
+        With `ENABLE_LOCAL_DATES`, the current date of each offset is kept
+        by `local_date_helper` until its local midnight.
+
+        :param datetime utc_datetime
+        :param int timezone
+
+        :return date
+        """
+        from PoleLuxe.helpers.local_date import local_date_helper
+
+        if local_date_helper.is_enabled():
+            return local_date_helper.get_local_date(timezone, utc_datetime)
+
+        return TimezonedDateTime(utc_datetime, timezone).to_local().date()
+
+    def get_current_local_date(self, timezone):
+        """
+        Current local date of a timezone offset, used by the publish date
+        filters.
+
+        :param int timezone
+
+        :return date
+        """
+        from PoleLuxe.helpers.local_date import local_date_helper
+
+        if local_date_helper.is_enabled():
+            return local_date_helper.get_local_date(timezone)
+
+        return (
+            datetime.datetime.now() + datetime.timedelta(hours=timezone)
+        ).date()
+
     def user_group(self, user_group_id):
         return self.filter(Q(user_group_id=user_group_id)
                            | Q(user_group_id__isnull=True))
@@ -35,12 +79,22 @@ class FeedQuerySet(models.query.QuerySet):
         """
         Exclude expired tips, tips' knowledges and tips' luxury cultures.
 
+        With `ENABLE_FEED_EFFECTIVE_DATES`, this is one range predicate on
+        `effective_expiry_date`, against the local date computed once.
+
         :param int timezone
 
         :return QuerySet
         """
         date = date_helper.get_current_datetime()
 
+        if getattr(settings, 'ENABLE_FEED_EFFECTIVE_DATES', False):
+            local_date = self.get_local_date(date, timezone)
+            return self.filter(
+                Q(effective_expiry_date__gte=local_date)
+                | Q(effective_expiry_date__isnull=True)
+            ).exclude_expired_media()
+
         return self.exclude_expired_tips_of_the_day(
             date,
             timezone
@@ -70,7 +124,7 @@ class FeedQuerySet(models.query.QuerySet):
 
         :return QuerySet
         """
-        date = TimezonedDateTime(utc_datetime, timezone).to_local().date()
+        date = self.get_local_date(utc_datetime, timezone)
 
         return self.exclude(
             type=Feed.TIPS_OF_THE_DAY_TYPE,
@@ -86,33 +140,58 @@ class FeedQuerySet(models.query.QuerySet):
 
         :return QuerySet
         """
-        date = TimezonedDateTime(utc_datetime, timezone).to_local().date()
+        date = self.get_local_date(utc_datetime, timezone)
         return self.exclude(
             type=Feed.COMPLETE_DAILY_CHALLENGE_TYPE,
             daily_challenge_result_id__daily_challenge_id__publish_date__lt=date
         )
 
     def exclude_expired_knowledge(self, current_date, timezone):
-        net_date = TimezonedDateTime(current_date, timezone).to_local().date()
+        net_date = self.get_local_date(current_date, timezone)
         return self.exclude(
             type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
             knowledge_id__expiry_date__lt=net_date,
         )
 
     def exclude_expired_luxury_culture(self, current_date, timezone):
-        net_date = TimezonedDateTime(current_date, timezone).to_local().date()
+        net_date = self.get_local_date(current_date, timezone)
         return self.exclude(
             type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
             luxury_culture_id__expiry_date__lt=net_date,
         )
 
+    def exclude_unpublished_contents(self, timezone):
+        """
+        Exclude tips whose knowledge or luxury culture is not published
+        yet.
+
+        With `ENABLE_FEED_EFFECTIVE_DATES`, this is one range predicate on
+        `effective_publish_date`.
+
+        :param int timezone
+
+        :return QuerySet
+        """
+        if getattr(settings, 'ENABLE_FEED_EFFECTIVE_DATES', False):
+            local_date = self.get_current_local_date(timezone)
+            return self.filter(
+                Q(effective_publish_date__lte=local_date)
+                | Q(effective_publish_date__isnull=True)
+            )
+
+        return self.exclude_unpublished_knowledge(
+            timezone
+        ).exclude_unpublished_luxury_cultures(
+            timezone
+        )
+
     def exclude_unpublished_knowledge(self, timezone):
         return self.exclude(
             type=Feed.TIPS_OF_THE_DAY_TYPE,
             tips_of_the_day_id__knowledge_id__isnull=False,
             tips_of_the_day_id__knowledge_id__publish_date__gt=(
-                datetime.datetime.now() + datetime.timedelta(hours=timezone)
-            ).date()
+                self.get_current_local_date(timezone)
+            )
         )
 
     def exclude_expired_tips_knowledge(self, utc_datetime, timezone):
@@ -124,7 +203,7 @@ class FeedQuerySet(models.query.QuerySet):
 
         :return QuerySet
         """
-        date = TimezonedDateTime(utc_datetime, timezone).to_local().date()
+        date = self.get_local_date(utc_datetime, timezone)
 
         return self.exclude(
             type=Feed.TIPS_OF_THE_DAY_TYPE,
@@ -140,7 +219,7 @@ class FeedQuerySet(models.query.QuerySet):
 
         :return QuerySet
         """
-        date = TimezonedDateTime(utc_datetime, timezone).to_local().date()
+        date = self.get_local_date(utc_datetime, timezone)
 
         return self.exclude(
             type=Feed.TIPS_OF_THE_DAY_TYPE,
@@ -162,8 +241,8 @@ class FeedQuerySet(models.query.QuerySet):
             type=Feed.TIPS_OF_THE_DAY_TYPE,
             tips_of_the_day_id__luxury_culture_id__isnull=False,
             tips_of_the_day_id__luxury_culture_id__publish_date__gt=(
-                datetime.datetime.now() + datetime.timedelta(hours=timezone)
-            ).date()
+                self.get_current_local_date(timezone)
+            )
         )
 
     def exclude_invisible_luxury_culture(self, user_group_id):
@@ -182,6 +261,14 @@ class FeedQuerySet(models.query.QuerySet):
         """
         from PoleLuxe.models.media import Media
 
+        if getattr(settings, 'ENABLE_FEED_MEDIA_STATE', False):
+            return self.filter(
+                ~Q(type=Feed.NEW_POSTED_MEDIA_TYPE)
+                | Q(media_state__in=Feed.get_media_states(
+                    Feed.MEDIA_COMPLETED | Feed.MEDIA_TEXT
+                ))
+            )
+
         return self.filter(
             ~Q(type=Feed.NEW_POSTED_MEDIA_TYPE)
             | Q(model_id__in=Media.objects.get_completed())
@@ -193,6 +280,9 @@ class FeedQuerySet(models.query.QuerySet):
         Exclude the expired media.
         We could have just added a new `media` field to the Feed model,
         but it would not be compatible with the existing data.
+
+        Whether a media is active depends on the current time, so it is
+        not part of `media_state` and always checked here.
         """
         from PoleLuxe.models.media import Media
 
@@ -205,6 +295,88 @@ class FeedQuerySet(models.query.QuerySet):
             | Q(model_id__in=active_media)
         )
 
+    def exclude_text_media(self):
+        """
+        Exclude the text media.
+        """
+        from PoleLuxe.models.media import Media
+
+        if getattr(settings, 'ENABLE_FEED_MEDIA_STATE', False):
+            return self.exclude(
+                type=Feed.NEW_POSTED_MEDIA_TYPE,
+                media_state__in=Feed.get_media_states(Feed.MEDIA_TEXT)
+            )
+
+        return self.exclude(
+            Q(type=Feed.NEW_POSTED_MEDIA_TYPE) &
+            Q(model_id__in=Media.objects.filter(type=Media.TEXT_TYPE))
+        )
+
+    def filter_user_group_visibility(self, user_group_id):
+        """
+        Feeds a user group is allowed to see, according to the feed's user
+        group and the product groups, white lists and black lists of the
+        linked tips of the day and their contents.
+
+        :param int user_group_id
+
+        :return QuerySet
+        """
+        return self.user_group(
+            user_group_id
+        ).exclude_invisible_tips_of_the_day(
+            user_group_id
+        ).exclude_invisible_knowledge(
+            user_group_id
+        ).exclude_invisible_luxury_culture(
+            user_group_id
+        )
+
+    def visible_feeds(self, user_group_id):
+        """
+        Same result as `filter_user_group_visibility()`, read from the
+        precomputed `VisibleFeed` index.
+
+        :param int user_group_id
+
+        :return QuerySet
+        """
+        return self.filter(visiblefeed__user_group_id=user_group_id)
+
+    def filter_user_group_record_visibility(self, user_group):
+        """
+        Same result as `filter_user_group_visibility()`, with the
+        memberships of a cached user group as lists of IDs instead of
+        joins on the user group.
+
+        :param UserGroupRecord user_group
+
+        :return QuerySet
+        """
+        queryset = self.user_group(user_group.id)
+
+        # Tips of the day, then their knowledge and luxury culture.
+        for path, content in (
+            ('tips_of_the_day_id', 'tips_of_the_day'),
+            ('tips_of_the_day_id__knowledge_id', 'knowledge'),
+            ('tips_of_the_day_id__luxury_culture_id', 'luxury_culture'),
+        ):
+            conditions = [
+                Q(type=Feed.TIPS_OF_THE_DAY_TYPE),
+                Q(**{'%s__isnull' % path: False}),
+                Q(**{'%s__product_group__isnull' % path: False})
+                | Q(**{'%s__white_list_user_group__isnull' % path: False}),
+                ~Q(**{
+                    '%s__product_group__in' % path: user_group.product_group_ids
+                }),
+                ~Q(**{'%s__in' % path: user_group.white_list[content]}),
+            ]
+            queryset = queryset.exclude(*conditions).exclude(**{
+                '%s__in' % path: user_group.black_list[content]
+            })
+
+        return queryset
+
     def exclude_types(self, types):
         return self.exclude(type__in=types)
 
@@ -259,8 +431,14 @@ class FeedQuerySet(models.query.QuerySet):
             'type': Feed.EVALUATION_REMINDER_TYPE
         }
 
+        from PoleLuxe.helpers.permission_cache import permission_cache_helper
+
+        # The permission classes of the request have usually preloaded it.
+        if permission_cache_helper.is_enabled():
+            permission_cache_helper.preload(user)
+
         # If the user has permission, remove only the expired reminders.
-        if user.django_user and user.django_user.has_perm(permission):
+        if user.django_user_id and user.django_user.has_perm(permission):
             black_list_options['created_at__lte'] = (
                 datetime.datetime.now() -
                 datetime.timedelta(days=settings.EVALUATION_REMINDER_DAYS_GAP)
@@ -269,12 +447,32 @@ class FeedQuerySet(models.query.QuerySet):
         return self.exclude(**black_list_options)
 
     def filter_contents_with_tags(self, tags):
+        """
+        Feeds of contents having any of the tags.
+
+        The tags are matched in subqueries (semi-joins) so a content with
+        several matching tags still yields a single feed row.
+        """
+        knowledge_model = self.model._meta.get_field(
+            'knowledge_id'
+        ).related_model
+        luxury_culture_model = self.model._meta.get_field(
+            'luxury_culture_id'
+        ).related_model
+
         lower_case_tags = list(map(lambda i: i.lower(), tags))
+        if getattr(settings, 'ENABLE_FEED_TAG_INDEX', False):
+            return self.filter(id__in=FeedTag.objects.filter(
+                key__in=lower_case_tags
+            ).values('feed_id'))
+
         return self.filter(
-            (Q(knowledge_id__isnull=False) &
-             Q(knowledge_id__tags__text__in=lower_case_tags))
-            | (Q(luxury_culture_id__isnull=False) &
-               Q(luxury_culture_id__tags__text__in=lower_case_tags))
+            Q(knowledge_id__in=knowledge_model.objects.filter(
+                tags__text__in=lower_case_tags
+            ).values('id'))
+            | Q(luxury_culture_id__in=luxury_culture_model.objects.filter(
+                tags__text__in=lower_case_tags
+            ).values('id'))
         )
 
     def exclude_read_contents(self, user):
@@ -283,12 +481,10 @@ class FeedQuerySet(models.query.QuerySet):
         """
         from PoleLuxe.models.user import ReadFeed
 
-        read_feed_ids = ReadFeed.objects.filter(
-            user=user
-        ).values_list('feed', flat=True)
-
+        # A subquery rather than the list of IDs, which heavy readers make
+        # huge.
         return self.exclude(
-            id__in=list(read_feed_ids)
+            id__in=ReadFeed.objects.filter(user=user).values('feed')
         )
 
 
@@ -300,36 +496,55 @@ class FeedManager(models.Manager):
                     user_id,
                     user_group_id,
                     timezone,
-                    excluded_types=[]):
+                    excluded_types=[],
+                    timeline=False):
         """
         This is the query used to display user feed. All filter chaining is inside this function
 
+        Every filter is either on a feed column, a foreign key or a
+        subquery, so the result is row-unique without DISTINCT.
+
         :param User user_id: User object
         :param UserGroup user_group_id: UserGroup object
         :param string timezone: User's UserGroup timezone
         :param list exclude_types: Excluded feed types
+        :param bool timeline: the feeds are read from the user group's
+            timeline, which already checks the visibility rules, see
+            `FeedTimelineHelper`
 
         :return QuerySet
         """
-        return self.get_queryset().user_group(
-            user_group_id
-        ).exclude_other_user_daily_challenge(
+        from PoleLuxe.helpers.user_group_cache import user_group_cache_helper
+
+        queryset = self.get_queryset()
+        if timeline:
+            # Daily challenge feeds come from the user's own timeline.
+            queryset = queryset.user_group(user_group_id)
+        elif getattr(settings, 'ENABLE_VISIBLE_FEED_INDEX', False):
+            queryset = queryset.visible_feeds(user_group_id)
+        else:
+            user_group = None
+            if user_group_cache_helper.is_enabled():
+                user_group = user_group_cache_helper.get(user_group_id)
+
+            if user_group is not None:
+                queryset = queryset.filter_user_group_record_visibility(
+                    user_group
+                )
+            else:
+                queryset = queryset.filter_user_group_visibility(
+                    user_group_id
+                )
+
+        return queryset.exclude_other_user_daily_challenge(
             user_id
-        ).exclude_invisible_tips_of_the_day(
-            user_group_id
-        ).exclude_unpublished_knowledge(
+        ).exclude_unpublished_contents(
             timezone
-        ).exclude_invisible_knowledge(
-            user_group_id
-        ).exclude_unpublished_luxury_cultures(
-            timezone
-        ).exclude_incomplete_media().exclude_invisible_luxury_culture(
-            user_group_id
-        ).exclude_types(
+        ).exclude_incomplete_media().exclude_types(
             excluded_types
         ).exclude_expired_contents(
             timezone
-        ).ordered().distinct()
+        ).ordered()
 
     def get_knowledges(self):
         return self.get_queryset().get_knowledges()
@@ -361,6 +576,10 @@ class Feed(models.Model):
     NEW_POSTED_MEDIA_TYPE = 8
     EVALUATION_REMINDER_TYPE = 9
 
+    # `media_state` flags of NEW_POSTED_MEDIA_TYPE feeds.
+    MEDIA_COMPLETED = 1
+    MEDIA_TEXT = 2
+
     TYPE_CHOICES = (
         (COMPLETE_DAILY_CHALLENGE_TYPE, 'Complete Daily Challenge'),
         (TIPS_OF_THE_DAY_TYPE, 'Tips of the day'),
@@ -433,8 +652,60 @@ class Feed(models.Model):
     is_pinned = models.BooleanField(default=False)
     pinned_tags = models.ManyToManyField('PoleLuxe.PinnedTag', blank=True)
 
+    # Flags of the posted media (`model_id`), kept in sync by the media
+    # signals below so feed queries don't need subqueries on Media.
+    media_state = models.PositiveSmallIntegerField(default=0, db_index=True)
+
+    # Dates copied from the tips of the day, contents and daily challenge,
+    # kept in sync by their signals below, see `FeedDatesHelper`.
+    # Publish date of the knowledge or luxury culture; the ordering of the
+    # pinned feeds.
+    publish_date = models.DateTimeField(null=True, blank=True, default=None)
+    # The feed is unpublished before, and expired after, these dates.
+    effective_publish_date = models.DateTimeField(
+        null=True,
+        blank=True,
+        default=None,
+        db_index=True
+    )
+    effective_expiry_date = models.DateTimeField(
+        null=True,
+        blank=True,
+        default=None,
+        db_index=True
+    )
+
     objects = FeedManager()
 
+    class Meta:
+        index_together = [
+            ('publish_date', 'id'),
+            # Keyset pagination, see `CreatedAtCursorPagination`.
+            ('created_at', 'id'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if kwargs.get('update_fields') is not None:
+            from PoleLuxe.helpers.feed_dates import feed_dates_helper
+
+            # The dates set on pre_save, see `set_feed_dates`.
+            kwargs['update_fields'] = feed_dates_helper.get_update_fields(
+                kwargs['update_fields']
+            )
+
+        return super(Feed, self).save(*args, **kwargs)
+
+    @classmethod
+    def get_media_states(cls, flags):
+        """
+        Values of `media_state` having any of `flags`.
+
+        :param int flags: MEDIA_* flags
+        :return list
+        """
+        all_flags = cls.MEDIA_COMPLETED | cls.MEDIA_TEXT
+        return [state for state in range(all_flags + 1) if state & flags]
+
     def get_reference_type(self):
         """
         Source logic from DetailFeedSerializer.get_ref()
@@ -498,3 +769,638 @@ class FeedCommentLikeLog(models.Model):
     feed_comment_id = models.ForeignKey(FeedComment)
     user_id = models.ForeignKey('PoleLuxe.User')
     created_at = models.DateTimeField(auto_now_add=True, null=True)
+
+
+class FeedCounter(models.Model):
+    """
+    Like and comment counts of a feed, or of the content a feed links to,
+    within a user group.
+
+    Rows are kept current by the like/comment signals below and can be
+    rebuilt from scratch with `./manage.py rebuildfeedcounters`.
+    """
+    FEED = 'feed'
+    KNOWLEDGE = 'knowledge'
+    LUXURY_CULTURE = 'luxury_culture'
+
+    CONTENT_TYPE_CHOICES = (
+        (FEED, 'Feed'),
+        (KNOWLEDGE, 'Knowledge'),
+        (LUXURY_CULTURE, 'Luxury culture'),
+    )
+
+    id = models.AutoField(primary_key=True)
+    content_type = models.CharField(
+        max_length=20,
+        choices=CONTENT_TYPE_CHOICES
+    )
+    object_id = models.PositiveIntegerField()
+    user_group = models.ForeignKey('PoleLuxe.UserGroup')
+    like_count = models.IntegerField(default=0)
+    comment_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('content_type', 'object_id', 'user_group')
+
+
+def update_feed_counter_on_save(sender, instance, created, **kwargs):
+    if created:
+        from PoleLuxe.helpers.feed_counter import feed_counter_helper
+
+        feed_counter_helper.count(instance, 1)
+
+
+def update_feed_counter_on_delete(sender, instance, **kwargs):
+    from PoleLuxe.helpers.feed_counter import feed_counter_helper
+
+    feed_counter_helper.count(instance, -1)
+
+
+def collect_feed_counter_user_group(sender, instance, update_fields=None,
+                                    **kwargs):
+    if instance.pk is None or (
+        update_fields is not None and 'user_group_id' not in update_fields
+    ):
+        return
+
+    instance._feed_counter_user_group_id = sender.objects.filter(
+        pk=instance.pk
+    ).values_list('user_group_id', flat=True).first()
+
+
+def move_feed_counters_on_user_group_change(sender, instance, created,
+                                            **kwargs):
+    if '_feed_counter_user_group_id' not in instance.__dict__:
+        return
+
+    old_user_group_id = instance.__dict__.pop('_feed_counter_user_group_id')
+    if created or old_user_group_id == instance.user_group_id_id:
+        return
+
+    from PoleLuxe.helpers.feed_counter import feed_counter_helper
+
+    feed_counter_helper.move_likes(
+        instance.pk,
+        old_user_group_id,
+        instance.user_group_id_id
+    )
+
+
+for counted_model in (
+    'PoleLuxe.FeedLikeLog',
+    'PoleLuxe.FeedComment',
+    'PoleLuxe.KnowledgeLikeLog',
+    'PoleLuxe.KnowledgeComment',
+    'PoleLuxe.LuxuryCultureLikeLog',
+    'PoleLuxe.LuxuryCultureComment',
+):
+    post_save.connect(
+        update_feed_counter_on_save,
+        sender=counted_model,
+        dispatch_uid='feed_counter_save_%s' % counted_model
+    )
+    post_delete.connect(
+        update_feed_counter_on_delete,
+        sender=counted_model,
+        dispatch_uid='feed_counter_delete_%s' % counted_model
+    )
+
+# Likes are counted in the user's current user group.
+pre_save.connect(
+    collect_feed_counter_user_group,
+    sender='PoleLuxe.User',
+    dispatch_uid='feed_counter_user_pre_save'
+)
+post_save.connect(
+    move_feed_counters_on_user_group_change,
+    sender='PoleLuxe.User',
+    dispatch_uid='feed_counter_user_save'
+)
+
+
+class VisibleFeed(models.Model):
+    """
+    Precomputed `FeedQuerySet.filter_user_group_visibility()`: one row per
+    feed a user group is allowed to see.
+
+    With `ENABLE_VISIBLE_FEED_INDEX`, rows are refreshed by the signals
+    below when feeds, tips of the day, contents, product groups or
+    white/black lists change, and when a user group is created. They are
+    not maintained while the flag is off: rebuild them from scratch with
+    `./manage.py rebuildvisiblefeeds` before enabling it.
+    """
+    id = models.AutoField(primary_key=True)
+    user_group = models.ForeignKey('PoleLuxe.UserGroup')
+    feed = models.ForeignKey(Feed)
+
+    class Meta:
+        # Also the index of the lookups by user group; the feeds are
+        # ordered on their own columns.
+        unique_together = ('user_group', 'feed')
+
+
+class FeedTag(models.Model):
+    """
+    Lowercased tag keys of the content (knowledge or luxury culture) of
+    each feed, so that `FeedQuerySet.filter_contents_with_tags()` is one
+    indexed semi-join instead of two many-to-many joins on the tag text.
+
+    With `ENABLE_FEED_TAG_INDEX`, rows are refreshed by the signals below
+    when feeds, contents, content tags or tags change. They are not
+    maintained while the flag is off: rebuild them from scratch with
+    `./manage.py rebuildfeedtags` before enabling it.
+    """
+    id = models.AutoField(primary_key=True)
+    key = models.CharField(max_length=255)
+    feed = models.ForeignKey(Feed)
+
+    class Meta:
+        # Also the index of the lookups by key.
+        unique_together = ('key', 'feed')
+
+
+class ReplicationHeartbeat(models.Model):
+    """
+    A single row, written on the primary by `./manage.py
+    replicationheartbeat` and read back from each read replica to measure
+    its replication lag, see `ReplicaSelector`.
+    """
+    id = models.IntegerField(primary_key=True)
+    beat_at = models.FloatField()
+
+
+# Fields of a feed its visibility depends on.
+VISIBILITY_FEED_FIELDS = {'type', 'user_group_id', 'tips_of_the_day_id'}
+
+
+def refresh_visible_feeds_on_save(sender, instance, created, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if sender is Feed and update_fields and not (
+        VISIBILITY_FEED_FIELDS & set(update_fields)
+    ):
+        return
+
+    # The visibility of a user group only depends on its memberships,
+    # which send m2m_changed.
+    if sender.__name__ == 'UserGroup' and not created:
+        return
+
+    from PoleLuxe.helpers.visible_feed import visible_feed_helper
+
+    visible_feed_helper.refresh_for(instance)
+
+
+def refresh_visible_feeds_on_m2m_change(sender, instance, action, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    from PoleLuxe.helpers.visible_feed import visible_feed_helper
+
+    visible_feed_helper.refresh_for(instance)
+
+
+for visibility_model in (
+    'PoleLuxe.Feed',
+    'PoleLuxe.TipsOfTheDay',
+    'PoleLuxe.Knowledge',
+    'PoleLuxe.LuxuryCulture',
+    'PoleLuxe.UserGroup',
+):
+    post_save.connect(
+        refresh_visible_feeds_on_save,
+        sender=visibility_model,
+        dispatch_uid='visible_feed_save_%s' % visibility_model
+    )
+
+# Product group memberships and white/black lists are many-to-many fields;
+# `refresh_for` ignores the instances it has no rule for.
+m2m_changed.connect(
+    refresh_visible_feeds_on_m2m_change,
+    dispatch_uid='visible_feed_m2m'
+)
+
+
+def collect_visible_feeds_on_delete(sender, instance, **kwargs):
+    from PoleLuxe.helpers.feed_timeline import feed_timeline_helper
+    from PoleLuxe.helpers.visible_feed import visible_feed_helper
+
+    if not (visible_feed_helper.is_enabled() or
+            feed_timeline_helper.is_maintained()):
+        return
+
+    # Deleting a product group clears its memberships without sending
+    # m2m_changed, and they are gone once it is deleted.
+    instance._visible_feed_ids = visible_feed_helper.get_affected_feed_ids(
+        instance
+    )
+
+
+def refresh_visible_feeds_on_delete(sender, instance, **kwargs):
+    from PoleLuxe.helpers.feed_timeline import feed_timeline_helper
+    from PoleLuxe.helpers.visible_feed import visible_feed_helper
+
+    feed_ids = getattr(instance, '_visible_feed_ids', None)
+    if feed_ids is None:
+        return
+
+    if visible_feed_helper.is_enabled():
+        visible_feed_helper.refresh(feed_ids=feed_ids)
+    if feed_timeline_helper.is_maintained():
+        feed_timeline_helper.refresh(feed_ids)
+
+
+pre_delete.connect(
+    collect_visible_feeds_on_delete,
+    sender='PoleLuxe.ProductGroup',
+    dispatch_uid='visible_feed_pre_delete'
+)
+post_delete.connect(
+    refresh_visible_feeds_on_delete,
+    sender='PoleLuxe.ProductGroup',
+    dispatch_uid='visible_feed_delete'
+)
+
+
+def invalidate_feed_pages(sender, instance, **kwargs):
+    from PoleLuxe.helpers.feed_page_cache import feed_page_cache_helper
+
+    feed_page_cache_helper.invalidate(instance)
+
+
+def invalidate_feed_pages_on_m2m_change(sender, instance, action, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    invalidate_feed_pages(sender, instance)
+
+
+for rendered_model in (
+    'PoleLuxe.Feed',
+    'PoleLuxe.Media',
+    'PoleLuxe.MediaComment',
+    'PoleLuxe.MediaResource',
+    'PoleLuxe.TipsOfTheDay',
+    'PoleLuxe.Knowledge',
+    'PoleLuxe.KnowledgeTranslation',
+    'PoleLuxe.LuxuryCulture',
+    'PoleLuxe.LuxuryCultureTranslation',
+    'PoleLuxe.ReadFeed',
+    'PoleLuxe.FeedLikeLog',
+    'PoleLuxe.FeedComment',
+    'PoleLuxe.KnowledgeLikeLog',
+    'PoleLuxe.KnowledgeComment',
+    'PoleLuxe.LuxuryCultureLikeLog',
+    'PoleLuxe.LuxuryCultureComment',
+):
+    post_save.connect(
+        invalidate_feed_pages,
+        sender=rendered_model,
+        dispatch_uid='feed_page_save_%s' % rendered_model
+    )
+    post_delete.connect(
+        invalidate_feed_pages,
+        sender=rendered_model,
+        dispatch_uid='feed_page_delete_%s' % rendered_model
+    )
+
+# Media likes and content tags are many-to-many fields; `invalidate`
+# ignores the instances it has no rule for.
+m2m_changed.connect(
+    invalidate_feed_pages_on_m2m_change,
+    dispatch_uid='feed_page_m2m'
+)
+
+
+def collect_content_translation(sender, instance, **kwargs):
+    from PoleLuxe.helpers.content_translation import (
+        content_translation_helper
+    )
+
+    # A translation moved to another content or language leaves its
+    # previous entry behind.
+    content_translation_helper.collect(instance)
+
+
+def invalidate_content_translation(sender, instance, **kwargs):
+    from PoleLuxe.helpers.content_translation import (
+        content_translation_helper
+    )
+
+    content_translation_helper.invalidate(instance)
+
+
+for translation_model in (
+    'PoleLuxe.KnowledgeTranslation',
+    'PoleLuxe.LuxuryCultureTranslation',
+):
+    pre_save.connect(
+        collect_content_translation,
+        sender=translation_model,
+        dispatch_uid='content_translation_pre_save_%s' % translation_model
+    )
+    post_save.connect(
+        invalidate_content_translation,
+        sender=translation_model,
+        dispatch_uid='content_translation_save_%s' % translation_model
+    )
+    post_delete.connect(
+        invalidate_content_translation,
+        sender=translation_model,
+        dispatch_uid='content_translation_delete_%s' % translation_model
+    )
+
+
+def set_feed_media_state(sender, instance, **kwargs):
+    from PoleLuxe.helpers.media_state import media_state_helper
+
+    media_state_helper.set_feed_state(instance)
+
+
+def refresh_feed_media_state(sender, instance, **kwargs):
+    from PoleLuxe.helpers.media_state import media_state_helper
+
+    media_state_helper.refresh_for(instance)
+
+
+pre_save.connect(
+    set_feed_media_state,
+    sender='PoleLuxe.Feed',
+    dispatch_uid='feed_media_state_feed'
+)
+
+for media_model in (
+    'PoleLuxe.Media',
+    'PoleLuxe.MediaResource',
+):
+    post_save.connect(
+        refresh_feed_media_state,
+        sender=media_model,
+        dispatch_uid='feed_media_state_save_%s' % media_model
+    )
+    post_delete.connect(
+        refresh_feed_media_state,
+        sender=media_model,
+        dispatch_uid='feed_media_state_delete_%s' % media_model
+    )
+
+
+def add_to_read_set(sender, instance, **kwargs):
+    from PoleLuxe.helpers.read_set import read_set_helper
+
+    read_set_helper.update(instance, read=True)
+
+
+def remove_from_read_set(sender, instance, **kwargs):
+    from PoleLuxe.helpers.read_set import read_set_helper
+
+    read_set_helper.update(instance, read=False)
+
+
+post_save.connect(
+    add_to_read_set,
+    sender='PoleLuxe.ReadFeed',
+    dispatch_uid='read_set_save'
+)
+post_delete.connect(
+    remove_from_read_set,
+    sender='PoleLuxe.ReadFeed',
+    dispatch_uid='read_set_delete'
+)
+
+
+# Fields of a feed its tags depend on.
+FEED_TAG_FEED_FIELDS = {'knowledge_id', 'luxury_culture_id'}
+
+
+def refresh_feed_tags_on_save(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if sender is Feed and update_fields and not (
+        FEED_TAG_FEED_FIELDS & set(update_fields)
+    ):
+        return
+
+    from PoleLuxe.helpers.feed_tag import feed_tag_helper
+
+    feed_tag_helper.refresh_for(instance)
+
+
+def collect_feed_tags_on_delete(sender, instance, **kwargs):
+    from PoleLuxe.helpers.feed_tag import feed_tag_helper
+
+    if not feed_tag_helper.is_enabled():
+        return
+
+    # The content tags of a tag are gone once it is deleted.
+    instance._feed_tag_feed_ids = feed_tag_helper.get_affected_feed_ids(
+        instance
+    )
+
+
+def refresh_feed_tags_on_delete(sender, instance, **kwargs):
+    from PoleLuxe.helpers.feed_tag import feed_tag_helper
+
+    feed_ids = getattr(instance, '_feed_tag_feed_ids', None)
+    if feed_ids is not None:
+        feed_tag_helper.refresh(feed_ids=feed_ids)
+
+
+def refresh_feed_tags_on_m2m_change(sender, instance, action, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    from PoleLuxe.helpers.feed_tag import feed_tag_helper
+
+    if feed_tag_helper.is_tag_relation(sender):
+        feed_tag_helper.refresh_for(instance)
+
+
+for tagged_model in (
+    'PoleLuxe.Feed',
+    'PoleLuxe.Tag',
+):
+    post_save.connect(
+        refresh_feed_tags_on_save,
+        sender=tagged_model,
+        dispatch_uid='feed_tag_save_%s' % tagged_model
+    )
+
+pre_delete.connect(
+    collect_feed_tags_on_delete,
+    sender='PoleLuxe.Tag',
+    dispatch_uid='feed_tag_pre_delete'
+)
+post_delete.connect(
+    refresh_feed_tags_on_delete,
+    sender='PoleLuxe.Tag',
+    dispatch_uid='feed_tag_delete'
+)
+
+m2m_changed.connect(
+    refresh_feed_tags_on_m2m_change,
+    dispatch_uid='feed_tag_m2m'
+)
+
+
+def set_feed_dates(sender, instance, update_fields=None, **kwargs):
+    from PoleLuxe.helpers.feed_dates import feed_dates_helper
+
+    feed_dates_helper.set_feed_dates(instance, update_fields)
+
+
+def refresh_feed_dates(sender, instance, **kwargs):
+    from PoleLuxe.helpers.feed_dates import feed_dates_helper
+
+    feed_dates_helper.refresh_for(instance)
+
+
+pre_save.connect(
+    set_feed_dates,
+    sender='PoleLuxe.Feed',
+    dispatch_uid='feed_dates_feed'
+)
+
+for dated_model in (
+    'PoleLuxe.TipsOfTheDay',
+    'PoleLuxe.Knowledge',
+    'PoleLuxe.LuxuryCulture',
+    'PoleLuxe.DailyChallenge',
+    'PoleLuxe.DailyChallengeResult',
+):
+    post_save.connect(
+        refresh_feed_dates,
+        sender=dated_model,
+        dispatch_uid='feed_dates_save_%s' % dated_model
+    )
+
+
+def invalidate_user_group_cache(sender, instance, **kwargs):
+    from PoleLuxe.helpers.user_group_cache import user_group_cache_helper
+
+    user_group_cache_helper.invalidate([instance.pk])
+
+
+def invalidate_user_group_cache_on_m2m_change(
+    sender,
+    instance,
+    action,
+    pk_set,
+    **kwargs
+):
+    from PoleLuxe.helpers.user_group_cache import user_group_cache_helper
+
+    user_group_cache_helper.invalidate_m2m(sender, instance, action, pk_set)
+
+
+post_save.connect(
+    invalidate_user_group_cache,
+    sender='PoleLuxe.UserGroup',
+    dispatch_uid='user_group_cache_save'
+)
+post_delete.connect(
+    invalidate_user_group_cache,
+    sender='PoleLuxe.UserGroup',
+    dispatch_uid='user_group_cache_delete'
+)
+
+# Product group memberships and white/black lists are many-to-many fields;
+# `invalidate_m2m` ignores the other relations.
+m2m_changed.connect(
+    invalidate_user_group_cache_on_m2m_change,
+    dispatch_uid='user_group_cache_m2m'
+)
+
+
+def schedule_feed_events(sender, instance, **kwargs):
+    from PoleLuxe.helpers.feed_events import feed_event_helper
+
+    feed_event_helper.schedule_for(instance)
+
+
+# Queue an earlier run of the feed events when new dates call for one,
+# see `FeedEventHelper`.
+for event_model in (
+    'PoleLuxe.Feed',
+    'PoleLuxe.TipsOfTheDay',
+    'PoleLuxe.Knowledge',
+    'PoleLuxe.LuxuryCulture',
+    'PoleLuxe.DailyChallenge',
+    'PoleLuxe.Media',
+):
+    post_save.connect(
+        schedule_feed_events,
+        sender=event_model,
+        dispatch_uid='feed_events_save_%s' % event_model
+    )
+
+
+def schedule_local_dates(sender, instance, **kwargs):
+    from PoleLuxe.helpers.local_date import local_date_helper
+
+    if local_date_helper.is_enabled():
+        local_date_helper.schedule()
+
+
+# Queue an earlier roll of the local dates when a new offset calls for
+# one, see `LocalDateHelper`.
+post_save.connect(
+    schedule_local_dates,
+    sender='PoleLuxe.UserGroup',
+    dispatch_uid='local_dates_save'
+)
+
+
+# Fields of a feed its timelines depend on.
+TIMELINE_FEED_FIELDS = VISIBILITY_FEED_FIELDS | {'user_id', 'created_at'}
+
+
+def refresh_feed_timelines_on_save(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if sender is Feed and update_fields and not (
+        TIMELINE_FEED_FIELDS & set(update_fields)
+    ):
+        return
+
+    from PoleLuxe.helpers.feed_timeline import feed_timeline_helper
+
+    feed_timeline_helper.refresh_for(instance)
+
+
+def refresh_feed_timelines_on_m2m_change(sender, instance, action, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    refresh_feed_timelines_on_save(sender, instance)
+
+
+def remove_from_feed_timelines(sender, instance, **kwargs):
+    from PoleLuxe.helpers.feed_timeline import feed_timeline_helper
+
+    if feed_timeline_helper.is_maintained():
+        feed_timeline_helper.remove(instance.id, instance.user_id_id)
+
+
+# A user group timeline is only built by `./manage.py rebuildfeedtimelines`
+# and depends on its memberships, not on the user group row.
+for timeline_model in (
+    'PoleLuxe.Feed',
+    'PoleLuxe.TipsOfTheDay',
+    'PoleLuxe.Knowledge',
+    'PoleLuxe.LuxuryCulture',
+):
+    post_save.connect(
+        refresh_feed_timelines_on_save,
+        sender=timeline_model,
+        dispatch_uid='feed_timeline_save_%s' % timeline_model
+    )
+
+post_delete.connect(
+    remove_from_feed_timelines,
+    sender='PoleLuxe.Feed',
+    dispatch_uid='feed_timeline_delete'
+)
+
+# Same many-to-many fields as the visible feed index.
+m2m_changed.connect(
+    refresh_feed_timelines_on_m2m_change,
+    dispatch_uid='feed_timeline_m2m'
+)
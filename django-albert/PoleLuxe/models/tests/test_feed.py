@@ -1,23 +1,51 @@
+import fakeredis
+import mock
 import requests_mock
 import random
 
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
 
 import requests_mock
 
 from PoleLuxe.tests.base import BaseTestCase
+from PoleLuxe.helpers.content_translation import (
+    ContentTitles,
+    content_translation_helper,
+)
+from PoleLuxe.helpers.feed_counter import feed_counter_helper
+from PoleLuxe.helpers.feed_dates import feed_dates_helper
+from PoleLuxe.helpers.feed_events import feed_event_helper
+from PoleLuxe.helpers.feed_page_cache import feed_page_cache_helper
+from PoleLuxe.helpers.local_date import local_date_helper
+from PoleLuxe.helpers.feed_tag import feed_tag_helper
+from PoleLuxe.helpers.media_state import media_state_helper
+from PoleLuxe.helpers.read_set import read_set_helper
+from PoleLuxe.helpers.user_group_cache import user_group_cache_helper
+from PoleLuxe.helpers.visible_feed import visible_feed_helper
 from PoleLuxe.models import (
+    AppLanguage,
     Feed,
     Media,
-    ReadFeed
+    ReadFeed,
+    TipsOfTheDay,
+    UserGroup,
 )
+from PoleLuxe.models.feed import FeedCounter, FeedTag, VisibleFeed
 from PoleLuxe.factories import (
+    FeedCommentFactory,
     FeedFactory,
+    KnowledgeCommentFactory,
     KnowledgeFactory,
+    KnowledgeLikeLogFactory,
+    KnowledgeTranslationFactory,
     LuxuryCultureFactory,
     MediaFactory,
     MediaResourceFactory,
+    ProductGroupFactory,
     TagFactory,
     TipsOfTheDayFactory,
     UserGroupFactory,
@@ -357,6 +385,34 @@ class TestFeedQuerySet(BaseTestCase):
                     queryset[index]['id']
                 )
 
+    def test_filter_contents_with_tags_row_unique(self):
+        tags = [
+            TagFactory(text='tag1'),
+            TagFactory(text='tag2')
+        ]
+
+        knowledge = KnowledgeFactory()
+        knowledge.tags.add(*tags)
+        knowledge_feed = FeedFactory(
+            type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+            knowledge_id=knowledge
+        )
+
+        luxury_culture = LuxuryCultureFactory()
+        luxury_culture.tags.add(*tags)
+        luxury_culture_feed = FeedFactory(
+            type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+            luxury_culture_id=luxury_culture
+        )
+
+        ids = list(
+            self.queryset.order_by('-id').filter_contents_with_tags(
+                ['tag1', 'tag2']
+            ).values_list('id', flat=True)
+        )
+
+        self.assertEqual([luxury_culture_feed.id, knowledge_feed.id], ids)
+
     @requests_mock.mock()
     def test_exclude_read_contents(self, m):
         m.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
@@ -503,3 +559,975 @@ class ExpiredContentsTestCase(BaseTestCase):
             luxury_culture_id__isnull=False,     # luxury culture feed
             luxury_culture_id__in=active_contents
         ))
+
+
+class FeedCounterTestCase(BaseTestCase):
+    @requests_mock.mock()
+    def setUp(self, req_mock):
+        req_mock.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+        super(FeedCounterTestCase, self).setUp()
+
+        self.user = UserFactory()
+        self.user_group = self.user.user_group_id
+        self.knowledge = KnowledgeFactory()
+        self.feed = FeedFactory(
+            type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+            knowledge_id=self.knowledge
+        )
+
+    def get_counter(self, content_type, object_id):
+        return feed_counter_helper.get_counters(
+            content_type,
+            [object_id],
+            self.user_group.id
+        )[object_id]
+
+    def test_like_and_comment_counted_on_write(self):
+        like = KnowledgeLikeLogFactory(
+            knowledge_id=self.knowledge,
+            user_id=self.user
+        )
+        KnowledgeCommentFactory(
+            knowledge_id=self.knowledge,
+            user_id=self.user,
+            user_group_id=self.user_group
+        )
+        FeedCommentFactory(
+            feed_id=self.feed,
+            user_id=self.user,
+            user_group_id=self.user_group
+        )
+
+        self.assertEqual(
+            (1, 1),
+            self.get_counter(FeedCounter.KNOWLEDGE, self.knowledge.id)
+        )
+        self.assertEqual(
+            (0, 1),
+            self.get_counter(FeedCounter.FEED, self.feed.id)
+        )
+
+        like.delete()
+        self.assertEqual(
+            (0, 1),
+            self.get_counter(FeedCounter.KNOWLEDGE, self.knowledge.id)
+        )
+
+    def test_likes_moved_with_their_user(self):
+        like = KnowledgeLikeLogFactory(
+            knowledge_id=self.knowledge,
+            user_id=self.user
+        )
+        old_user_group = self.user_group
+        self.user.user_group_id = UserGroupFactory()
+        self.user.save()
+
+        self.assertEqual(
+            (0, 0),
+            self.get_counter(FeedCounter.KNOWLEDGE, self.knowledge.id)
+        )
+        self.user_group = self.user.user_group_id
+        self.assertEqual(
+            (1, 0),
+            self.get_counter(FeedCounter.KNOWLEDGE, self.knowledge.id)
+        )
+
+        like.delete()
+        self.assertEqual(
+            (0, 0),
+            self.get_counter(FeedCounter.KNOWLEDGE, self.knowledge.id)
+        )
+        self.assertEqual(0, FeedCounter.objects.get(
+            content_type=FeedCounter.KNOWLEDGE,
+            object_id=self.knowledge.id,
+            user_group=old_user_group
+        ).like_count)
+
+    def test_rebuild(self):
+        for _ in range(3):
+            KnowledgeLikeLogFactory(
+                knowledge_id=self.knowledge,
+                user_id=self.user
+            )
+        FeedCounter.objects.update(like_count=0, comment_count=0)
+
+        feed_counter_helper.rebuild()
+
+        counter = FeedCounter.objects.get(
+            content_type=FeedCounter.KNOWLEDGE,
+            object_id=self.knowledge.id,
+            user_group=self.user_group
+        )
+        self.assertEqual(3, counter.like_count)
+        self.assertEqual(
+            (3, 0),
+            self.get_counter(FeedCounter.KNOWLEDGE, self.knowledge.id)
+        )
+
+
+@override_settings(ENABLE_VISIBLE_FEED_INDEX=True)
+class VisibleFeedParityTestCase(BaseTestCase):
+    """
+    The `VisibleFeed` index returns the same feeds as the visibility query
+    chain, both after a rebuild and after incremental changes.
+    """
+    @requests_mock.mock()
+    def setUp(self, req_mock):
+        req_mock.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+        super(VisibleFeedParityTestCase, self).setUp()
+
+        self.user_groups = [UserGroupFactory() for _ in range(3)]
+
+        self.product_group = ProductGroupFactory()
+        self.product_group.user_group.add(self.user_groups[0])
+
+        self.plain_tip = TipsOfTheDayFactory()
+
+        self.product_group_tip = TipsOfTheDayFactory()
+        self.product_group_tip.product_group.add(self.product_group)
+
+        self.white_listed_tip = TipsOfTheDayFactory()
+        self.white_listed_tip.white_list_user_group.add(self.user_groups[1])
+
+        self.black_listed_tip = TipsOfTheDayFactory()
+        self.black_listed_tip.black_list_user_group.add(self.user_groups[2])
+
+        self.knowledge = KnowledgeFactory()
+        self.knowledge.product_group.add(self.product_group)
+        self.knowledge_tip = TipsOfTheDayFactory(
+            knowledge_id=self.knowledge,
+            luxury_culture_id=None
+        )
+
+        self.luxury_culture = LuxuryCultureFactory()
+        self.luxury_culture.black_list_user_group.add(self.user_groups[0])
+        self.luxury_culture_tip = TipsOfTheDayFactory(
+            knowledge_id=None,
+            luxury_culture_id=self.luxury_culture
+        )
+
+        for tip in TipsOfTheDay.objects.all():
+            FeedFactory(
+                type=Feed.TIPS_OF_THE_DAY_TYPE,
+                tips_of_the_day_id=tip
+            )
+
+        self.group_feeds = [
+            FeedFactory(
+                type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+                knowledge_id=KnowledgeFactory(),
+                user_group_id=user_group
+            )
+            for user_group in self.user_groups
+        ]
+        FeedFactory(
+            type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+            knowledge_id=KnowledgeFactory()
+        )
+
+    def assertIndexParity(self):
+        for user_group in UserGroup.objects.all():
+            expected = set(
+                Feed.objects.all().filter_user_group_visibility(
+                    user_group.id
+                ).values_list('id', flat=True)
+            )
+            actual = set(
+                Feed.objects.all().visible_feeds(
+                    user_group.id
+                ).values_list('id', flat=True)
+            )
+            self.assertEqual(
+                expected,
+                actual,
+                msg='User group: {}'.format(user_group.id)
+            )
+
+    def test_rebuild(self):
+        VisibleFeed.objects.all().delete()
+        visible_feed_helper.refresh()
+
+        self.assertIndexParity()
+
+    def test_incremental_changes(self):
+        self.assertIndexParity()
+
+        self.product_group.user_group.add(self.user_groups[1])
+        self.assertIndexParity()
+
+        self.product_group.user_group.remove(self.user_groups[0])
+        self.assertIndexParity()
+
+        self.black_listed_tip.black_list_user_group.remove(
+            self.user_groups[2]
+        )
+        self.black_listed_tip.black_list_user_group.add(self.user_groups[0])
+        self.assertIndexParity()
+
+        self.white_listed_tip.white_list_user_group.clear()
+        self.assertIndexParity()
+
+        self.knowledge.white_list_user_group.add(self.user_groups[2])
+        self.assertIndexParity()
+
+        self.luxury_culture.product_group.add(self.product_group)
+        self.assertIndexParity()
+
+        feed = self.group_feeds[0]
+        feed.user_group_id = self.user_groups[1]
+        feed.save()
+        self.assertIndexParity()
+
+        feed = Feed.objects.get(tips_of_the_day_id=self.plain_tip)
+        feed.tips_of_the_day_id = self.black_listed_tip
+        feed.save()
+        self.assertIndexParity()
+
+        UserGroupFactory()
+        self.assertIndexParity()
+
+    def test_product_group_deleted(self):
+        self.luxury_culture.product_group.add(self.product_group)
+        self.assertIndexParity()
+
+        self.product_group.delete()
+        self.assertIndexParity()
+
+    def test_user_group_update(self):
+        user_group = self.user_groups[0]
+        VisibleFeed.objects.filter(user_group=user_group).delete()
+
+        user_group.timezone = 2
+        user_group.save()
+
+        self.assertFalse(
+            VisibleFeed.objects.filter(user_group=user_group).exists()
+        )
+
+    def test_not_kept_when_disabled(self):
+        with self.settings(ENABLE_VISIBLE_FEED_INDEX=False):
+            user_group = UserGroupFactory()
+            self.product_group.user_group.add(self.user_groups[1])
+
+        self.assertFalse(
+            VisibleFeed.objects.filter(user_group=user_group).exists()
+        )
+
+        visible_feed_helper.refresh()
+        self.assertIndexParity()
+
+    def test_feed_refresh_query_count(self):
+        feed_ids = list(Feed.objects.values_list('id', flat=True))
+
+        with CaptureQueriesContext(connection) as before:
+            visible_feed_helper.refresh(feed_ids=feed_ids)
+
+        for _ in range(5):
+            UserGroupFactory()
+
+        with CaptureQueriesContext(connection) as after:
+            visible_feed_helper.refresh(feed_ids=feed_ids)
+
+        self.assertEqual(len(before), len(after))
+        self.assertIndexParity()
+
+    @requests_mock.mock()
+    def test_get_general(self, req_mock):
+        req_mock.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+
+        for user_group in self.user_groups:
+            user = UserFactory(user_group_id=user_group)
+
+            with self.settings(ENABLE_VISIBLE_FEED_INDEX=False):
+                expected = list(Feed.objects.get_general(
+                    user.id,
+                    user_group.id,
+                    user_group.timezone
+                ).values_list('id', flat=True))
+
+            with self.settings(ENABLE_VISIBLE_FEED_INDEX=True):
+                actual = list(Feed.objects.get_general(
+                    user.id,
+                    user_group.id,
+                    user_group.timezone
+                ).values_list('id', flat=True))
+
+            self.assertEqual(expected, actual)
+
+
+@override_settings(ENABLE_USER_GROUP_CACHE=True)
+class UserGroupCacheTestCase(VisibleFeedParityTestCase):
+    """
+    The visibility of the cached user group records is the same as the
+    visibility query chain, as the records are invalidated by the
+    incremental changes of the parent test case.
+    """
+    def setUp(self):
+        cache.clear()
+        user_group_cache_helper.local_cache.clear()
+        super(UserGroupCacheTestCase, self).setUp()
+
+    def assertIndexParity(self):
+        for user_group in UserGroup.objects.all():
+            expected = set(
+                Feed.objects.all().filter_user_group_visibility(
+                    user_group.id
+                ).values_list('id', flat=True)
+            )
+            actual = set(
+                Feed.objects.all().filter_user_group_record_visibility(
+                    user_group_cache_helper.get(user_group.id)
+                ).values_list('id', flat=True)
+            )
+            self.assertEqual(
+                expected,
+                actual,
+                msg='User group: {}'.format(user_group.id)
+            )
+
+    def test_rebuild(self):
+        user_group = self.user_groups[0]
+        self.assertIsNone(user_group_cache_helper.get(0))
+        self.assertIsNone(user_group_cache_helper.get('none'))
+
+        user_group_cache_helper.get(user_group.id)
+        with self.assertNumQueries(0):
+            record = user_group_cache_helper.get(str(user_group.id))
+        self.assertEqual(user_group.timezone, record.timezone)
+        self.assertEqual(user_group.company_id.id, record.company_id)
+        self.assertEqual(
+            {self.product_group.id},
+            record.product_group_ids
+        )
+        self.assertEqual(
+            {self.luxury_culture.id},
+            record.black_list['luxury_culture']
+        )
+
+        user_group.timezone = 2
+        user_group.save()
+        self.assertEqual(2, user_group_cache_helper.get(user_group.id).timezone)
+
+    @requests_mock.mock()
+    def test_get_general(self, req_mock):
+        req_mock.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+
+        for user_group in self.user_groups:
+            user = UserFactory(user_group_id=user_group)
+
+            with self.settings(ENABLE_USER_GROUP_CACHE=False):
+                expected = list(Feed.objects.get_general(
+                    user.id,
+                    user_group.id,
+                    user_group.timezone
+                ).values_list('id', flat=True))
+
+            actual = list(Feed.objects.get_general(
+                user.id,
+                user_group.id,
+                user_group.timezone
+            ).values_list('id', flat=True))
+
+            self.assertEqual(expected, actual)
+
+
+class ContentTitlesTestCase(BaseTestCase):
+    fixtures = ['app_language']
+
+    def setUp(self):
+        super(ContentTitlesTestCase, self).setUp()
+
+        cache.clear()
+        content_translation_helper.local_cache.clear()
+
+        self.language = AppLanguage.objects.exclude(code='EN').first()
+        self.knowledges = [KnowledgeFactory() for _ in range(3)]
+        self.translation = KnowledgeTranslationFactory(
+            knowledge=self.knowledges[0],
+            language=self.language
+        )
+
+    def get_titles(self, language_code):
+        titles = ContentTitles(
+            language_code,
+            knowledge_ids=[knowledge.id for knowledge in self.knowledges]
+        )
+        return [titles.get_title(knowledge) for knowledge in self.knowledges]
+
+    def test_get_title(self):
+        expected = [self.translation.title] + [
+            knowledge.title for knowledge in self.knowledges[1:]
+        ]
+
+        with self.assertNumQueries(1):
+            self.assertEqual(expected, self.get_titles(self.language.code))
+
+        # Missing translations are cached too.
+        with self.assertNumQueries(0):
+            self.assertEqual(expected, self.get_titles(self.language.code))
+
+    def test_get_title_english(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [knowledge.title for knowledge in self.knowledges],
+                self.get_titles('EN')
+            )
+
+    def test_invalidated_on_save(self):
+        self.get_titles(self.language.code)
+
+        self.translation.title = 'updated title'
+        self.translation.save()
+
+        self.assertEqual(
+            'updated title',
+            self.get_titles(self.language.code)[0]
+        )
+
+        self.translation.delete()
+
+        self.assertEqual(
+            self.knowledges[0].title,
+            self.get_titles(self.language.code)[0]
+        )
+
+    def test_invalidated_on_move(self):
+        self.get_titles(self.language.code)
+
+        self.translation.knowledge = self.knowledges[1]
+        self.translation.save()
+
+        self.assertEqual(
+            [self.knowledges[0].title, self.translation.title],
+            self.get_titles(self.language.code)[:2]
+        )
+
+
+class FeedMediaStateTestCase(BaseTestCase):
+    @requests_mock.mock()
+    def setUp(self, req_mock):
+        req_mock.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+        super(FeedMediaStateTestCase, self).setUp()
+
+        self.user = UserFactory()
+
+        self.complete_media = MediaFactory(user=self.user, is_active=True)
+        MediaResourceFactory(media=self.complete_media)
+        self.incomplete_media = MediaFactory(user=self.user, is_active=True)
+        self.inactive_media = MediaFactory(user=self.user, is_active=False)
+        MediaResourceFactory(media=self.inactive_media)
+        self.text_media = MediaFactory(
+            user=self.user,
+            type=Media.TEXT_TYPE,
+            is_active=True
+        )
+        self.unpublished_media = MediaFactory(
+            user=self.user,
+            is_active=True,
+            publish_date=datetime.utcnow() + timedelta(days=1)
+        )
+        MediaResourceFactory(media=self.unpublished_media)
+
+        for media in (
+            self.complete_media,
+            self.incomplete_media,
+            self.inactive_media,
+            self.text_media,
+            self.unpublished_media,
+        ):
+            FeedFactory(
+                type=Feed.NEW_POSTED_MEDIA_TYPE,
+                model_id=media.id,
+                user_id=self.user
+            )
+        FeedFactory(
+            type=Feed.NEW_POSTED_MEDIA_TYPE,
+            model_id=0,
+            user_id=self.user
+        )
+        FeedFactory(
+            type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+            knowledge_id=KnowledgeFactory()
+        )
+
+    def assertStateParity(self):
+        filters = (
+            lambda queryset: queryset.exclude_incomplete_media(),
+            lambda queryset: queryset.exclude_expired_media(),
+            lambda queryset: queryset.exclude_text_media(),
+        )
+        for filter_queryset in filters:
+            with self.settings(ENABLE_FEED_MEDIA_STATE=False):
+                expected = list(filter_queryset(
+                    Feed.objects.order_by('id')
+                ).values_list('id', flat=True))
+
+            with self.settings(ENABLE_FEED_MEDIA_STATE=True):
+                actual = list(filter_queryset(
+                    Feed.objects.order_by('id')
+                ).values_list('id', flat=True))
+
+            self.assertEqual(expected, actual)
+
+    def test_state_kept_on_write(self):
+        self.assertStateParity()
+
+        MediaResourceFactory(media=self.incomplete_media)
+        self.assertStateParity()
+
+        self.inactive_media.is_active = True
+        self.inactive_media.save()
+        self.assertStateParity()
+
+        self.complete_media.resources.all().delete()
+        self.assertStateParity()
+
+        self.text_media.delete()
+        self.assertStateParity()
+
+    def test_refresh(self):
+        Feed.objects.update(media_state=0)
+
+        media_state_helper.refresh()
+        self.assertStateParity()
+
+
+class FeedDatesTestCase(BaseTestCase):
+    @requests_mock.mock()
+    def setUp(self, req_mock):
+        req_mock.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+        super(FeedDatesTestCase, self).setUp()
+
+        self.publish_date = datetime(2020, 10, 27, 9)
+        self.knowledge = KnowledgeFactory(publish_date=self.publish_date)
+        self.luxury_culture = LuxuryCultureFactory(
+            publish_date=self.publish_date + timedelta(days=1)
+        )
+
+        self.knowledge_feed = FeedFactory(
+            type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+            knowledge_id=self.knowledge
+        )
+        self.luxury_culture_feed = FeedFactory(
+            type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+            luxury_culture_id=self.luxury_culture
+        )
+        self.other_feed = FeedFactory(
+            type=Feed.UPDATED_RANKING_AVAILABLE_TYPE
+        )
+
+    def assertDates(self):
+        self.assertEqual(
+            {
+                self.knowledge_feed.id: self.knowledge.publish_date,
+                self.luxury_culture_feed.id: (
+                    self.luxury_culture.publish_date
+                ),
+                self.other_feed.id: None,
+            },
+            dict(Feed.objects.values_list('id', 'publish_date'))
+        )
+
+    def test_dates_saved_with_update_fields(self):
+        self.knowledge_feed.knowledge_id = None
+        self.knowledge_feed.luxury_culture_id = self.luxury_culture
+        self.knowledge_feed.save(
+            update_fields=['knowledge_id', 'luxury_culture_id']
+        )
+
+        self.assertEqual(
+            self.luxury_culture.publish_date,
+            Feed.objects.get(pk=self.knowledge_feed.pk).publish_date
+        )
+
+    def test_dates_kept_on_write(self):
+        self.assertDates()
+
+        self.knowledge.publish_date += timedelta(days=2)
+        self.knowledge.save()
+        self.assertDates()
+
+        self.luxury_culture.publish_date -= timedelta(days=3)
+        self.luxury_culture.save()
+        self.assertDates()
+
+    def test_effective_dates(self):
+        self.knowledge.expiry_date = (
+            self.publish_date + timedelta(days=10)
+        ).date()
+        self.knowledge.save()
+        tip = TipsOfTheDayFactory(
+            knowledge_id=self.knowledge,
+            luxury_culture_id=self.luxury_culture,
+            expiry_date=self.publish_date + timedelta(days=5)
+        )
+        feed = FeedFactory(
+            type=Feed.TIPS_OF_THE_DAY_TYPE,
+            tips_of_the_day_id=tip
+        )
+
+        feed.refresh_from_db()
+        tip.refresh_from_db()
+        self.assertIsNone(feed.publish_date)
+        # The latest publish date, the earliest expiry date.
+        self.assertEqual(
+            self.luxury_culture.publish_date,
+            feed.effective_publish_date
+        )
+        self.assertEqual(
+            feed_dates_helper.to_datetime(tip.expiry_date),
+            feed.effective_expiry_date
+        )
+
+        tip.expiry_date += timedelta(days=10)
+        tip.save()
+        self.knowledge.refresh_from_db()
+
+        feed.refresh_from_db()
+        self.assertEqual(
+            feed_dates_helper.to_datetime(self.knowledge.expiry_date),
+            feed.effective_expiry_date
+        )
+
+    def test_effective_dates_saved_with_update_fields(self):
+        self.knowledge.expiry_date = (
+            self.publish_date + timedelta(days=10)
+        ).date()
+        self.knowledge.save()
+        tip = TipsOfTheDayFactory(
+            knowledge_id=self.knowledge,
+            luxury_culture_id=None,
+            expiry_date=self.publish_date + timedelta(days=5)
+        )
+        feed = self.other_feed
+        feed.type = Feed.TIPS_OF_THE_DAY_TYPE
+        feed.tips_of_the_day_id = tip
+        feed.save(update_fields=['type', 'tips_of_the_day_id'])
+
+        feed = Feed.objects.get(pk=feed.pk)
+        self.assertEqual(
+            self.knowledge.publish_date,
+            feed.effective_publish_date
+        )
+        self.assertEqual(
+            feed_dates_helper.to_datetime(tip.expiry_date),
+            feed.effective_expiry_date
+        )
+
+    @requests_mock.mock()
+    def test_refresh(self, req_mock):
+        req_mock.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+        FeedFactory(
+            type=Feed.TIPS_OF_THE_DAY_TYPE,
+            tips_of_the_day_id=TipsOfTheDayFactory(
+                expiry_date=self.publish_date
+            )
+        )
+        FeedFactory(
+            type=Feed.COMPLETE_DAILY_CHALLENGE_TYPE,
+            daily_challenge_result_id=DailyChallengeResultFactory()
+        )
+
+        fields = ('id',) + feed_dates_helper.DATE_FIELDS
+        expected = list(Feed.objects.order_by('id').values_list(*fields))
+        Feed.objects.update(**{
+            name: None for name in feed_dates_helper.DATE_FIELDS
+        })
+
+        feed_dates_helper.refresh()
+        self.assertEqual(
+            expected,
+            list(Feed.objects.order_by('id').values_list(*fields))
+        )
+        self.assertEqual(0, feed_dates_helper.refresh())
+
+
+@override_settings(ENABLE_FEED_EFFECTIVE_DATES=True)
+class EffectiveDatesExpiredContentsTestCase(ExpiredContentsTestCase):
+    """
+    Same results when filtering on the effective dates of the feeds.
+    """
+
+
+class FeedEventTestCase(BaseTestCase):
+    @requests_mock.mock()
+    def setUp(self, req_mock):
+        req_mock.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+        super(FeedEventTestCase, self).setUp()
+
+        self.user = UserFactory()
+        self.feed = FeedFactory()
+        UserGroup.objects.update(timezone=8)
+        # 8pm on 2100-01-01 at UTC+8.
+        self.now = datetime(2100, 1, 1, 12, 0, 0)
+        Feed.objects.filter(pk=self.feed.pk).update(
+            effective_publish_date=datetime(2100, 1, 3),
+            effective_expiry_date=datetime(2100, 1, 5)
+        )
+
+        local_date_helper.dates.clear()
+        self.redis = fakeredis.FakeStrictRedis()
+        self.scheduler = mock.Mock()
+        for name, value in (
+            ('get_connection', lambda: self.redis),
+            ('get_scheduler', lambda: self.scheduler),
+        ):
+            patcher = mock.patch.object(feed_event_helper, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_next_instant(self):
+        # Published at the local midnight of 2100-01-03.
+        self.assertEqual(
+            datetime(2100, 1, 2, 16, 0, 0),
+            feed_event_helper.get_next_instant(self.now)
+        )
+        # Expired at the local midnight ending 2100-01-05.
+        self.assertEqual(
+            datetime(2100, 1, 5, 16, 0, 0),
+            feed_event_helper.get_next_instant(datetime(2100, 1, 3))
+        )
+
+        MediaFactory(
+            user=self.user,
+            publish_date=datetime(2100, 1, 2, 10, 0, 0)
+        )
+        self.assertEqual(
+            datetime(2100, 1, 2, 10, 0, 0),
+            feed_event_helper.get_next_instant(self.now)
+        )
+
+    def test_schedule(self):
+        run_at = datetime(2100, 1, 2, 16, 0, 0)
+
+        self.assertTrue(feed_event_helper.schedule(run_at))
+        self.assertEqual(run_at, feed_event_helper.get_scheduled_instant())
+        self.assertFalse(feed_event_helper.schedule(run_at))
+        self.assertFalse(
+            feed_event_helper.schedule(run_at + timedelta(days=1))
+        )
+        self.assertTrue(
+            feed_event_helper.schedule(run_at - timedelta(hours=1))
+        )
+        self.assertEqual(2, self.scheduler.enqueue_at.call_count)
+
+    def test_process(self):
+        scopes = [feed_page_cache_helper.GLOBAL_SCOPE] + [
+            feed_page_cache_helper.get_group_scope(pk)
+            for pk in UserGroup.objects.values_list('id', flat=True)
+        ]
+        # A media leaving `get_active()` between the runs.
+        patcher = mock.patch.object(
+            feed_event_helper,
+            'get_active_media',
+            side_effect=['digest-1', 'digest-2', 'digest-2']
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # The first run only records when it ran.
+        self.assertEqual(
+            {'media_changed': False, 'user_group_ids': []},
+            feed_event_helper.process(datetime(2100, 1, 5, 15, 0, 0))
+        )
+
+        generations = feed_page_cache_helper.get_generations(scopes)
+        # The feed expires at the local midnight ending 2100-01-05.
+        events = feed_event_helper.process(datetime(2100, 1, 5, 16, 0, 0))
+        self.assertTrue(events['media_changed'])
+        self.assertEqual(
+            sorted(UserGroup.objects.values_list('id', flat=True)),
+            sorted(events['user_group_ids'])
+        )
+        for before, after in zip(
+            generations,
+            feed_page_cache_helper.get_generations(scopes)
+        ):
+            self.assertNotEqual(before, after)
+
+        # Nothing happened since.
+        self.assertEqual(
+            {'media_changed': False, 'user_group_ids': []},
+            feed_event_helper.process(datetime(2100, 1, 5, 17, 0, 0))
+        )
+
+    def test_lost_run(self):
+        run_at = datetime(2100, 1, 2, 16, 0, 0)
+        self.assertTrue(feed_event_helper.schedule(run_at, self.now))
+
+        # The periodic run finds the queued one past and not run.
+        self.assertTrue(feed_event_helper.schedule_next(
+            datetime(2100, 1, 2, 17, 0, 0)
+        ))
+        self.assertEqual(
+            datetime(2100, 1, 5, 16, 0, 0),
+            feed_event_helper.get_scheduled_instant()
+        )
+
+
+@override_settings(ENABLE_READ_SET=True)
+class ReadSetTestCase(BaseTestCase):
+    @requests_mock.mock()
+    def setUp(self, req_mock):
+        req_mock.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+        super(ReadSetTestCase, self).setUp()
+
+        self.user = UserFactory()
+        self.other_user = UserFactory()
+        self.feeds = [FeedFactory() for _ in range(4)]
+
+        self.redis = fakeredis.FakeStrictRedis()
+        patcher = mock.patch.object(
+            read_set_helper,
+            'get_connection',
+            lambda: self.redis
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_read_ids(self, user):
+        return read_set_helper.get_read_ids(
+            user.id,
+            [feed.id for feed in self.feeds]
+        )
+
+    def test_loaded_once(self):
+        ReadFeedFactory(user=self.user, feed=self.feeds[0])
+        ReadFeedFactory(user=self.user, feed=self.feeds[2])
+        ReadFeedFactory(user=self.other_user, feed=self.feeds[1])
+        self.redis.flushall()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                {self.feeds[0].id, self.feeds[2].id},
+                self.get_read_ids(self.user)
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                {self.feeds[0].id, self.feeds[2].id},
+                self.get_read_ids(self.user)
+            )
+
+    def test_kept_in_sync_with_reads(self):
+        self.assertEqual(set(), self.get_read_ids(self.user))
+
+        read_feed = ReadFeedFactory(user=self.user, feed=self.feeds[1])
+        ReadFeedFactory(user=self.user, feed=self.feeds[3])
+        ReadFeedFactory(user=self.user, feed=self.feeds[3])
+        self.assertEqual(
+            {self.feeds[1].id, self.feeds[3].id},
+            self.get_read_ids(self.user)
+        )
+
+        read_feed.delete()
+        ReadFeed.objects.filter(feed=self.feeds[3]).first().delete()
+        self.assertEqual({self.feeds[3].id}, self.get_read_ids(self.user))
+        self.assertEqual(set(), self.get_read_ids(self.other_user))
+
+        with self.settings(ENABLE_READ_SET=False):
+            self.assertEqual({self.feeds[3].id}, self.get_read_ids(self.user))
+
+    def test_sparse_ids_use_chunks(self):
+        feed_id = (1 << read_set_helper.CHUNK_BITS) * 1000 + 5
+        read_set_helper.load(self.user.id)
+        read_set_helper.update(
+            ReadFeed(user_id=self.user.id, feed_id=feed_id),
+            read=True
+        )
+
+        self.assertEqual(
+            {feed_id},
+            read_set_helper.get_read_ids(self.user.id, [feed_id, feed_id + 1])
+        )
+        # One chunk of at most 8 KB, not a bitmap up to the feed ID.
+        chunk_key, _ = read_set_helper.get_position(self.user.id, feed_id)
+        self.assertLessEqual(
+            len(self.redis.get(chunk_key)),
+            1 << (read_set_helper.CHUNK_BITS - 3)
+        )
+
+
+@override_settings(ENABLE_FEED_TAG_INDEX=True)
+class FeedTagTestCase(BaseTestCase):
+    def setUp(self):
+        super(FeedTagTestCase, self).setUp()
+
+        self.brand = TagFactory(text='Brand')
+        self.market = TagFactory(text='market')
+
+        self.knowledge = KnowledgeFactory()
+        self.knowledge.tags.add(self.brand)
+        self.knowledge_feed = FeedFactory(
+            type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+            knowledge_id=self.knowledge
+        )
+
+        self.luxury_culture = LuxuryCultureFactory()
+        self.luxury_culture_feed = FeedFactory(
+            type=Feed.NEW_CONTENT_AVAILABLE_TYPE,
+            luxury_culture_id=self.luxury_culture
+        )
+        self.luxury_culture.tags.add(self.brand, self.market)
+
+        FeedFactory(type=Feed.NEW_CONTENT_AVAILABLE_TYPE)
+
+    def assertIndexParity(self):
+        for tags in (['brand'], ['MARKET'], ['brand', 'market'], ['other']):
+            with self.settings(ENABLE_FEED_TAG_INDEX=False):
+                expected = list(Feed.objects.filter_contents_with_tags(
+                    tags
+                ).order_by('id').values_list('id', flat=True))
+
+            with self.settings(ENABLE_FEED_TAG_INDEX=True):
+                actual = list(Feed.objects.filter_contents_with_tags(
+                    tags
+                ).order_by('id').values_list('id', flat=True))
+
+            self.assertEqual(expected, actual, tags)
+
+    def test_index_kept_on_write(self):
+        self.assertEqual(
+            {
+                (self.knowledge_feed.id, 'brand'),
+                (self.luxury_culture_feed.id, 'brand'),
+                (self.luxury_culture_feed.id, 'market'),
+            },
+            set(FeedTag.objects.values_list('feed_id', 'key'))
+        )
+        self.assertIndexParity()
+
+        self.knowledge.tags.add(self.market)
+        self.assertIndexParity()
+
+        self.luxury_culture.tags.remove(self.market)
+        self.assertIndexParity()
+
+        self.brand.text = 'market'
+        self.brand.save()
+        self.assertIndexParity()
+
+        self.brand.delete()
+        self.assertIndexParity()
+
+    def test_rebuild(self):
+        FeedTag.objects.all().delete()
+
+        self.assertEqual(3, feed_tag_helper.refresh())
+        self.assertIndexParity()
+
+    def test_not_kept_when_disabled(self):
+        with self.settings(ENABLE_FEED_TAG_INDEX=False):
+            self.knowledge.tags.add(self.market)
+            self.brand.delete()
+
+        self.assertEqual(
+            {
+                (self.knowledge_feed.id, 'brand'),
+                (self.luxury_culture_feed.id, 'brand'),
+                (self.luxury_culture_feed.id, 'market'),
+            },
+            set(FeedTag.objects.values_list('feed_id', 'key'))
+        )
+
+        feed_tag_helper.refresh()
+        self.assertIndexParity()
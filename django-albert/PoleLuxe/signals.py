@@ -0,0 +1,129 @@
+"""
+Signal receivers of the caches and routing helpers that are not tied to
+one module of `PoleLuxe.models`. Connected by `PoleLuxeConfig.ready()`,
+so every process using the models has them, API or not.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from PoleLuxe.models import Media
+
+
+def invalidate_user_token_cache(sender, instance, **kwargs):
+    from PoleLuxe.helpers.user_token_cache import user_token_cache_helper
+
+    user_token_cache_helper.invalidate(instance)
+
+
+post_save.connect(
+    invalidate_user_token_cache,
+    sender='PoleLuxe.User',
+    dispatch_uid='user_token_cache_save'
+)
+post_delete.connect(
+    invalidate_user_token_cache,
+    sender='PoleLuxe.User',
+    dispatch_uid='user_token_cache_delete'
+)
+
+
+def invalidate_permission_cache(sender, instance, **kwargs):
+    from PoleLuxe.helpers.permission_cache import permission_cache_helper
+
+    permission_cache_helper.invalidate(instance)
+
+
+def invalidate_permission_cache_on_m2m_change(
+    sender,
+    instance,
+    action,
+    **kwargs
+):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    from PoleLuxe.helpers.permission_cache import permission_cache_helper
+
+    permission_cache_helper.invalidate_m2m(instance)
+
+
+for permission_model in (
+    settings.AUTH_USER_MODEL,
+    'auth.Group',
+    'auth.Permission',
+    'PoleLuxe.CompanyOwner',
+    'PoleLuxe.CompanyManager',
+):
+    post_save.connect(
+        invalidate_permission_cache,
+        sender=permission_model,
+        dispatch_uid='permission_cache_save_%s' % permission_model
+    )
+    post_delete.connect(
+        invalidate_permission_cache,
+        sender=permission_model,
+        dispatch_uid='permission_cache_delete_%s' % permission_model
+    )
+
+# Group and permission memberships.
+for permission_relation in (
+    get_user_model().groups.through,
+    get_user_model().user_permissions.through,
+    Group.permissions.through,
+):
+    m2m_changed.connect(
+        invalidate_permission_cache_on_m2m_change,
+        sender=permission_relation,
+        dispatch_uid='permission_cache_m2m_%s' % (
+            permission_relation._meta.label
+        )
+    )
+
+
+def pin_writer_to_primary(sender, instance, **kwargs):
+    from PoleLuxe.helpers.replica_selector import replica_selector
+
+    if replica_selector.is_enabled():
+        replica_selector.pin_writer(instance)
+
+
+def pin_likers_to_primary(sender, instance, action, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    from PoleLuxe.helpers.replica_selector import replica_selector
+
+    if replica_selector.is_enabled():
+        replica_selector.pin_likers(instance, pk_set)
+
+
+# Users read their own likes, comments and reads from the primary for a
+# while, see `ReplicaSelector`.
+for written_model in (
+    'PoleLuxe.ReadFeed',
+    'PoleLuxe.MediaComment',
+    'PoleLuxe.FeedLikeLog',
+    'PoleLuxe.FeedComment',
+    'PoleLuxe.KnowledgeLikeLog',
+    'PoleLuxe.KnowledgeComment',
+    'PoleLuxe.LuxuryCultureLikeLog',
+    'PoleLuxe.LuxuryCultureComment',
+):
+    post_save.connect(
+        pin_writer_to_primary,
+        sender=written_model,
+        dispatch_uid='replica_pin_save_%s' % written_model
+    )
+    post_delete.connect(
+        pin_writer_to_primary,
+        sender=written_model,
+        dispatch_uid='replica_pin_delete_%s' % written_model
+    )
+
+m2m_changed.connect(
+    pin_likers_to_primary,
+    sender=Media.likes.through,
+    dispatch_uid='replica_pin_m2m'
+)
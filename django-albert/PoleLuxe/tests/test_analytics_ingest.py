@@ -0,0 +1,147 @@
+import fakeredis
+import mock
+import requests_mock
+
+from django.conf import settings
+
+from redis.exceptions import ConnectionError
+
+from PoleLuxe.tests.base import BaseTestCase
+from PoleLuxe.helpers.analytics_ingest import analytics_ingest_helper
+from PoleLuxe.models import ReadFeed
+from PoleLuxe.factories import FeedFactory, UserFactory
+
+
+class AnalyticsIngestTestCase(BaseTestCase):
+    @requests_mock.mock()
+    def setUp(self, req_mock):
+        req_mock.post(settings.UNIQUE_VALIDATOR_ENDPOINT, json=True)
+        super(AnalyticsIngestTestCase, self).setUp()
+
+        self.user = UserFactory()
+        self.feeds = [FeedFactory() for _ in range(5)]
+
+        self.redis = fakeredis.FakeStrictRedis()
+        self.queue = mock.Mock()
+        for name, value in (
+            ('get_connection', lambda: self.redis),
+            ('get_queue', lambda: self.queue),
+        ):
+            patcher = mock.patch.object(analytics_ingest_helper, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def record(self, feeds):
+        for feed in feeds:
+            analytics_ingest_helper.record(ReadFeed(user=self.user, feed=feed))
+
+    def get_read_feed_ids(self):
+        return sorted(ReadFeed.objects.filter(
+            user=self.user
+        ).values_list('feed_id', flat=True))
+
+    def test_rows_inserted_by_drain(self):
+        with self.settings(
+            ENABLE_ANALYTICS_INGEST=True,
+            ANALYTICS_INGEST_BATCH_SIZE=2
+        ):
+            self.record(self.feeds)
+
+            self.assertEqual([], self.get_read_feed_ids())
+            self.assertEqual(5, analytics_ingest_helper.get_pending_count())
+            self.assertEqual(1, self.queue.enqueue.call_count)
+            token = self.queue.enqueue.call_args[0][1]
+
+            # One savepoint and insert per batch.
+            with self.assertNumQueries(9):
+                self.assertEqual(5, analytics_ingest_helper.drain(token))
+
+        self.assertEqual(
+            sorted(feed.id for feed in self.feeds),
+            self.get_read_feed_ids()
+        )
+        self.assertEqual(0, analytics_ingest_helper.get_pending_count())
+        self.assertTrue(analytics_ingest_helper.schedule())
+
+    def test_drain_needs_the_claim(self):
+        with self.settings(ENABLE_ANALYTICS_INGEST=True):
+            self.record(self.feeds)
+            token = self.queue.enqueue.call_args[0][1]
+
+            forced_token = analytics_ingest_helper.schedule(force=True)
+            self.assertEqual(0, analytics_ingest_helper.drain(token))
+            self.assertEqual(5, analytics_ingest_helper.get_pending_count())
+
+            self.assertEqual(5, analytics_ingest_helper.drain(forced_token))
+
+        self.assertEqual(
+            sorted(feed.id for feed in self.feeds),
+            self.get_read_feed_ids()
+        )
+
+    def test_orphan_rows_inserted(self):
+        with self.settings(
+            ENABLE_ANALYTICS_INGEST=True,
+            ANALYTICS_INGEST_BATCH_SIZE=2
+        ):
+            self.record(self.feeds)
+            # A drain crashed after popping its batch.
+            analytics_ingest_helper.pop_batch(
+                analytics_ingest_helper.PROCESSING_KEY.format('crashed')
+            )
+            self.assertEqual(3, analytics_ingest_helper.get_pending_count())
+
+            token = analytics_ingest_helper.schedule(force=True)
+            self.assertEqual(5, analytics_ingest_helper.drain(token))
+
+        self.assertEqual(
+            sorted(feed.id for feed in self.feeds),
+            self.get_read_feed_ids()
+        )
+        self.assertEqual(
+            set(),
+            self.redis.smembers(analytics_ingest_helper.PROCESSING_KEYS)
+        )
+
+    def test_failing_rows_moved_to_dead_letters(self):
+        with self.settings(ENABLE_ANALYTICS_INGEST=True):
+            self.record(self.feeds[:2])
+            self.redis.lpush(analytics_ingest_helper.QUEUE_KEY, 'not json')
+            self.record(self.feeds[2:])
+
+            token = analytics_ingest_helper.schedule(force=True)
+            self.assertEqual(5, analytics_ingest_helper.drain(token))
+
+        self.assertEqual(
+            sorted(feed.id for feed in self.feeds),
+            self.get_read_feed_ids()
+        )
+        self.assertEqual(0, analytics_ingest_helper.get_pending_count())
+        self.assertEqual(
+            [b'not json'],
+            self.redis.lrange(analytics_ingest_helper.DEAD_KEY, 0, -1)
+        )
+
+    def test_backpressure(self):
+        with self.settings(
+            ENABLE_ANALYTICS_INGEST=True,
+            ANALYTICS_INGEST_MAX_PENDING=3
+        ):
+            self.record(self.feeds)
+
+        self.assertEqual(3, analytics_ingest_helper.get_pending_count())
+        self.assertEqual(
+            sorted(feed.id for feed in self.feeds[3:]),
+            self.get_read_feed_ids()
+        )
+
+    def test_saved_inline_without_redis(self):
+        self.redis.rpush = mock.Mock(side_effect=ConnectionError)
+
+        with self.settings(ENABLE_ANALYTICS_INGEST=True):
+            self.record(self.feeds)
+
+        self.assertEqual(
+            sorted(feed.id for feed in self.feeds),
+            self.get_read_feed_ids()
+        )
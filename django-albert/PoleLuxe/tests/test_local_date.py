@@ -0,0 +1,132 @@
+import fakeredis
+import mock
+
+from datetime import datetime, timedelta
+
+from PoleLuxe.tests.base import BaseTestCase
+from PoleLuxe.helpers.feed_page_cache import feed_page_cache_helper
+from PoleLuxe.helpers.local_date import local_date_helper
+from PoleLuxe.models import Feed
+from PoleLuxe.factories import UserGroupFactory
+
+
+class LocalDateTestCase(BaseTestCase):
+    def setUp(self):
+        super(LocalDateTestCase, self).setUp()
+
+        UserGroupFactory(timezone=8)
+        UserGroupFactory(timezone=-5)
+        UserGroupFactory(timezone=8)
+
+        local_date_helper.dates.clear()
+        self.redis = fakeredis.FakeStrictRedis()
+        self.scheduler = mock.Mock()
+        for name, value in (
+            ('get_connection', lambda: self.redis),
+            ('get_scheduler', lambda: self.scheduler),
+        ):
+            patcher = mock.patch.object(local_date_helper, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_local_date_rolls_at_local_midnight(self):
+        before = datetime(2020, 10, 27, 15, 59, 59)
+        after = datetime(2020, 10, 27, 16, 0, 0)
+
+        self.assertEqual(
+            before.date(),
+            local_date_helper.get_local_date(8, before)
+        )
+        self.assertEqual(
+            before.date() + timedelta(days=1),
+            local_date_helper.get_local_date(8, after)
+        )
+        self.assertEqual(
+            before.date(),
+            local_date_helper.get_local_date(-5, after)
+        )
+        # Back in time, e.g. a test freezing the clock.
+        self.assertEqual(
+            before.date(),
+            local_date_helper.get_local_date(8, before)
+        )
+
+    def test_queryset_local_date(self):
+        utc_datetime = datetime.utcnow()
+        with self.settings(ENABLE_LOCAL_DATES=True):
+            for timezone in range(-12, 15):
+                self.assertEqual(
+                    Feed.objects.all().get_local_date(utc_datetime, timezone),
+                    (utc_datetime + timedelta(hours=timezone)).date()
+                )
+
+    def test_roll(self):
+        utc_datetime = datetime(2020, 10, 27, 16, 0, 0)
+        generation = feed_page_cache_helper.get_generations(
+            [feed_page_cache_helper.GLOBAL_SCOPE]
+        )
+
+        self.assertEqual(['-5', '8'], local_date_helper.roll(utc_datetime))
+        self.assertEqual(
+            {'-5': '2020-10-27', '8': '2020-10-28'},
+            local_date_helper.get_stored_dates()
+        )
+        self.assertNotEqual(generation, feed_page_cache_helper.get_generations(
+            [feed_page_cache_helper.GLOBAL_SCOPE]
+        ))
+        # The next roll is at the midnight of UTC-5.
+        self.scheduler.enqueue_at.assert_called_once_with(
+            datetime(2020, 10, 28, 5, 0, 0),
+            mock.ANY
+        )
+        self.assertIsNone(local_date_helper.schedule(utc_datetime))
+
+        self.assertEqual([], local_date_helper.roll(utc_datetime))
+        self.assertEqual(
+            ['-5'],
+            local_date_helper.roll(datetime(2020, 10, 28, 5, 0, 0))
+        )
+
+    def test_schedule_new_offset(self):
+        utc_datetime = datetime(2020, 10, 27, 16, 0, 0)
+
+        self.assertEqual(
+            datetime(2020, 10, 28, 5, 0, 0),
+            local_date_helper.schedule(utc_datetime)
+        )
+        # The midnight of UTC-3 comes first.
+        UserGroupFactory(timezone=-3)
+        self.assertEqual(
+            datetime(2020, 10, 28, 3, 0, 0),
+            local_date_helper.schedule(utc_datetime)
+        )
+        self.assertIsNone(local_date_helper.schedule(utc_datetime))
+
+        # Lost: the queued instant is past.
+        self.assertEqual(
+            datetime(2020, 10, 28, 5, 0, 0),
+            local_date_helper.schedule(datetime(2020, 10, 28, 4, 0, 0))
+        )
+        self.assertEqual(3, self.scheduler.enqueue_at.call_count)
+
+    def test_schedule_periodic(self):
+        periodic = mock.Mock(
+            func_name='PoleLuxe.helpers.local_date.roll_local_dates',
+            meta={'interval': 60}
+        )
+        queued = mock.Mock(
+            func_name='PoleLuxe.helpers.local_date.roll_local_dates',
+            meta={}
+        )
+        self.scheduler.get_jobs.return_value = [periodic, queued]
+
+        with self.settings(LOCAL_DATES_INTERVAL=300):
+            self.assertEqual(300, local_date_helper.schedule_periodic())
+
+        self.scheduler.cancel.assert_called_once_with(periodic)
+        self.scheduler.schedule.assert_called_once_with(
+            scheduled_time=mock.ANY,
+            func=mock.ANY,
+            interval=300,
+            repeat=None
+        )